@@ -0,0 +1,209 @@
+"""Command line interface for rendering stratigraphic diagrams
+
+This module defines the ``psy-strat`` command that renders the stratigraphic
+diagrams of one or more CSV (or TSV) files without writing python code, e.g.::
+
+    $ psy-strat examples/pollen-data.csv -g examples/epd-groups.tsv \\
+          --default-group Temperature -p Pollen \\
+          -s Pollen='Trees and shrubs,Herbs' -w Temperature=0.1 Pollen=0.9 \\
+          -o '%(name)s.pdf'
+
+See ``psy-strat --help`` for all options. The heavy imports (psyplot,
+matplotlib, etc.) only happen after the arguments have been parsed"""
+from __future__ import print_function
+import os
+import sys
+import glob
+import argparse
+
+
+def _mapping(value):
+    """Parse a ``key=value`` pair from the command line"""
+    try:
+        key, val = value.split('=', 1)
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            "Expected a key=value pair, got %r" % (value, ))
+    return key, val
+
+
+def _flag_or_list(value):
+    """Convert an argument with ``nargs='*'`` to the :func:`stratplot` style
+
+    An empty list (the flag has been set without any group) means all groups
+    """
+    if value is None:
+        return []
+    return value or True
+
+
+def get_parser():
+    """Get the parser for the ``psy-strat`` command
+
+    Returns
+    -------
+    argparse.ArgumentParser
+        The parser for the command line arguments"""
+    from psy_strat import __version__
+    parser = argparse.ArgumentParser(
+        'psy-strat', description=(
+            'Render stratigraphic diagrams from CSV or TSV files. Each file '
+            'is rendered into its own output file.'))
+    parser.add_argument('-V', '--version', action='version',
+                        version='%(prog)s ' + __version__)
+    parser.add_argument(
+        'input', nargs='+', metavar='FILE',
+        help=('The input files. The first column is used as the index (e.g. '
+              'the depth or age). Glob patterns such as "sites/*.csv" are '
+              'expanded'))
+    parser.add_argument(
+        '-o', '--output', default='%(name)s.png',
+        help=('The output file name. "%%(name)s" is replaced by the name of '
+              'the input file (without extension) and "%%(i)s" by its '
+              'position. The format (e.g. png, pdf or svg) is determined by '
+              'the extension. Default: %(default)s'))
+    parser.add_argument(
+        '-g', '--groups', metavar='FILE',
+        help=('A table with two columns that maps the columns of the input '
+              'files to their group (see the epd-groups.tsv in the examples '
+              'folder)'))
+    parser.add_argument(
+        '--default-group', metavar='GROUP',
+        help='The group for columns that are not found in the --groups table')
+
+    group = parser.add_argument_group('Diagram options')
+    group.add_argument(
+        '-p', '--percentages', nargs='*', metavar='GROUP',
+        help=('The groups that represent percentage data. If set without '
+              'a group, all groups are considered as percentages'))
+    group.add_argument(
+        '--no-calculate-percentages', action='store_false',
+        dest='calculate_percentages',
+        help='Do not rescale the percentages groups to sum up to 100%%')
+    group.add_argument(
+        '-w', '--widths', nargs='+', type=_mapping, metavar='GROUP=WIDTH',
+        help='The relative widths of the groups, e.g. "Pollen=0.9"')
+    group.add_argument(
+        '-s', '--subgroups', nargs='+', type=_mapping,
+        metavar='GROUP=SUB1,SUB2',
+        help=('The subgroups of a group, e.g. '
+              '"Pollen=Trees and shrubs,Herbs"'))
+    group.add_argument(
+        '-t', '--thresh', type=float, default=0.01,
+        help=('The minimum percentage that a column of a percentages group '
+              'must exceed to be shown. Default: %(default)s'))
+    group.add_argument(
+        '--min-percentage', type=float, default=20.0,
+        help=('The minimum x-limit of the percentages plots. '
+              'Default: %(default)s'))
+    group.add_argument(
+        '--min-occurences', type=int, default=0,
+        help=('The minimum number of samples where a column must not be '
+              'zero to be shown. Default: %(default)s'))
+    group.add_argument(
+        '-e', '--exclude', nargs='+', default=[], metavar='NAME',
+        help='The groups or columns that shall not be shown')
+    for name, help in [
+            ('stacked', 'The groups that are plotted as stacked areas'),
+            ('summed', ('The groups (or subgroups) that are summed up in an '
+                        'extra plot')),
+            ('all-in-one', 'The groups that are drawn into one single axes'),
+            ('compact', ('The groups that are drawn in the compact mode (one '
+                         'axes per subgroup)')),
+            ('heatmap', 'The groups that are drawn as a heatmap'),
+            ('use-bars', 'The groups that are drawn as bars')]:
+        group.add_argument(
+            '--' + name, nargs='*', metavar='GROUP',
+            help=help + '. If set without a group, all groups are used')
+
+    group = parser.add_argument_group('Output options')
+    group.add_argument(
+        '--figsize', nargs=2, type=float, metavar=('WIDTH', 'HEIGHT'),
+        help='The size of the figures in inches')
+    group.add_argument('--dpi', type=float,
+                       help='The resolution of raster output files')
+    group.add_argument(
+        '--sep', help=('The delimiter of the input files. By default, .tsv '
+                       'and .tab files are tab-separated and everything else '
+                       'is comma-separated'))
+    group.add_argument(
+        '-j', '--jobs', type=int, default=1,
+        help=('The number of processes for rendering the files in parallel. '
+              'Use 0 for all available CPUs. Default: %(default)s'))
+    return parser
+
+
+def _expand(patterns):
+    """Expand the glob patterns in the list of input files"""
+    files = []
+    for pattern in patterns:
+        if glob.has_magic(pattern):
+            files.extend(sorted(glob.glob(pattern)))
+        else:
+            files.append(pattern)
+    return files
+
+
+def main(args=None):
+    """Run the ``psy-strat`` command
+
+    Parameters
+    ----------
+    args: list of str
+        The command line arguments. If None, :attr:`sys.argv` is used
+
+    Returns
+    -------
+    int
+        The exit status, 0 if all files have been rendered successfully,
+        otherwise 1"""
+    parser = get_parser()
+    args = parser.parse_args(args)
+    files = _expand(args.input)
+    if not files:
+        parser.error('No input files found for %s' % ', '.join(args.input))
+    import pandas as pd
+    from psy_strat.stratplot import stratplot_many, GroupIndex, NOGROUP
+    kwargs = dict(
+        thresh=args.thresh, min_percentage=args.min_percentage,
+        min_occurences=args.min_occurences, exclude=args.exclude,
+        calculate_percentages=args.calculate_percentages,
+        percentages=_flag_or_list(args.percentages),
+        stacked=_flag_or_list(args.stacked),
+        summed=_flag_or_list(args.summed),
+        all_in_one=_flag_or_list(args.all_in_one),
+        compact=_flag_or_list(args.compact),
+        heatmap=_flag_or_list(args.heatmap),
+        use_bars=_flag_or_list(args.use_bars))
+    if args.widths:
+        kwargs['widths'] = {key: float(val) for key, val in args.widths}
+    if args.subgroups:
+        kwargs['subgroups'] = {key: val.split(',')
+                               for key, val in args.subgroups}
+    if args.groups:
+        ext = os.path.splitext(args.groups)[1].lower()
+        table = pd.read_csv(args.groups, dtype=str,
+                            sep='\t' if ext in ['.tsv', '.tab'] else ',')
+        kwargs['group_func'] = GroupIndex(
+            table, default=args.default_group or NOGROUP)
+    elif args.default_group:
+        kwargs['group_func'] = GroupIndex({}, default=args.default_group)
+    read_kws = {'sep': args.sep} if args.sep else None
+    savefig_kws = {'dpi': args.dpi} if args.dpi else None
+    # render a single job in this process to avoid the overhead of a pool
+    processes = 0 if args.jobs == 1 else (args.jobs or None)
+    ret = stratplot_many(
+        files, args.output, processes=processes,
+        figsize=args.figsize, savefig_kws=savefig_kws, read_kws=read_kws,
+        **kwargs)
+    failed = ret['error'].notnull()
+    for name, row in ret[~failed].iterrows():
+        print('%s: %s (%1.2fs)' % (name, row['output'], row['total']))
+    for name, row in ret[failed].iterrows():
+        print('Failed to render %s:\n%s' % (name, row['error']),
+              file=sys.stderr)
+    return int(failed.any())
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -4,10 +4,17 @@ This module defines the plotters for the psy-strat package.
 """
 from __future__ import division
 import textwrap
-from itertools import cycle
-from psyplot.data import safe_list
+from copy import deepcopy
+from itertools import cycle, repeat, islice
+from collections import defaultdict
+import matplotlib as mpl
+import matplotlib.ticker as mticker
+import matplotlib.transforms as mt
+from matplotlib.collections import LineCollection, PolyCollection
+from psyplot.data import safe_list, InteractiveList
+from psyplot.utils import unique_everseen
 from psyplot.plotter import (
-    Formatoption, DictFormatoption, BEFOREPLOTTING, START)
+    Formatoption, DictFormatoption, BEFOREPLOTTING, START, END)
 import six
 import psy_simple.plotters as psyps
 from psy_simple.base import (
@@ -143,51 +150,85 @@ class AxesGrouper(TextBase, Formatoption):
         self.texts = []
         self.annotations = []
         super(AxesGrouper, self).initialize_plot(value)
-        # redraw the annotation on resize to make sure it stays at the same
-        # place as the text
-        self.ax.figure.canvas.mpl_connect('resize_event', self.onresize)
 
     def update(self, value):
-        self.remove()
         if value is None:
+            self.remove()
             return
         self.set_params(value)
         self.create_text(value)
         self.create_annotations()
 
-    def create_text(self, value):
+    def get_transform(self):
+        """Get the transform for the text of the group
+
+        The text is shifted horizontally by the height of the bar (in pixels)
+        to follow the rotated titles. This shift is evaluated when the figure
+        is drawn, such that the text does not have to be recreated when the
+        figure is resized"""
         if self.angle == 90:
-            xstart = self.y_px
+            dx = self.y
+        else:
+            dx = self.y * np.tan(self.angle * np.pi / 180.)
+        fig = self.ax.figure
+        # transforms a length in units of the figure height into pixels on
+        # the x-axis
+        height2x = fig.transFigure + mt.Affine2D(
+            np.array([[0., 1., 0.], [1., 0., 0.], [0., 0., 1.]]))
+        return fig.transFigure + mt.ScaledTranslation(0, dx, height2x)
+
+    def create_text(self, value):
+        """Create the text of the group or update the existing one"""
+        pos = ((self.x0 + self.x1) / 2.0, self.top + self.y)
+        s = self.replace(value[1], self.data)
+        if self.texts:
+            text = self.texts[0]
+            text.set_position(pos)
+            text.set_text(s)
+            text.set_transform(self.get_transform())
         else:
-            xstart = self.y_px * np.tan(self.angle * np.pi / 180.)
-        tr = self.ax.figure.transFigure.inverted()
-        xstart = tr.transform((xstart, self.y_px))[0]
-        self.texts.append(
-            self.ax.text(xstart + (self.x0 + self.x1) / 2.0,
-                         self.top + self.y,
-                         self.replace(value[1], self.data),
-                         ha='center', va='bottom',
-                         transform=self.ax.figure.transFigure,
-                         bbox=dict(facecolor='w', edgecolor='none')))
+            self.texts.append(
+                self.ax.text(*pos, s=s, ha='center', va='bottom',
+                             transform=self.get_transform(),
+                             bbox=dict(facecolor='w', edgecolor='none')))
 
     def create_annotations(self):
-        """Annotate from the left to the right axes"""
+        """Annotate from the left to the right axes
+
+        Existing annotations are updated in place"""
         fmtos = [self] + list(self.shared)
         boxes = [fmto.ax.get_position() for fmto in fmtos]
         fmto0 = min(zip(fmtos, boxes), key=lambda t: t[1].x0)[0]
         fmto1 = max(zip(fmtos, boxes), key=lambda t: t[1].x0)[0]
-        t0 = fmto0.ax._left_title
-        t1 = fmto1.ax._left_title
+        t0 = self.get_left_title(fmto0)
+        t1 = self.get_right_title(fmto1)
+        zorder = self.texts[0].get_zorder() - 0.1
+        connectionstyle = "angle,angleA=%1.3f,angleB=0" % self.angle
+        if self.annotations:
+            for annotation, title in zip(self.annotations, [t0, t1]):
+                annotation.xycoords = self.texts[0]
+                annotation.anncoords = title
+                annotation.set_zorder(zorder)
+                annotation.arrow_patch.set_connectionstyle(connectionstyle)
+            return
         kws = dict(
-            zorder=self.texts[0].get_zorder() - 0.1,
-            arrowprops=dict(
-                arrowstyle="-",
-                connectionstyle="angle,angleA=%1.3f,angleB=0" % self.angle))
+            zorder=zorder,
+            arrowprops=dict(arrowstyle="-", connectionstyle=connectionstyle))
         ax = self.ax
         self.annotations = [
             ax.annotate("", (0.0, 0.5), (0.0, 0.0), self.texts[0], t0, **kws),
             ax.annotate("", (1.0, 0.5), (0.0, 0.0), self.texts[0], t1, **kws)]
 
+    @staticmethod
+    def get_left_title(fmto):
+        """Get the title text where the left annotation should point to"""
+        return fmto.ax._left_title
+
+    @staticmethod
+    def get_right_title(fmto):
+        """Get the title text where the right annotation should point to"""
+        return fmto.ax._left_title
+
     def set_params(self, value):
         """Set the parameters for the annotation and the text"""
         y, s = value
@@ -204,17 +245,10 @@ class AxesGrouper(TextBase, Formatoption):
             x1 = max(bbox.x0 for bbox in boxes)
         self.x0 = x0
         self.x1 = x1
-        tr = self.ax.figure.transFigure
         self.y = y * this_bbox.height
-        self.y_px = (tr.transform((x0, top + self.y))[1] -
-                     tr.transform((x0, top))[1])
         self.top = top
         self.angle = self.titleprops.value.get('rotation', 45)
 
-    def onresize(self, event):
-        if self.shared:
-            self.update(self.value)
-
     def remove(self, annotation=True, text=True):
         if text:
             for t in self.texts[:]:
@@ -269,6 +303,174 @@ class AxisLineStyle(DictFormatoption):
                 spine.set_linewidth(self.default_lw[pos])
 
 
+class SharedMeasurementLines(LineCollection):
+    """Measurement lines that span all the plots of a figure
+
+    The lines are drawn at the union of the y-values of the registered
+    :class:`MeasurementLines` formatoptions (see the `hlines_shared`
+    formatoption). On the x-axis, they span the visible axes of these
+    formatoptions, on the y-axis, they use the data coordinates of the
+    (shared) y-axis"""
+
+    def __init__(self, ax, **kwargs):
+        """
+        Parameters
+        ----------
+        ax: matplotlib.axes.Axes
+            The axes whose y-axis is used for the lines
+        ``**kwargs``
+            Any other keyword argument for the
+            :class:`matplotlib.collections.LineCollection`"""
+        #: The y-values of the registered formatoptions
+        self.members = {}
+        #: The y-values that have been appended since the last draw
+        self._appended = defaultdict(list)
+        #: The RGBA color of the lines
+        self.rgba = None
+        self._changed = False
+        fig = ax.figure
+        #: The horizontal extent of the lines in figure coordinates
+        self.xbox = mt.Bbox.unit()
+        xtrans = mt.BboxTransformTo(mt.TransformedBbox(self.xbox,
+                                                       fig.transFigure))
+        kwargs.setdefault('zorder', -1)
+        super(SharedMeasurementLines, self).__init__(
+            [], transform=mt.blended_transform_factory(xtrans, ax.transData),
+            **kwargs)
+        self.set_clip_box(mt.TransformedBbox(
+            self.xbox, mt.blended_transform_factory(fig.transFigure,
+                                                    ax.transAxes)))
+
+    @classmethod
+    def get(cls, ax, color):
+        """Get the shared lines of the figure of `ax` or create them
+
+        Parameters
+        ----------
+        ax: matplotlib.axes.Axes
+            The axes of the plot
+        color: object
+            The color of the lines
+
+        Returns
+        -------
+        SharedMeasurementLines
+            The lines of the given `color` in the figure of `ax`"""
+        fig = ax.figure
+        rgba = mpl.colors.to_rgba(color)
+        for artist in fig.artists:
+            if isinstance(artist, cls) and artist.rgba == rgba:
+                return artist
+        ret = cls(ax, color=color)
+        ret.rgba = rgba
+        return fig.add_artist(ret)
+
+    def add(self, fmto, ys):
+        """Register the y-values of a :class:`MeasurementLines` formatoption
+
+        Parameters
+        ----------
+        fmto: MeasurementLines
+            The formatoption whose plot shall be covered by the lines
+        ys: np.ndarray
+            The sorted unique y-values of the data of `fmto`"""
+        self.members[fmto] = ys
+        self._appended.pop(fmto, None)
+        self._changed = True
+        self.stale = True
+
+    def extend(self, fmto, ys):
+        """Append y-values to a registered :class:`MeasurementLines`
+
+        The values are only merged with the registered ones when the lines
+        are drawn, such that the costs of this method do not depend on the
+        number of y-values that are already registered
+
+        Parameters
+        ----------
+        fmto: MeasurementLines
+            The formatoption that has been registered via :meth:`add`
+        ys: np.ndarray
+            The sorted unique y-values of the new data of `fmto`"""
+        self._appended[fmto].append(ys)
+        self._changed = True
+        self.stale = True
+
+    def discard(self, fmto):
+        """Remove a formatoption from the lines
+
+        The lines are removed from the figure when the last formatoption has
+        been removed
+
+        Parameters
+        ----------
+        fmto: MeasurementLines
+            The formatoption that has been registered via :meth:`add`"""
+        self._appended.pop(fmto, None)
+        if self.members.pop(fmto, None) is None:
+            return
+        if self.members:
+            self._changed = True
+            self.stale = True
+        else:
+            self.remove()
+
+    def draw(self, renderer):
+        boxes = [fmto.ax.get_position() for fmto in self.members
+                 if fmto.ax.get_visible()]
+        if boxes:
+            self.xbox.intervalx = (min(bbox.x0 for bbox in boxes),
+                                   max(bbox.x1 for bbox in boxes))
+        if self._changed:
+            for fmto, appended in self._appended.items():
+                if fmto in self.members:
+                    self.members[fmto] = np.union1d(
+                        self.members[fmto], np.concatenate(appended))
+            self._appended.clear()
+            # the plots usually share the same index, so we only merge the
+            # y-values that differ
+            ys = None
+            for arr in self.members.values():
+                if ys is None:
+                    ys = arr
+                elif len(arr) != len(ys) or not (arr == ys).all():
+                    ys = np.union1d(ys, arr)
+            self.set_segments(np.stack([
+                np.tile([0., 1.], (len(ys), 1)),
+                np.repeat(ys[:, np.newaxis], 2, axis=1)], axis=-1))
+            self._changed = False
+        super(SharedMeasurementLines, self).draw(renderer)
+
+
+class HlinesShared(Formatoption):
+    """
+    Draw the measurement lines of all plots in a figure at once
+
+    If True, the lines of the `hlines` formatoption are not drawn into each
+    axes. Instead, all plots in the figure with the same `hlines` color
+    share one artist (see :class:`SharedMeasurementLines`) whose lines span
+    the entire diagram. This is much faster for diagrams with many axes.
+    Note that the background of the axes is made transparent to show the
+    lines
+
+    Possible types
+    --------------
+    bool
+        If True, share the measurement lines with the other plots
+
+    See Also
+    --------
+    hlines"""
+
+    priority = BEFOREPLOTTING
+
+    name = 'Share the measurement lines'
+
+    def update(self, value):
+        # Does nothing, the value is used in the :class:`MeasurementLines`
+        pass
+
+
 class MeasurementLines(Formatoption):
     """
     Draw lines at the measurement locations
@@ -279,13 +481,20 @@ class MeasurementLines(Formatoption):
         Don't draw any lines
     color
         The color of the lines
-    """
+
+    See Also
+    --------
+    hlines_shared"""
 
     default = None
 
     artists = None
 
-    dependencies = ['transpose', 'xlim', 'plot']
+    #: The :class:`SharedMeasurementLines` if the `hlines_shared`
+    #: formatoption is True
+    shared_artist = None
+
+    dependencies = ['transpose', 'xlim', 'plot', 'hlines_shared']
 
     def update(self, value):
         self.remove()
@@ -293,9 +502,16 @@ class MeasurementLines(Formatoption):
             return
         get_y = self.transpose.get_y
         ys = np.unique(np.concatenate([get_y(arr) for arr in self.iter_data]))
-        if self.plot.value is not None:
-            kws = {'zorder': self.plot._plot[0].get_zorder() - 0.2}
+        if self.hlines_shared.value:
+            self.shared_artist = SharedMeasurementLines.get(self.ax, value)
+            self.shared_artist.add(self, ys)
+            self.ax.patch.set_visible(False)
+            return
+        artists = getattr(self.plot, '_plot', None)
+        if self.plot.value is not None and artists:
+            kws = {'zorder': artists[0].get_zorder() - 0.2}
         else:
+            # nothing is plotted, e.g. because all arrays are hidden
             kws = {}
         self.artists = self.ax.hlines(ys, *self.xlim.range, color=value, **kws)
 
@@ -303,12 +519,20 @@ class MeasurementLines(Formatoption):
         if self.artists is not None:
             self.artists.remove()
             self.artists = None
+        if self.shared_artist is not None:
+            self.shared_artist.discard(self)
+            self.shared_artist = None
+            self.ax.patch.set_visible(True)
 
 
 class ExagFactor(Formatoption):
     """
     The exaggerations factor
 
+    The exaggerations are scaled by a transform, i.e. changing this
+    formatoption does not replot the data. Share it with the other plotters
+    of a group to change the exaggerations of the entire group at once
+
     Possible types
     --------------
     float
@@ -319,24 +543,39 @@ class ExagFactor(Formatoption):
     exag_color, exag
     """
 
-    priority = BEFOREPLOTTING
+    # the transform is updated after the plot has been made
+    priority = END
 
     name = 'Exaggeration factor'
 
+    dependencies = ['transpose']
+
+    def __init__(self, *args, **kwargs):
+        super(ExagFactor, self).__init__(*args, **kwargs)
+        #: The :class:`matplotlib.transforms.Affine2D` that scales the data
+        #: of the :class:`ExagPlot`
+        self.transform = mt.Affine2D()
+
     def update(self, value):
-        # Does nothing
-        pass
+        if self.transpose.value:
+            self.transform.clear().scale(value, 1)
+        else:
+            self.transform.clear().scale(1, value)
 
 
 class ExagPlot(psyps.LinePlot):
 
     __doc__ = psyps.LinePlot.__doc__
 
-    dependencies = ['exag_factor']
+    # the exag_factor only changes the transform of the artists
+    connections = ['exag_factor']
 
-    def plot_arr(self, arr, *args, **kwargs):
-        return super(ExagPlot, self).plot_arr(
-            arr * self.exag_factor.value, *args, **kwargs)
+    def make_plot(self):
+        super(ExagPlot, self).make_plot()
+        # exaggerate the data through the transform instead of copying it
+        transform = self.exag_factor.transform + self.ax.transData
+        for artist in getattr(self, '_plot', []):
+            artist.set_transform(transform)
 
 
 class Occurences(Formatoption):
@@ -368,21 +607,38 @@ class Occurences(Formatoption):
 
     children = ['maskless', 'maskleq', 'maskgreater', 'maskgeq']
 
+    #: The mask of the occurences. A boolean array with one row for each
+    #: array (or a list of boolean arrays, if the arrays have different
+    #: shapes)
+    occurences = None
+
     def update(self, value):
         if value is None:
+            self.occurences = None
             return
-        self.occurences = []
         try:
             value = list(value)
         except TypeError:
             value = [-np.inf, value]
         vmin, vmax = value
-        for i, arr in enumerate(self.iter_data):
-            new_arr = arr.copy(True)
-            mask = (arr.values >= vmin) & (arr.values <= vmax)
-            self.occurences.append(mask)
-            new_arr.values[mask] = 0
-            self.set_data(new_arr, i)
+        arrays = list(self.iter_data)
+        values = [np.asarray(arr.values) for arr in arrays]
+        if len(set(v.shape for v in values)) == 1:
+            # mask the entire block of the group at once
+            values = np.stack(values)
+            mask = (values >= vmin) & (values <= vmax)
+            values[mask] = 0
+        else:
+            values = [v.copy() for v in values]
+            mask = [(v >= vmin) & (v <= vmax) for v in values]
+            for m, v in zip(mask, values):
+                v[m] = 0
+        self.occurences = mask
+        # the original arrays are kept in the data of the plotter, the plot
+        # data only gets new values for the arrays with occurences
+        for i, (arr, m, v) in enumerate(zip(arrays, mask, values)):
+            if m.any():
+                self.set_data(arr.copy(deep=False, data=v), i)
 
 
 class OccurenceMarker(Formatoption):
@@ -446,17 +702,29 @@ class OccurencePlot(Formatoption):
             return
         elif value is None:
             value = np.mean(self.xlim.range)
+        # the plot data might be decimated, so we use the original data
+        arrays = list(self.iter_raw_data)[:len(self.color.colors)]
+        masks = self.occurences.occurences[:len(arrays)]
+        n = len(arrays)
+        counts = [mask.sum() for mask in masks]
+        # draw the occurences of all arrays with the same marker at once
+        x = np.concatenate([arr[arr.dims[-1]].values[mask]
+                            for arr, mask in zip(arrays, masks)])
+        y = np.repeat(list(islice(cycle(safe_list(value)), n)), counts)
+        if self.transpose.value:
+            x, y = y, x
+        colors = np.repeat(
+            mpl.colors.to_rgba_array(self.color.colors[:n]), counts, axis=0)
+        markers = np.repeat(
+            list(islice(cycle(self.occurence_marker.value), n)), counts)
         self._artists = artists = []
-        for mask, arr, val, color, marker in zip(
-                self.occurences.occurences, self.iter_data,
-                cycle(safe_list(value)), self.color.colors,
-                cycle(self.occurence_marker.value)):
-            x = arr[arr.dims[-1]].values[mask]
-            y = [val] * len(x)
-            if self.transpose.value:
-                x, y = y, x
-            artists.extend(
-                self.ax.plot(x, y, marker=marker, color=color, lw=0))
+        for marker in unique_everseen(markers):
+            selected = markers == marker
+            artists.append(self.ax.scatter(
+                x[selected], y[selected], c=colors[selected], marker=marker,
+                s=mpl.rcParams['lines.markersize'] ** 2,
+                linewidths=mpl.rcParams['lines.markeredgewidth'],
+                zorder=mpl.lines.Line2D.zorder))
 
     def remove(self):
         if self._artists is not None:
@@ -468,12 +736,1007 @@ class OccurencePlot(Formatoption):
             del self._artists
 
 
+class MinMaxPyramid(object):
+    """A pyramid of the minima and maxima of a block of arrays
+
+    Level ``k`` of the pyramid holds the minimum and the maximum of each
+    array in consecutive blocks of ``2**k`` samples as 32-bit floats. The
+    :class:`Decimate` formatoption uses it to select the data of a view
+    without going through the entire record"""
+
+    def __init__(self, y, values):
+        """
+        Parameters
+        ----------
+        y: np.ndarray
+            The strictly monotonic index of the arrays
+        values: np.ndarray
+            The data with one row per array"""
+        #: The index of the arrays
+        self.y = y
+        #: Whether the index is decreasing
+        self.descending = len(y) > 1 and y[-1] < y[0]
+        #: list of tuples ``(mins, maxs)``. The minima and maxima of the
+        #: levels 1, 2, ... with one row per array
+        self.levels = []
+        mins = maxs = np.asarray(values, dtype=np.float32)
+        while mins.shape[1] > 1:
+            if mins.shape[1] % 2:
+                mins = np.concatenate([mins, mins[:, -1:]], axis=1)
+                maxs = np.concatenate([maxs, maxs[:, -1:]], axis=1)
+            mins = np.fmin(mins[:, ::2], mins[:, 1::2])
+            maxs = np.fmax(maxs[:, ::2], maxs[:, 1::2])
+            self.levels.append((mins, maxs))
+
+    @staticmethod
+    def is_monotonic(y):
+        """Check whether a pyramid can be built for the index `y`"""
+        diff = np.diff(y)
+        return bool((diff > 0).all() or (diff < 0).all())
+
+    def select(self, lo, hi, nbins):
+        """Select the data between `lo` and `hi`
+
+        Parameters
+        ----------
+        lo: float
+            The lower limit of the index
+        hi: float
+            The upper limit of the index
+        nbins: int
+            The maximum number of blocks
+
+        Returns
+        -------
+        np.ndarray
+            The positions of the samples in the index. For blocks of the
+            pyramid, the first and the last sample of each block
+        np.ndarray or None
+            The minimum and the maximum of each block (at the positions of
+            the first and the last sample) with one row per array or None
+            if the original data shall be used at the given positions"""
+        y = self.y
+        n = len(y)
+        if self.descending:
+            rev = y[::-1]
+            i0 = n - rev.searchsorted(hi, 'right')
+            i1 = n - rev.searchsorted(lo, 'left')
+        else:
+            i0 = y.searchsorted(lo, 'left')
+            i1 = y.searchsorted(hi, 'right')
+        count = i1 - i0
+        # continue the lines to the neighbours outside of the limits
+        i0 = max(i0 - 1, 0)
+        i1 = min(i1 + 1, n)
+        if count <= nbins:
+            return np.arange(i0, i1), None
+        k = min(int(np.ceil(np.log2(count / nbins))), len(self.levels))
+        size = 2 ** k
+        j0 = i0 // size
+        j1 = -(-i1 // size)
+        mins, maxs = self.levels[k - 1]
+        starts = np.arange(j0, j1) * size
+        ends = np.minimum(starts + size, n) - 1
+        values = np.stack([mins[:, j0:j1], maxs[:, j0:j1]], axis=-1)
+        return (np.c_[starts, ends].ravel(),
+                values.reshape((len(mins), -1)))
+
+
+class Decimate(Formatoption):
+    """
+    Reduce long records to the resolution of the axes
+
+    This formatoption splits the visible part of the index into bins and
+    only keeps the samples with the minimum and the maximum value of each
+    array in each bin. The peaks of the data are therefore preserved while
+    the number of plotted samples does not depend on the length of the
+    record. For a monotonic index, the minima and maxima are taken from a
+    :class:`MinMaxPyramid` that is built once for the data, such that
+    zooming does not depend on the length of the record either. The plots,
+    the exaggerations and the measurement lines use the reduced data. The
+    bins are recomputed when the limits of the index axis change (e.g. when
+    zooming into or out of the plot)
+
+    Possible types
+    --------------
+    None
+        Plot every sample
+    True
+        Use one bin per pixel of the axes
+    int
+        The number of bins for the visible part of the index
+
+    See Also
+    --------
+    occurences
+    """
+
+    priority = START
+
+    name = 'Decimate the data'
+
+    requires_replot = True
+
+    data_dependent = True
+
+    dependencies = ['occurences', 'transpose']
+
+    connections = ['plot', 'exag', 'hlines']
+
+    #: The indices of the samples that are plotted or None, if the data is
+    #: not decimated
+    indices = None
+
+    #: The lower and upper limit of the index that has been decimated
+    limits = None
+
+    #: The :class:`MinMaxPyramid` of the data or None, if the data is
+    #: decimated by sorting the samples into the bins
+    pyramid = None
+
+    _cid = None
+
+    #: The ids of the limit callbacks of the axes that share the index
+    _lim_cids = {}
+
+    def update(self, value):
+        self.disconnect()
+        arrays = list(self.iter_raw_data)
+        if value is None:
+            if self.indices is not None:
+                self.indices = self.limits = self.pyramid = None
+                self._set_plot_data(arrays)
+            return
+        y = np.asarray(arrays[0][arrays[0].dims[-1]].values, dtype=float)
+        self._range = np.nanmin(y), np.nanmax(y)
+        # the minima and maxima of the members of a stacked plot cannot be
+        # stacked, so we only build the pyramid for the other plots
+        if ('stacked' not in safe_list(self.plot.value) and
+                MinMaxPyramid.is_monotonic(y)):
+            masks = self.occurences.occurences
+            values = np.stack([np.asarray(arr.values, dtype=float)
+                               for arr in arrays])
+            if masks is not None:
+                values[np.stack(masks)] = 0
+            self.pyramid = MinMaxPyramid(y, values)
+        else:
+            self.pyramid = None
+        self._decimate(arrays, self._range)
+        self._lim_cids = {}
+        self.connect()
+        # axes that share the index with this plot might be created later
+        self._cid = self.ax.figure.canvas.mpl_connect(
+            'draw_event', self.connect)
+
+    def _decimate(self, arrays, limits):
+        """Set the plot data of the arrays within the given `limits`"""
+        value = self.value
+        if value is True:
+            bbox = self.ax.bbox
+            value = bbox.height if self.transpose.value else bbox.width
+        nbins = max(int(value), 1)
+        self.limits = lo, hi = limits
+        if self.pyramid is not None:
+            self.indices, values = self.pyramid.select(lo, hi, nbins)
+            self._set_plot_data(arrays, self.indices, values)
+            return
+        y = np.asarray(arrays[0][arrays[0].dims[-1]].values, dtype=float)
+        inside = np.where((y >= lo) & (y <= hi))[0]
+        if len(inside) <= 2 * nbins or hi <= lo:
+            indices = inside
+        else:
+            bins = ((y[inside] - lo) / (hi - lo) * nbins).astype(int)
+            bins = bins.clip(0, nbins - 1)
+            indices = [inside[[0, -1]]]
+            for arr in arrays:
+                vals = np.asarray(arr.values, dtype=float)[inside]
+                # sort by bin and value to get the minimum and maximum of
+                # each bin
+                order = np.lexsort((vals, bins))
+                b = bins[order]
+                new_bin = np.r_[True, b[1:] != b[:-1]]
+                indices.append(inside[order[new_bin]])
+                indices.append(inside[order[np.r_[new_bin[1:], True]]])
+            indices = np.unique(np.concatenate(indices))
+        if len(indices):
+            # continue the lines to the neighbours outside of the limits
+            indices = np.union1d(indices, [max(indices[0] - 1, 0),
+                                           min(indices[-1] + 1, len(y) - 1)])
+        self.indices = indices
+        self._set_plot_data(arrays, indices)
+
+    def _set_plot_data(self, arrays, indices=None, values=None):
+        """Set the plot data from the original `arrays`
+
+        Parameters
+        ----------
+        arrays: list of xarray.DataArray
+            The original data
+        indices: np.ndarray
+            The positions of the samples to plot
+        values: np.ndarray
+            The values to use at the given `indices` (one row per array).
+            If None, the (masked) values of the `arrays` are used"""
+        masks = self.occurences.occurences
+        for i, arr in enumerate(arrays):
+            if values is None and masks is not None and masks[i].any():
+                arr = arr.copy(deep=False,
+                               data=np.where(masks[i], 0, arr.values))
+            if indices is not None:
+                arr = arr.isel(**{arr.dims[-1]: indices})
+            if values is not None:
+                arr = arr.copy(deep=False, data=values[i])
+            self.set_data(arr, i)
+
+    def check_view(self, ax=None):
+        """Decimate the data again if the view changed
+
+        The data is decimated again and replotted, if the plot has been
+        zoomed in by more than a factor of 2 or if the view covers data
+        outside of the decimated :attr:`limits`
+
+        Parameters
+        ----------
+        ax: matplotlib.axes.Axes
+            The axes whose limits changed. The index axis of this axes is
+            shared with the axes of this formatoption"""
+        ax = ax or self.ax
+        if self.indices is None or not self.ax.get_visible():
+            return
+        if self.transpose.value:
+            view = ax.get_ylim()
+        else:
+            view = ax.get_xlim()
+        lo = max(min(view), self._range[0])
+        hi = min(max(view), self._range[1])
+        vmin, vmax = self.limits
+        if lo >= vmin and hi <= vmax and hi - lo >= 0.5 * (vmax - vmin):
+            return
+        self._decimate(list(self.iter_raw_data), (lo, hi))
+        self.plot.make_plot()
+        if self.exag.value is not None:
+            self.exag.make_plot()
+        if self.hlines.value is not None:
+            self.hlines.update(self.hlines.value)
+
+    def connect(self, event=None):
+        """Check the view when the limits of the index axis change
+
+        Matplotlib only notifies the axes whose limits are set and not the
+        axes that share them. Therefore we connect to all axes that share the
+        index with the axes of this formatoption"""
+        if self.transpose.value:
+            signal = 'ylim_changed'
+            shared = self.ax.get_shared_y_axes()
+        else:
+            signal = 'xlim_changed'
+            shared = self.ax.get_shared_x_axes()
+        for ax in shared.get_siblings(self.ax):
+            if ax not in self._lim_cids:
+                self._lim_cids[ax] = ax.callbacks.connect(
+                    signal, self.check_view)
+
+    def disconnect(self):
+        """Stop checking the view"""
+        if self._cid is not None:
+            self.ax.figure.canvas.mpl_disconnect(self._cid)
+            self._cid = None
+        for ax, cid in self._lim_cids.items():
+            ax.callbacks.disconnect(cid)
+        self._lim_cids = {}
+
+    def remove(self):
+        self.disconnect()
+
+
+class StratLinePlot(psyps.LinePlot):
+
+    __doc__ = psyps.LinePlot.__doc__
+
+    #: The cache of a stacked plot. A tuple of the index values, the stacked
+    #: data block (one row per array) and the visibility of each array
+    _stacked = None
+
+    #: The collections of the visible arrays of a stacked plot, keyed by the
+    #: index of the array
+    _areas = None
+
+    def make_plot(self):
+        value = self.value
+        if value is not None and not any(v is not None
+                                         for v in safe_list(value)):
+            # all arrays are hidden
+            if hasattr(self, '_plot'):
+                self.remove()
+            self._plot = []
+            return
+        if value is None or 'stacked' not in safe_list(value):
+            self._stacked = self._areas = None
+            return super(StratLinePlot, self).make_plot()
+        arrays = list(self.iter_data)
+        visible = np.array([v is not None for arr, v in zip(
+            arrays, cycle(safe_list(value)))])
+        arr = arrays[0]
+        y = np.asarray(arr[arr.dims[-1]].values, dtype=float)
+        block = np.stack([np.asarray(arr.values, dtype=float)
+                          for arr in arrays])
+        block[np.isnan(block)] = 0
+        cached = self._stacked
+        if (cached is not None and hasattr(self, '_plot') and
+                cached[1].shape == block.shape and
+                np.array_equal(cached[0], y) and
+                np.array_equal(cached[1], block)):
+            # only the visibility changed, so we only update the areas
+            # of the arrays above the first change
+            changed = np.where(cached[2] != visible)[0]
+            start = changed[0] if len(changed) else len(arrays)
+        else:
+            if hasattr(self, '_plot'):
+                self.remove()
+            self._areas = {}
+            start = 0
+        self._stacked = y, block, visible
+        upper = np.cumsum(block * visible[:, np.newaxis], axis=0)
+        colors = list(islice(self.color.extended_colors, len(arrays)))
+        areas = self._areas
+        for i in range(start, len(arrays)):
+            coll = areas.pop(i, None)
+            if not visible[i]:
+                if coll is not None:
+                    coll.remove()
+                continue
+            lower = upper[i] - block[i]
+            if coll is None:
+                fill = (self.ax.fill_betweenx if self.transpose.value else
+                        self.ax.fill_between)
+                coll = fill(y, lower, upper[i], color=colors[i])
+            else:
+                verts = np.r_[np.c_[lower, y], np.c_[upper[i], y][::-1]]
+                if not self.transpose.value:
+                    verts = verts[:, ::-1]
+                coll.set_verts([verts])
+            areas[i] = coll
+        self._plot = [areas[i] for i in sorted(areas)]
+
+    def remove(self):
+        self._stacked = self._areas = None
+        super(StratLinePlot, self).remove()
+
+
+class StratBarPlot(psyps.BarPlot):
+
+    __doc__ = psyps.BarPlot.__doc__
+
+    def make_plot(self):
+        if hasattr(self, '_plot'):
+            self.remove()
+        if self.value is None:
+            return
+        values = safe_list(self.value)
+        stacked = 'stacked' in values
+        # each array gets one collection with all its bars
+        xys = []
+        for arr, val, c in zip(self.iter_data, cycle(values),
+                               self.color.extended_colors):
+            if val is None:
+                continue
+            x, y, width = self.get_xys(arr)
+            if np.asarray(x).dtype.kind not in 'biuf':
+                # let matplotlib handle the conversion of dates, etc.
+                return super(StratBarPlot, self).make_plot()
+            xys.append((x, y, width, c))
+        alpha = self.alpha.value
+        self._plot = containers = []
+        base = 0
+        for x, y, width, c in xys:
+            y = np.asarray(y, dtype=float)
+            if stacked:
+                # stacked bars are centered on the data points, the same as
+                # in the psy_simple.plotters.BarPlot
+                x = np.asarray(x, dtype=float) - np.asarray(width) / 2.
+                y = np.where(np.isnan(y), 0, y)
+            containers.append(self._draw_bars(x, y, width, base, c, alpha))
+            if stacked:
+                base = base + y
+        self.ax.autoscale_view()
+
+    def _draw_bars(self, x, y, width, base, color, alpha):
+        """Draw the bars of one array into a single collection
+
+        This draws the same rectangles as :meth:`matplotlib.axes.Axes.bar`
+        (or :meth:`~matplotlib.axes.Axes.barh` for transposed plots) with
+        ``align='edge'`` but with one
+        :class:`matplotlib.collections.PolyCollection` instead of one patch
+        per bar. Centered bars are drawn by shifting `x` by half of the
+        `width`"""
+        x = np.asarray(x, dtype=float)
+        width = np.broadcast_to(width, x.shape)
+        base = np.broadcast_to(base, x.shape)
+        # empty bars are not visible, so we do not draw them at all
+        mask = np.isfinite(x) & np.isfinite(y) & (y != 0)
+        x0 = x[mask]
+        x1 = x0 + width[mask]
+        y0 = base[mask]
+        y1 = y0 + y[mask]
+        verts = np.stack([np.c_[x0, y0], np.c_[x0, y1], np.c_[x1, y1],
+                          np.c_[x1, y0]], axis=1)
+        if self.transpose.value:
+            verts = verts[..., ::-1]
+        coll = PolyCollection(verts, facecolors=[color], alpha=alpha,
+                              edgecolors='none')
+        # do not autoscale beyond the base, the same as for a bar plot
+        if self.transpose.value:
+            coll.sticky_edges.x.append(0)
+        else:
+            coll.sticky_edges.y.append(0)
+        return self.ax.add_collection(coll)
+
+
+class SlotScale(Formatoption):
+    """
+    Specify the widths of the slots in a compact plot
+
+    Possible types
+    --------------
+    'equal'
+        Each variable gets a slot of the same width and the data is scaled to
+        the slot limits
+    'data'
+        The width of each slot is proportional to the range of its x-limits
+        (useful for percentages data)
+
+    See Also
+    --------
+    slot_min, xlim"""
+
+    priority = BEFOREPLOTTING
+
+    group = 'axes'
+
+    name = 'Widths of the slots'
+
+    def update(self, value):
+        # Does nothing, the value is used in the :class:`CompactPlot`
+        pass
+
+
+class SlotMin(Formatoption):
+    """
+    Specify the minimal upper limit of each slot
+
+    Possible types
+    --------------
+    None
+        Use the limits as they are specified by the :attr:`xlim` formatoption
+    float
+        The minimal upper x-limit of each slot
+
+    See Also
+    --------
+    slot_scale, xlim"""
+
+    priority = BEFOREPLOTTING
+
+    group = 'axes'
+
+    name = 'Minimal upper limit of the slots'
+
+    def update(self, value):
+        # Does nothing, the value is used in the :class:`CompactXlim`
+        pass
+
+
+class CompactXlim(psyps.Xlim):
+    """
+    Set the x-axis limits of each slot
+
+    In a compact plot, the limits are calculated for each variable separately
+    and the axes limits are set such that all the slots fit into the axes.
+
+    Possible types
+    --------------
+    %(LimitBase.possible_types)s
+
+    See Also
+    --------
+    slot_scale, slot_min"""
+
+    dependencies = ['slot_min']
+
+    def slot_limits(self, arr):
+        """Calculate the x-limits for one slot
+
+        Parameters
+        ----------
+        arr: xarray.DataArray
+            The data of the slot
+
+        Returns
+        -------
+        float
+            The lower limit of the slot
+        float
+            The upper limit of the slot"""
+        value = list(self.value)
+        value_lists = list(map(safe_list, value))
+        data = np.asarray(arr.values, dtype=float)
+        data = data[~np.isnan(data)]
+        vmin, vmax = (data.min(), data.max()) if len(data) else (0, 1)
+        if vmin == vmax:
+            vmax = vmax + 1
+            vmin = vmin - 1
+        for key, func in self._calc_funcs.items():
+            if key in value_lists[0] or key in value_lists[1]:
+                minmax = func(vmin, vmax)
+                for i, val in enumerate(value_lists):
+                    if key in val:
+                        value[i] = minmax[i]
+        value = [vmin if value[0] is None else value[0],
+                 vmax if value[1] is None else value[1]]
+        if self.slot_min.value is not None:
+            value[1] = max(value[1], self.slot_min.value)
+        return value
+
+    def update(self, value):
+        self.range = [0, self.plot.total]
+        self.set_limit(*self.range)
+
+
+class CompactPlot(psyps.LinePlot):
+    """
+    Choose the line style of the plot
+
+    Each variable is drawn into its own horizontal slot of the axes. All lines
+    of the axes are drawn by one single
+    :class:`matplotlib.collections.LineCollection` and all areas by one
+    :class:`matplotlib.collections.PolyCollection`.
+
+    Possible types
+    --------------
+    None
+        Don't make any plotting
+    ``'areax'``
+        To make a transposed area plot (filled between x=0 and x)
+    str or list of str
+        The line style string to use (['solid' | 'dashed', 'dashdot', 'dotted'
+        | (offset, on-off-dash-seq) | '-' | '--' | '-.' | ':' | 'None' | ' ' |
+        '']).
+
+    Notes
+    -----
+    If the :attr:`color` formatoption is None, all variables use the first
+    color of the color cycle, as they would do in separate plots."""
+
+    dependencies = ['xlim', 'slot_scale']
+
+    #: The slots ``(offset, scale, vmin, vmax)`` of the plotted arrays. An
+    #: array that is not plotted is represented by None
+    slots = []
+
+    #: The total width of all slots in data coordinates
+    total = 1.
+
+    def make_plot(self):
+        if hasattr(self, '_plot'):
+            self.remove()
+        self.slots = slots = []
+        self.total = 1.
+        if self.value is None:
+            return
+        if self.color.value is None:
+            colors = repeat(next(iter(
+                mpl.rcParams['axes.prop_cycle'].by_key()['color'])))
+        else:
+            colors = self.color.extended_colors
+        equal = self.slot_scale.value == 'equal'
+        lines, line_colors, line_styles = [], [], []
+        polys, poly_colors = [], []
+        offset = 0.
+        for arr, c, ls in zip(self.iter_data, colors,
+                              cycle(safe_list(self.value))):
+            if ls is None:
+                slots.append(None)
+                continue
+            vmin, vmax = self.xlim.slot_limits(arr)
+            scale = 1. / (vmax - vmin) if equal else 1.
+            x = offset + (np.asarray(arr.values, dtype=float) - vmin) * scale
+            try:
+                y = np.asarray(arr[arr.dims[0]].values, dtype=float)
+            except (ValueError, TypeError):
+                y = np.arange(len(x), dtype=float)
+            if ls in ['area', 'areax']:
+                x0 = offset - vmin * scale
+                x = np.where(np.isnan(x), x0, x)
+                polys.append(np.column_stack([
+                    np.r_[x, x0, x0], np.r_[y, y[-1:], y[:1]]]))
+                poly_colors.append(c)
+            else:
+                lines.append(np.column_stack([x, y]))
+                line_colors.append(c)
+                line_styles.append(ls)
+            slots.append((offset, scale, vmin, vmax))
+            offset += (vmax - vmin) * scale
+        self.total = offset or 1.
+        self._plot = []
+        if polys:
+            self._plot.append(self.ax.add_collection(
+                PolyCollection(polys, facecolors=poly_colors,
+                               edgecolors='none'),
+                autolim=False))
+        if lines:
+            self._plot.append(self.ax.add_collection(
+                LineCollection(lines, colors=line_colors,
+                               linestyles=line_styles,
+                               linewidths=self._kwargs.get('linewidth')),
+                autolim=False))
+        # separate the slots by dotted lines
+        bounds = [slot[0] for slot in slots if slot is not None][1:]
+        if bounds:
+            tr = mt.blended_transform_factory(self.ax.transData,
+                                              self.ax.transAxes)
+            spine = self.ax.spines['left']
+            self._plot.append(self.ax.add_collection(
+                LineCollection([[(x, 0), (x, 1)] for x in bounds],
+                               transform=tr, linestyles=':',
+                               colors=[spine.get_edgecolor()],
+                               linewidths=spine.get_linewidth()),
+                autolim=False))
+        y = np.concatenate([[np.nanmin(p[:, 1]), np.nanmax(p[:, 1])]
+                            for p in polys + lines] or [[0, 1]])
+        self.ax.update_datalim([[0, y.min()], [self.total, y.max()]])
+
+
+class SlotTicks(Formatoption):
+    """
+    Modify the x-axis ticks of each slot
+
+    Possible types
+    --------------
+    None
+        Do not draw any ticks
+    int
+        The maximal number of ticks in each slot
+    numeric array
+        The ticks (in the data coordinates of the variables) that shall be
+        drawn in each slot (if they are within the limits of the slot)
+
+    See Also
+    --------
+    xticklabels"""
+
+    dependencies = ['plot']
+
+    group = 'ticks'
+
+    name = 'Location of the x-Axis ticks'
+
+    #: The tick values (in the data coordinates of the variables)
+    ticks = []
+
+    def update(self, value):
+        positions = []
+        self.ticks = ticks = []
+        for slot in self.plot.slots:
+            if slot is None or value is None:
+                continue
+            offset, scale, vmin, vmax = slot
+            if isinstance(value, int):
+                vals = mticker.MaxNLocator(value).tick_values(vmin, vmax)
+            else:
+                vals = np.asarray(value, dtype=float)
+            vals = vals[(vals >= vmin) & (vals < vmax)]
+            positions.extend(offset + (vals - vmin) * scale)
+            ticks.extend(vals)
+        self.ax.set_xticks(positions)
+
+
+class SlotTickLabels(Formatoption):
+    """
+    Modify the x-axis ticklabels of each slot
+
+    Possible types
+    --------------
+    None
+        Use ``'%g'`` to format the ticks
+    str
+        The format string for the ticks
+
+    See Also
+    --------
+    xticks"""
+
+    dependencies = ['xticks']
+
+    group = 'ticks'
+
+    name = 'x-axis ticklabels'
+
+    def update(self, value):
+        value = value or '%g'
+        self.ax.set_xticklabels([value % t for t in self.xticks.ticks])
+
+
+class SlotTitles(LeftTitle):
+    """
+    Show the title of each slot
+
+    Set the title for each variable in a compact plot. The titles are drawn
+    at the left side of each slot.
+    %(replace_note)s
+
+    Possible types
+    --------------
+    str
+        The title for each slot
+
+    See Also
+    --------
+    titlesize, titleweight, titleprops, title_wrap"""
+
+    dependencies = LeftTitle.dependencies + ['plot']
+
+    texts = []
+
+    def initialize_plot(self, value):
+        self.texts = []
+        self.update(value)
+
+    def update(self, value):
+        self.remove()
+        ax = self.ax
+        tr = mt.blended_transform_factory(ax.transData, ax.transAxes) + \
+            mt.ScaledTranslation(0, mpl.rcParams['axes.titlepad'] / 72.,
+                                 ax.figure.dpi_scale_trans)
+        # the attributes of the formatoption are cached for the first array,
+        # so we query the plotter for each slot
+        for arr, slot in zip(self.iter_data, self.plot.slots):
+            if slot is not None:
+                self.texts.append(ax.text(
+                    slot[0], 1.0, self.replace(
+                        value, arr,
+                        attrs=self.plotter.get_enhanced_attrs(arr)),
+                    transform=tr, ha='left', va='bottom'))
+
+    def remove(self):
+        for t in self.texts:
+            t.remove()
+        self.texts = []
+
+
+class SlotGrouper(AxesGrouper):
+    """
+    Group several slots through a bar
+
+    This formatoption groups several slots of a compact plot by drawing a bar
+    over them
+
+    Possible types
+    --------------
+    None
+        To not do anything
+    tuple (float ``y``, str ``s``)
+        A tuple of length 2, where the first parameter ``0<=y<=1`` determines
+        the distance of the bar to the top y-axis and the second is the title
+        of the group. `y` must be given relative to the axes height.
+    """
+
+    dependencies = AxesGrouper.dependencies + ['plot']
+
+    @staticmethod
+    def get_left_title(fmto):
+        return fmto.title.texts[0]
+
+    @staticmethod
+    def get_right_title(fmto):
+        return fmto.title.texts[-1]
+
+    def update(self, value):
+        if not self.title.texts:
+            self.remove()
+            return
+        super(SlotGrouper, self).update(value)
+
+    def replace(self, s, data, attrs=None):
+        # use the attributes that all slots have in common
+        if attrs is None and isinstance(data, InteractiveList):
+            attrs = self.plotter.get_enhanced_attrs(data)
+        return super(SlotGrouper, self).replace(s, data, attrs)
+
+    def set_params(self, value):
+        super(SlotGrouper, self).set_params(value)
+        xs = [slot[0] for fmto in [self] + list(self.shared)
+              for slot in fmto.plot.slots if slot is not None]
+        if xs:
+            tr = self.ax.transData + self.ax.figure.transFigure.inverted()
+            xs = tr.transform(np.column_stack([xs, np.zeros(len(xs))]))[:, 0]
+            self.x0 = xs.min()
+            self.x1 = xs.max()
+
+
+class HeatmapCmap(Formatoption):
+    """
+    Specify the color map of a heatmap
+
+    Possible types
+    --------------
+    str
+        The name of a matplotlib colormap
+    matplotlib.colors.Colormap
+        The colormap instance to use
+
+    See Also
+    --------
+    color_scale"""
+
+    priority = BEFOREPLOTTING
+
+    group = 'colors'
+
+    name = 'Colormap'
+
+    def update(self, value):
+        # Does nothing, the value is used in the :class:`HeatmapPlot`
+        pass
+
+
+class ColorScale(Formatoption):
+    """
+    Specify how the colors of a heatmap are scaled
+
+    Possible types
+    --------------
+    'column'
+        Each variable is scaled to the limits of its own column (see the
+        :attr:`xlim` formatoption)
+    'group'
+        All variables share the same color scale that ranges from the
+        minimum to the maximum of the column limits (useful for percentages
+        data)
+
+    See Also
+    --------
+    cmap, xlim, slot_min"""
+
+    priority = BEFOREPLOTTING
+
+    group = 'colors'
+
+    name = 'Scaling of the colors'
+
+    def update(self, value):
+        # Does nothing, the value is used in the :class:`HeatmapPlot`
+        pass
+
+
+class HeatmapPlot(CompactPlot):
+    """
+    Choose the visualization of the heatmap
+
+    All variables are drawn as the columns of one single image (a
+    :class:`matplotlib.collections.QuadMesh`) where every variable has a
+    column of width 1. The rows of the image are centered at the vertical
+    coordinate of the data.
+
+    Possible types
+    --------------
+    None
+        Don't make any plotting
+    str or list of str
+        A string (e.g. ``'mesh'``) to show the variable. If a list, it
+        specifies the value for each variable and variables with None are not
+        shown
+
+    Notes
+    -----
+    NaN values are not colored"""
+
+    dependencies = ['xlim', 'cmap', 'color_scale']
+
+    #: The :class:`matplotlib.collections.QuadMesh` of the heatmap
+    mappable = None
+
+    def make_plot(self):
+        if hasattr(self, '_plot'):
+            self.remove()
+        self.slots = slots = []
+        self.total = 1.
+        self.mappable = None
+        if self.value is None:
+            return
+        columns, limits = [], []
+        y = None
+        for arr, val in zip(self.iter_data, cycle(safe_list(self.value))):
+            if val is None:
+                slots.append(None)
+                continue
+            vmin, vmax = self.xlim.slot_limits(arr)
+            if y is None:
+                try:
+                    y = np.asarray(arr[arr.dims[0]].values, dtype=float)
+                except (ValueError, TypeError):
+                    y = np.arange(arr.size, dtype=float)
+            slots.append((len(columns), 1. / (vmax - vmin), vmin, vmax))
+            columns.append(np.asarray(arr.values, dtype=float))
+            limits.append((vmin, vmax))
+        self._plot = []
+        if not columns:
+            return
+        self.total = len(columns)
+        data = np.column_stack(columns)
+        limits = np.asarray(limits)
+        if self.color_scale.value == 'column':
+            data -= limits[:, 0]
+            data /= limits[:, 1] - limits[:, 0]
+            vmin, vmax = 0, 1
+        else:
+            vmin, vmax = limits[:, 0].min(), limits[:, 1].max()
+        # the cell boundaries lie in the middle between two samples
+        if len(y) > 1:
+            d = np.diff(y) / 2.
+            yb = np.r_[y[0] - d[0], y[:-1] + d, y[-1] + d[-1]]
+        else:
+            yb = np.r_[y - 0.5, y + 0.5]
+        self.mappable = self.ax.pcolormesh(
+            np.arange(len(columns) + 1), yb, np.ma.masked_invalid(data),
+            cmap=self.cmap.value, vmin=vmin, vmax=vmax)
+        self._plot.append(self.mappable)
+        self.ax.update_datalim([[0, yb.min()], [self.total, yb.max()]])
+
+
 # -----------------------------------------------------------------------------
 # ------------------------------ Plotters -------------------------------------
 # -----------------------------------------------------------------------------
 
 
-class StratPlotter(psyps.LinePlotter):
+class Validated(object):
+    """A formatoption value that has already been validated
+
+    Formatoption values that are wrapped by this class are set without
+    validating them again in the plotters of this module. This is used to
+    validate the formatoptions of one stratigraphic group only once and to
+    share the validated values among all the plotters of the group.
+
+    Mutable values (lists, dictionaries, sets and arrays) are copied by the
+    :meth:`get` method such that the plotters do not share them by reference
+    and an in-place modification in one plotter does not leak into the
+    others"""
+
+    __slots__ = ['value']
+
+    #: The types of values that are copied by the :meth:`get` method
+    mutable_types = (list, dict, set, np.ndarray)
+
+    def __init__(self, value):
+        #: The validated value
+        self.value = value
+
+    def get(self):
+        """Get the validated value for one plotter
+
+        Returns
+        -------
+        object
+            A deep copy of the :attr:`value` if it is mutable, otherwise the
+            :attr:`value` itself"""
+        if isinstance(self.value, self.mutable_types):
+            return deepcopy(self.value)
+        return self.value
+
+    def __repr__(self):
+        return '%s(%r)' % (self.__class__.__name__, self.value)
+
+
+class PrevalidatedMixin(object):
+    """A plotter mixin to accept :class:`Validated` formatoption values"""
+
+    def _try2set(self, fmto, value, *args, **kwargs):
+        if isinstance(value, Validated):
+            value = value.get()
+            kwargs['validate'] = False
+        super(PrevalidatedMixin, self)._try2set(fmto, value, *args, **kwargs)
+
+
+class StratPlotter(PrevalidatedMixin, psyps.LinePlotter):
     """A plotter for stratigraphic diagrams"""
 
     _rcparams_string = ['plotter.strat.']
@@ -487,9 +1750,12 @@ class StratPlotter(psyps.LinePlotter):
     grouperweight = label_weight(grouper)
     groupersize = label_size(grouper)
     hlines = MeasurementLines('hlines')
+    hlines_shared = HlinesShared('hlines_shared')
     exag_color = psyps.LineColors('exag_color')
     exag_factor = ExagFactor('exag_factor')
     exag = ExagPlot('exag', color='exag_color')
+    plot = StratLinePlot('plot')
+    decimate = Decimate('decimate')
 
     # occurences
     occurences = Occurences('occurences')
@@ -497,7 +1763,7 @@ class StratPlotter(psyps.LinePlotter):
     occurence_value = OccurencePlot('occurence_value')
 
 
-class BarStratPlotter(psyps.BarPlotter):
+class BarStratPlotter(PrevalidatedMixin, psyps.BarPlotter):
     """A bar plotter for stratigraphic diagrams"""
 
     _rcparams_string = ['plotter.strat.', 'plotter.barstrat.']
@@ -511,11 +1777,59 @@ class BarStratPlotter(psyps.BarPlotter):
     grouperweight = label_weight(grouper)
     groupersize = label_size(grouper)
     hlines = MeasurementLines('hlines')
+    hlines_shared = HlinesShared('hlines_shared')
     exag_color = psyps.LineColors('exag_color')
     exag_factor = ExagFactor('exag_factor')
     exag = ExagPlot('exag', color='exag_color')
+    plot = StratBarPlot('plot')
 
     # occurences
     occurences = Occurences('occurences')
     occurence_marker = OccurenceMarker('occurence_marker')
     occurence_value = OccurencePlot('occurence_value')
+
+
+class CompactStratPlotter(StratPlotter):
+    """A plotter that draws multiple variables into the slots of one axes
+
+    In contrast to the :class:`StratPlotter`, this plotter is meant to be
+    used with a list of arrays and draws each variable into its own slot of
+    the axes. This is much faster for groups with many variables because
+    only one axes is necessary"""
+
+    _rcparams_string = ['plotter.compactstrat.']
+
+    slot_scale = SlotScale('slot_scale')
+    slot_min = SlotMin('slot_min')
+    plot = CompactPlot('plot')
+    xlim = CompactXlim('xlim')
+    xticks = SlotTicks('xticks')
+    xticklabels = SlotTickLabels('xticklabels')
+    title = SlotTitles('title')
+    grouper = SlotGrouper('grouper')
+
+    # exaggerations and occurences are not supported in the compact plots
+    exag_color = None
+    exag_factor = None
+    exag = None
+    decimate = None
+    occurences = None
+    occurence_marker = None
+    occurence_value = None
+
+
+class HeatmapStratPlotter(CompactStratPlotter):
+    """A plotter that draws multiple variables as one heatmap
+
+    This plotter is meant to be used with a list of arrays and draws each
+    variable as one column of an image. This is the fastest visualization for
+    very wide groups because all variables are displayed by one artist"""
+
+    _rcparams_string = ['plotter.heatmapstrat.']
+
+    cmap = HeatmapCmap('cmap')
+    color_scale = ColorScale('color_scale')
+    plot = HeatmapPlot('plot')
+
+    # the columns of a heatmap have all the same width
+    slot_scale = None
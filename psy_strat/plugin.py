@@ -23,7 +23,8 @@ from itertools import repeat
 from psy_simple.plugin import (
     rcParams as psys_rcParams, validate_bool, validate_int, try_and_error,
     validate_none, validate_float, validate_str, validate_color,
-    validate_lineplot, validate_marker, ValidateList, ValidateInStrings)
+    validate_lineplot, validate_marker, ValidateList, ValidateInStrings,
+    validate_cmap)
 
 
 def get_versions(requirements=True):
@@ -112,6 +113,20 @@ def validate_hlines(value):
     return validate_color(value)
 
 
+def validate_decimate(value):
+    """Validate the decimate formatoption
+
+    Parameters
+    ----------
+    value: object
+        Either None, True or the number of bins"""
+    if value is None or value is False:
+        return None
+    elif value is True:
+        return value
+    return validate_int(value)
+
+
 # -----------------------------------------------------------------------------
 # ------------------------------ rcParams -------------------------------------
 # -----------------------------------------------------------------------------
@@ -162,8 +177,11 @@ defaultParams = {
         15, validate_int, 'wrap the title after the given amount of characters'
         ],
     'plotter.strat.hlines': [
-        None, try_and_error(validate_none, validate_grouper),
+        None, validate_hlines,
         'Show the measurements'],
+    'plotter.strat.hlines_shared': [
+        False, validate_bool,
+        'Draw the measurement lines of all plots in a figure at once'],
     'plotter.strat.grouper': [
         None, try_and_error(validate_none, validate_grouper),
         'Group several plots together using the grouper formatoption'],
@@ -189,6 +207,9 @@ defaultParams = {
         10, validate_float, 'The exaggeration factor'],
     'plotter.strat.exag': [
         None, validate_lineplot, 'The plotting style for exaggerations'],
+    'plotter.strat.decimate': [
+        None, validate_decimate,
+        'Reduce the data to the minimum and maximum in each bin of the axes'],
     'plotter.strat.occurences': [
         None, try_and_error(validate_none, validate_float,
                             ValidateList(float, 2)),
@@ -198,7 +219,34 @@ defaultParams = {
     'plotter.strat.occurence_value': [
         None, try_and_error(validate_none, validate_float,
                             ValidateList(float)),
-        'The value to use for an occurence in the plot']
+        'The value to use for an occurence in the plot'],
+
+    # compact plots
+    'plotter.compactstrat.slot_scale': [
+        'equal', ValidateInStrings('slot_scale', ['equal', 'data'], True),
+        'The widths of the slots in a compact plot'],
+    'plotter.compactstrat.slot_min': [
+        None, try_and_error(validate_none, validate_float),
+        'The minimal upper limit of each slot in a compact plot'],
+    'plotter.compactstrat.xticks': [
+        2, try_and_error(validate_none, validate_int, ValidateList(float)),
+        'The ticks of each slot in a compact plot'],
+    'plotter.compactstrat.xticklabels': [
+        None, try_and_error(validate_none, validate_str),
+        'The format string for the ticklabels of a compact plot'],
+
+    # heatmap plots
+    'plotter.heatmapstrat.plot': [
+        'mesh', validate_lineplot,
+        'Show or hide the variables of a heatmap'],
+    'plotter.heatmapstrat.cmap': [
+        'Blues', validate_cmap, 'The colormap of a heatmap'],
+    'plotter.heatmapstrat.color_scale': [
+        'column', ValidateInStrings('color_scale', ['column', 'group'], True),
+        'The scaling of the colors in a heatmap'],
+    'plotter.heatmapstrat.xticks': [
+        None, try_and_error(validate_none, validate_int, ValidateList(float)),
+        'The ticks of each column in a heatmap'],
     }
 
 # create the rcParams and populate them with the defaultParams. For more
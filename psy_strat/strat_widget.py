@@ -41,7 +41,8 @@ class GrouperItem(QTreeWidgetItem):
         self.setText(0, grouper.group)
 
     def add_array_children(self):
-        arrays = self.grouper.arrays
+        # include the variables that have not yet been plotted
+        arrays = self.grouper.variable_arrays
         last = len(arrays) - 1
         group = self.grouper.group
         for i, arr in enumerate(arrays):
@@ -57,12 +58,13 @@ class GrouperItem(QTreeWidgetItem):
             cb.setChecked(self.grouper.is_visible(arr))
             cb.stateChanged.connect(self.show_or_hide_func(arr.name))
             self.tree.setItemWidget(child, 3, cb)
-            # mean
-            child.setText(4, '%1.3f' % arr.mean().values)
-            # min
-            child.setText(5, '%1.3f' % arr.min().values)
-            # max
-            child.setText(6, '%1.3f' % arr.max().values)
+            # mean, min and max (use the statistics from stratplot if
+            # available)
+            for col, stat in enumerate(['mean', 'min', 'max'], 4):
+                val = arr.attrs.get(stat)
+                if val is None:
+                    val = getattr(arr, stat)().values
+                child.setText(col, '%1.3f' % val)
             # group
             if arr.group != group:
                 child.setText(7, str(arr.group))
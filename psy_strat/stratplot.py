@@ -4,19 +4,32 @@ This module defines the :func:`stratplot` function that can be used to create
 stratigraphic plots such as pollen diagrams
 """
 from __future__ import division
+import os
+import time
+import logging
+import warnings
 import weakref
+import traceback
+import multiprocessing as mp
 import six
-from itertools import groupby, chain, islice
+from itertools import groupby, chain, islice, cycle
 import matplotlib as mpl
 import matplotlib.transforms as mt
-from collections import defaultdict
+from matplotlib.path import Path
+from collections import defaultdict, OrderedDict
+from contextlib import contextmanager
 import psyplot
-from psyplot.utils import DefaultOrderedDict
+from psyplot.utils import DefaultOrderedDict, unique_everseen
+from psyplot.config.rcsetup import SubDict
 import xarray as xr
 import numpy as np
-from psy_strat.plotters import StratPlotter, BarStratPlotter
-from psyplot.data import ArrayList
+import pandas as pd
+from psy_strat.plotters import (
+    StratPlotter, BarStratPlotter, CompactStratPlotter, HeatmapStratPlotter,
+    Validated)
+from psyplot.data import ArrayList, InteractiveList, safe_list
 import psyplot.project as psy
+from psy_simple.plotters import round_to_05
 from docrep import DocstringProcessor
 
 docstrings = DocstringProcessor()
@@ -33,16 +46,678 @@ def _no_grouper(col):
     return NOGROUP
 
 
+class GroupIndex(object):
+    """A compiled index from column names to their group
+
+    This class compiles a lookup table (e.g. a :class:`pandas.Series` with the
+    column names as index and the group names as values) into an index that
+    resolves the groups of many columns in one vectorized pass. An instance
+    can be used as `group_func` parameter in :func:`stratplot` and may be
+    reused for several calls, e.g.::
+
+        >>> groups = pd.read_csv('epd-groups.tsv', delimiter='\\t')
+        >>> group_index = GroupIndex(groups, default='Temperature')
+        >>> sp, groupers = stratplot(df, group_index)"""
+
+    #: The column names in the index
+    names = None
+
+    #: The groups corresponding to :attr:`names`
+    groups = None
+
+    #: The function to compute the groups if this index has not been created
+    #: from a table
+    func = None
+
+    def __init__(self, mapping=None, subgroups={}, default=NOGROUP):
+        """
+        Parameters
+        ----------
+        mapping: function, dict, pandas.Series or pandas.DataFrame
+            The mapping from column name to group. If this is a dataframe
+            with two columns, the first column is considered as the column
+            names and the second one as the corresponding groups. A dataframe
+            with only one column uses the index for the column names. If this
+            is a function, it is called once for each column and the results
+            are cached
+        subgroups: dict
+            A mapping from group name to a list of subgroups (see the
+            `subgroups` parameter in :func:`stratplot`)
+        default: str or function
+            The group for columns that are not found in `mapping`. This might
+            also be a function that accepts the column name and returns the
+            corresponding group"""
+        if mapping is None:
+            mapping = _no_grouper
+        if isinstance(mapping, pd.DataFrame):
+            if len(mapping.columns) == 1:
+                mapping = mapping.iloc[:, 0]
+            else:
+                mapping = mapping.set_index(mapping.columns[0]).iloc[:, 0]
+        if callable(mapping):
+            self.func = mapping
+            self._cache = {}
+        else:
+            if not isinstance(mapping, pd.Series):
+                mapping = pd.Series(dict(mapping), dtype=object)
+            mapping = mapping[~mapping.index.duplicated()]
+            self.names = mapping.index
+            self.groups = mapping.values
+        self.subgroups = dict(subgroups)
+        self.default = default
+
+    def __call__(self, col):
+        """Get the (sub)group of the given column `col`"""
+        return self.resolve([col])[0][0]
+
+    def resolve(self, columns, subgroups={}):
+        """Resolve the groups for several columns
+
+        Parameters
+        ----------
+        columns: list of str
+            The column names to resolve
+        subgroups: dict
+            A mapping from group name to a list of subgroups that is used in
+            addition to the :attr:`subgroups` of this instance
+
+        Returns
+        -------
+        list of str
+            The group (or subgroup) for each column in `columns`
+        list of str
+            The main group for each column in `columns`, i.e. the group that
+            contains the subgroup"""
+        if self.func is not None:
+            func = self.func
+            cache = self._cache
+            for col in set(columns).difference(cache):
+                cache[col] = func(col)
+            groups = [cache[col] for col in columns]
+        else:
+            positions = self.names.get_indexer(columns)
+            if len(self.groups):
+                groups = self.groups.take(positions).tolist()
+            else:
+                groups = [None] * len(columns)
+            missing = np.where(positions == -1)[0]
+            default = self.default
+            for i in missing:
+                groups[i] = default(columns[i]) if callable(default) else \
+                    default
+        # invert the subgroups
+        subgroup2group = dict(chain.from_iterable(
+            ((sub, group) for sub in subs)
+            for group, subs in chain(self.subgroups.items(),
+                                     subgroups.items())))
+        return groups, [subgroup2group.get(group, group) for group in groups]
+
+
+def normalize_percentages(df, groups, percentages, norm_vars=True):
+    """Rescale the columns of percentage groups to sum up to 100%
+
+    The columns of all `percentages` groups are gathered in one single float
+    block. The row sums for every group are then computed in one pass via a
+    matrix product and the block is rescaled in place by broadcasting.
+
+    Parameters
+    ----------
+    df: pandas.DataFrame
+        The dataframe containing the data
+    groups: dict
+        A mapping from group name to the list of corresponding columns in `df`
+    percentages: list of str
+        The group names in `groups` whose columns shall be rescaled
+    norm_vars: bool or list of str
+        If True, each group is normalized by the sum of its own members.
+        Otherwise, the group (or column) names that shall be used for the
+        normalization of every group in `percentages`
+
+    Returns
+    -------
+    pandas.DataFrame
+        The dataframe where the columns of the `percentages` groups are
+        replaced by their rescaled versions. The order of the columns is
+        kept and only the rescaled columns are new, the remaining columns
+        share their data with `df`
+    int
+        The number of bytes that have been allocated for the normalization
+    """
+    percentages = [group for group in percentages if group in groups]
+    members = list(chain.from_iterable(groups[g] for g in percentages))
+    try:
+        norm_vars = list(norm_vars)
+    except TypeError:
+        norm_cols = None
+        cols = members
+    else:
+        norm_cols = list(unique_everseen(chain.from_iterable(
+            [var] if var in df.columns else groups[var]
+            for var in norm_vars)))
+        cols = members + [col for col in norm_cols if col not in members]
+    col_idx = {col: i for i, col in enumerate(cols)}
+
+    # gather everything in one block. We use fortran order such that the
+    # rescaled columns are contiguous in memory
+    block = np.empty((len(df), len(cols)), order='F')
+    for i, col in enumerate(cols):
+        block[:, i] = np.asarray(df[col], dtype=float)
+
+    # a mapping from columns to the groups they normalize
+    weights = np.zeros((len(cols), len(percentages)))
+    for i, group in enumerate(percentages):
+        norm = groups[group] if norm_cols is None else norm_cols
+        weights[[col_idx[col] for col in norm], i] = 1.
+    nbytes = block.nbytes + weights.nbytes
+
+    nans = np.isnan(block)
+    if nans.any():
+        nbytes += block.nbytes
+        sums = np.where(nans, 0, block).dot(weights)
+    else:
+        sums = block.dot(weights)
+    nbytes += nans.nbytes + sums.nbytes
+    del nans
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        np.divide(100., sums, out=sums)
+        start = 0
+        for i, group in enumerate(percentages):
+            stop = start + len(groups[group])
+            block[:, start:stop] *= sums[:, i:i+1]
+            start = stop
+
+    # replace the rescaled columns in a shallow copy to keep the order and to
+    # share the remaining columns with `df`
+    ret = df.copy(deep=False)
+    for i, col in enumerate(members):
+        ret[col] = block[:, i]
+    nbytes += block[:, :len(members)].nbytes
+    return ret, nbytes
+
+
+def _iter_blocks(df):
+    """Iterate over the 2D blocks of a dataframe
+
+    Columns with the same dtype are gathered in one block. If the frame
+    has only one dtype, the block is (if pandas allows it) a view on the
+    data of `df`. Otherwise we need one copy per dtype.
+
+    Yields
+    ------
+    list
+        The column names in the block
+    np.ndarray
+        The 2D block of shape ``(len(df), len(columns))``"""
+    by_dtype = DefaultOrderedDict(list)
+    for col, dtype in df.dtypes.items():
+        by_dtype[dtype].append(col)
+    for cols in by_dtype.values():
+        sub = df if len(cols) == len(df.columns) else df[cols]
+        yield cols, sub.to_numpy()
+
+
+def dataframe_to_dataset(df, index_name=None):
+    """Convert a dataframe into a dataset with one variable per column
+
+    In contrast to :meth:`xarray.Dataset.from_dataframe`, the data is not
+    copied column by column. Instead the 2D block for each dtype is wrapped
+    in a stacked variable (sample x variable) and the variables of the
+    returned dataset are views into this block.
+
+    Parameters
+    ----------
+    df: pandas.DataFrame
+        The dataframe to convert
+    index_name: str
+        The name of the index dimension. If None, the name of the index of
+        `df` is used or ``'y'`` if the index does not have a name
+
+    Returns
+    -------
+    xarray.Dataset
+        The dataset with one variable for each column in `df`"""
+    return _dataframe_to_dataset(df, index_name)[0]
+
+
+def _dataframe_to_dataset(df, index_name=None):
+    """Convert a dataframe into a dataset and return the stacked variables
+
+    See :func:`dataframe_to_dataset`. This function additionally returns a
+    list of tuples ``(columns, stacked)``, where ``stacked`` is the
+    two-dimensional :class:`xarray.Variable` that holds the data of
+    ``columns``"""
+    idx = index_name or df.index.name or 'y'
+    variables = {}
+    blocks = []
+    for cols, block in _iter_blocks(df):
+        stacked = xr.Variable((idx, 'variable'), block)
+        blocks.append((cols, stacked))
+        for i, col in enumerate(cols):
+            variables[col] = stacked[:, i]
+    ds = xr.Dataset(
+        {col: variables[col] for col in df.columns},
+        {idx: xr.Variable((idx, ), df.index)})
+    return ds, blocks
+
+
+#: The statistics that are computed by :func:`block_statistics`
+statistics = ['max', 'min', 'mean', 'count', 'occurences',
+              'first_occurence', 'last_occurence']
+
+
+def block_statistics(block, index=None, columns=None):
+    """Compute summary statistics for all columns of a 2D block
+
+    Each statistic is computed for all columns at once through one
+    reduction over the first axis of `block`. NaNs are ignored.
+
+    Parameters
+    ----------
+    block: np.ndarray
+        The data of shape ``(nsamples, nvariables)``. This may also be a
+        dask array
+    index: np.ndarray
+        The index values of length ``nsamples`` (e.g. the depth) that are used
+        for the first and last occurence. If None, the position is used
+    columns: list of str
+        The names of the variables. If None, they are enumerated
+
+    Returns
+    -------
+    pandas.DataFrame
+        A dataframe with one row per column in `block` and the columns
+
+        max, min, mean
+            The maximum, minimum and mean of the variable
+        count
+            The number of samples that are not NaN
+        occurences
+            The number of samples where the variable is not zero
+        first_occurence, last_occurence
+            The index value of the first and last sample where the variable
+            is not zero (or NaN, if it is always zero)"""
+    nsamples = block.shape[0]
+    if block.dtype.kind != 'f':
+        block = block.astype(float)
+    nonzero = (block != 0) & ~np.isnan(block)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        results = [np.nanmax(block, axis=0), np.nanmin(block, axis=0),
+                   np.nanmean(block, axis=0), (~np.isnan(block)).sum(axis=0),
+                   nonzero.sum(axis=0),
+                   nonzero.argmax(axis=0),
+                   nsamples - 1 - nonzero[::-1].argmax(axis=0)]
+        if hasattr(block, 'dask'):
+            import dask
+            results = dask.compute(*results)
+    ret = pd.DataFrame(dict(zip(statistics, results)), index=columns,
+                       columns=statistics)
+    if index is None:
+        index = np.arange(nsamples)
+    found = ret['occurences'].values > 0
+    for key in ['first_occurence', 'last_occurence']:
+        ret[key] = pd.Series(
+            np.asarray(index)[ret[key].values], index=ret.index).where(found)
+    return ret
+
+
+def _merge_statistics(old, new):
+    """Merge the :func:`block_statistics` of two consecutive blocks
+
+    Parameters
+    ----------
+    old: pandas.DataFrame
+        The statistics of the first block
+    new: pandas.DataFrame
+        The statistics of the same variables for the samples following the
+        first block
+
+    Returns
+    -------
+    pandas.DataFrame
+        The statistics of the samples in both blocks"""
+    ret = pd.DataFrame(index=old.index, columns=statistics)
+    ret['max'] = np.fmax(old['max'], new['max'])
+    ret['min'] = np.fmin(old['min'], new['min'])
+    ret['count'] = old['count'] + new['count']
+    # the means are weighted by the number of valid samples in each block
+    ret['mean'] = (old['mean'].fillna(0) * old['count'] +
+                   new['mean'].fillna(0) * new['count']) / (
+        ret['count'].where(ret['count'] > 0))
+    ret['occurences'] = old['occurences'] + new['occurences']
+    ret['first_occurence'] = old['first_occurence'].where(
+        old['occurences'] > 0, new['first_occurence'])
+    ret['last_occurence'] = new['last_occurence'].where(
+        new['occurences'] > 0, old['last_occurence'])
+    return ret
+
+
+def _variable_statistics(ds, names, blocks=[], chunksize=10000):
+    """Compute the :func:`block_statistics` for variables in a dataset
+
+    Parameters
+    ----------
+    ds: xarray.Dataset
+        The dataset containing the variables
+    names: list of str
+        The variable names in `ds`
+    blocks: list of tuples
+        The ``(columns, stacked)`` tuples from :func:`_dataframe_to_dataset`
+        that can be used instead of stacking the variables again
+    chunksize: int
+        The number of samples that are reduced at once if the data in `ds` is
+        not a dask array. Dask arrays are reduced in one single computation
+
+    Returns
+    -------
+    pandas.DataFrame
+        The statistics for each variable in `names`. Non-numeric variables
+        are filled with NaN
+
+    Notes
+    -----
+    The variables in `ds` are not loaded into memory. Data that is stored
+    in a file is only read chunk by chunk"""
+    frames = []
+    done = set()
+    for cols, stacked in blocks:
+        if stacked.dtype.kind in 'biuf':
+            frames.append(block_statistics(
+                stacked.data, ds[stacked.dims[0]].values, cols))
+            done.update(cols)
+    rest = [name for name in names
+            if name not in done and ds[name].dtype.kind in 'biuf']
+    if rest:
+        data = ds[rest]
+        dim = data[rest[0]].dims[0]
+        if data.chunks:
+            arr = data.to_array('variable')
+            frames.append(block_statistics(
+                arr.data.T, ds[dim].values, rest))
+        else:
+            stats = None
+            for i in range(0, data.dims[dim], chunksize):
+                chunk = data.isel(**{dim: slice(i, i + chunksize)})
+                chunk_stats = block_statistics(
+                    chunk.to_array('variable').values.T, chunk[dim].values,
+                    rest)
+                stats = chunk_stats if stats is None else _merge_statistics(
+                    stats, chunk_stats)
+            frames.append(stats)
+    if not frames:
+        return pd.DataFrame([], index=names, columns=statistics)
+    return pd.concat(frames).reindex(names)
+
+
+def _set_variables(ds, names, values, arrays=[]):
+    """Replace the data of variables in a dataset
+
+    Parameters
+    ----------
+    ds: xarray.Dataset
+        The dataset containing the variables
+    names: list of str
+        The variable names in `ds`
+    values: np.ndarray
+        The new values of shape ``(nsamples, len(names))``
+    arrays: list of xarray.DataArray
+        The visualized arrays of `names` (if there are any)
+
+    Notes
+    -----
+    The data of the variables is replaced and not modified in place because
+    it might be a view on the data of the user. The statistics in the
+    attributes are updated as well"""
+    dim = ds[names[0]].dims[0]
+    if values.shape[0] != ds.dims[dim]:
+        raise ValueError(
+            "Expected %i samples for the variables, got %i. Use a new "
+            "stratplot for data with a different index" % (
+                ds.dims[dim], values.shape[0]))
+    if values.dtype.kind in 'biuf':
+        stats = block_statistics(values, ds[dim].values, names)
+    else:
+        stats = None
+    arrays = dict(zip((arr.name for arr in arrays), arrays))
+    for i, name in enumerate(names):
+        variables = [ds.variables[name]]
+        if name in arrays:
+            variables.append(arrays[name].variable)
+        for var in variables:
+            var.values = values[:, i]
+            if stats is not None:
+                var.attrs.update(stats.loc[name].to_dict())
+
+
+def _plotter_names(plotter):
+    """Get the names of the variables that are visualized by a plotter"""
+    data = plotter.data
+    if isinstance(data, InteractiveList):
+        return [arr.name for arr in data]
+    return [data.name]
+
+
+def _append_to_plotter(plotter, ds, names, plot='-'):
+    """Append new variables to a plotter that visualizes a list of arrays
+
+    Parameters
+    ----------
+    plotter: psyplot.plotter.Plotter
+        The plotter whose data is an :class:`psyplot.data.InteractiveList`
+    ds: xarray.Dataset
+        The base dataset of the data of `plotter`
+    names: list of str
+        The names of the variables in `ds` to append
+    plot: str
+        The value of the `plot` formatoption for the new variables"""
+    data = plotter.data
+    for name in names:
+        arr = ds.psy[name]
+        arr.psy.arr_name = 'arr%i' % len(data)
+        data.append(arr, new_name=True)
+    v = plotter['plot']
+    if v is not None and not isinstance(v, six.string_types):
+        v = list(v) + [plot] * len(names)
+        plotter.update(plot=v, replot=True, draw=False)
+    else:
+        plotter.update(replot=True, draw=False)
+
+
+def _select_variables(ds, columns, groups, subgroups, exclude, percentages,
+                      norm_vars, summed):
+    """Select the variables of `ds` that are necessary for :func:`stratplot`
+
+    Parameters
+    ----------
+    ds: xarray.Dataset
+        The input dataset
+    columns: list of str
+        The one-dimensional variables in `ds`
+    groups: dict
+        A mapping from group name to variable names in `ds`
+    subgroups: dict
+        A mapping from variable name to its (sub)group
+    exclude: list of str
+        Group or variable names that shall be excluded
+    percentages: list of str
+        The groups that contain percentages data
+    norm_vars: bool or list of str
+        The `calculate_percentages` parameter of :func:`stratplot`
+    summed: list of str
+        The groups that shall be summed
+
+    Returns
+    -------
+    xarray.Dataset
+        A shallow copy of `ds` with the necessary variables"""
+    keep = {col for col in columns
+            if col not in exclude and subgroups[col] not in exclude}
+    keep.update(col for col in columns if subgroups[col] in summed)
+    if norm_vars:
+        try:
+            norm_vars = list(norm_vars)
+        except TypeError:
+            norm_vars = []
+        for group in set(percentages).intersection(groups):
+            if keep.intersection(groups[group]):
+                keep.update(groups[group])
+                keep.update(chain.from_iterable(
+                    [var] if var in columns else groups[var]
+                    for var in norm_vars))
+    return ds[[col for col in columns if col in keep]].copy()
+
+
+def _normalize_dataset(ds, groups, percentages, norm_vars=True):
+    """Rescale the percentage groups in a dataset
+
+    This function does the same as :func:`normalize_percentages` but for a
+    :class:`xarray.Dataset`. If the variables in `ds` are dask arrays, the
+    computation is not yet performed.
+
+    Parameters
+    ----------
+    ds: xarray.Dataset
+        The dataset with the data
+    groups: dict
+        A mapping from group name to the list of corresponding variables in
+        `ds`
+    percentages: list of str
+        The group names in `groups` whose columns shall be rescaled
+    norm_vars: bool or list of str
+        If True, each group is normalized by the sum of its own members.
+        Otherwise, the group (or variable) names that shall be used for the
+        normalization of every group in `percentages`
+
+    Returns
+    -------
+    xarray.Dataset
+        The dataset with the rescaled variables"""
+    ds = ds.copy()
+    try:
+        norm_vars = list(norm_vars)
+    except TypeError:
+        norm_cols = None
+    else:
+        norm_cols = list(unique_everseen(chain.from_iterable(
+            [var] if var in ds else groups[var] for var in norm_vars)))
+        total = sum(ds[var].variable.fillna(0) for var in norm_cols)
+    for group in set(percentages).intersection(groups):
+        members = [var for var in groups[group] if var in ds]
+        if not members:
+            continue
+        if norm_cols is None:
+            total = sum(ds[var].variable.fillna(0) for var in members)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            factor = 100. / total
+        for var in members:
+            attrs = ds[var].attrs
+            ds[var] = ds[var].variable * factor
+            ds[var].attrs.update(attrs)
+    return ds
+
+
+def layout_axes(bbox, weights):
+    """Compute the positions of axes that share a bounding box
+
+    Parameters
+    ----------
+    bbox: matplotlib.transforms.Bbox
+        The bounding box that is shared by the axes
+    weights: list of float
+        The relative width of each axes
+
+    Returns
+    -------
+    np.ndarray
+        An array of shape ``(len(weights), 4)`` with the ``x0, y0, width,
+        height`` bounds for each axes. The axes are placed next to each other
+        from the left to the right of `bbox`"""
+    weights = np.asarray(weights, dtype=float)
+    ret = np.empty((len(weights), 4))
+    if not len(weights):
+        return ret
+    w = bbox.width * weights / weights.sum()
+    # accumulate starting from x0 such that the right edge of one axes
+    # exactly equals the left edge of the next one
+    ret[:, 0] = np.cumsum(np.r_[bbox.x0, w[:-1]])
+    ret[:, 1] = bbox.y0
+    ret[:, 2] = w
+    ret[:, 3] = bbox.height
+    return ret
+
+
+def _data_limits(ds, names):
+    """Get the minimum and maximum of each variable
+
+    The statistics that have been stored by :func:`stratplot` in the
+    attributes are used where possible"""
+    vmin = np.empty(len(names))
+    vmax = np.empty(len(names))
+    for i, name in enumerate(names):
+        attrs = ds[name].attrs
+        if 'min' in attrs and 'max' in attrs:
+            vmin[i], vmax[i] = attrs['min'], attrs['max']
+        else:
+            data = np.asarray(ds[name].values, dtype=float)
+            vmin[i], vmax[i] = np.nanmin(data), np.nanmax(data)
+    return vmin, vmax
+
+
+def _predict_xlim(xlim, vmin, vmax):
+    """Predict the x-limits of transposed line plots
+
+    This function vectorizes the calculation of the
+    :class:`psy_simple.plotters.Xlim` formatoption for several variables
+
+    Parameters
+    ----------
+    xlim: str or tuple
+        The value of the `xlim` formatoption
+    vmin: np.ndarray
+        The minimum of each variable
+    vmax: np.ndarray
+        The maximum of each variable
+
+    Returns
+    -------
+    np.ndarray
+        The lower x-limit for each variable
+    np.ndarray
+        The upper x-limit for each variable"""
+    if xlim is None or isinstance(xlim, six.string_types):
+        xlim = (xlim, xlim)
+    same = vmin == vmax
+    vmin = np.where(same, vmin - 1, vmin)
+    vmax = np.where(same, vmax + 1, vmax)
+    with np.errstate(divide='ignore'):
+        exp = np.floor(np.log10(np.abs(vmax - vmin)))
+    ret = []
+    for val, data, func in [(xlim[0], vmin, np.minimum),
+                            (xlim[1], vmax, np.maximum)]:
+        if val is not None and not isinstance(val, six.string_types):
+            ret.append(np.full(len(data), float(val)))
+        elif val == 'rounded':
+            ret.append(func(round_to_05(data, exp, mode='l'),
+                            round_to_05(data, exp, mode='s')))
+        else:
+            ret.append(data)
+    return tuple(ret)
+
+
+@docstrings.get_sectionsf('stratplot', sections=['Parameters', 'Returns'])
 def stratplot(df, group_func=None, formatoptions=None, ax=None,
               thresh=0.01, percentages=[], exclude=[],
               widths=None, calculate_percentages=True,
               min_percentage=20.0, trunc_height=0.3, fig=None, all_in_one=[],
-              stacked=[], summed=[], use_bars=False, subgroups={}):
+              stacked=[], summed=[], use_bars=False, subgroups={},
+              min_occurences=0, compact=[], heatmap=[], hidden=[]):
     """Visualize a dataframe as a stratigraphic plot
 
-    This functions takes a :class:`pandas.DataFrame` and transforms it to a
-    stratigraphic plot. The columns in the DataFrame may be grouped together
-    using the `group_func` and the widths per group should then be specified.
+    This functions takes a :class:`pandas.DataFrame` (or a
+    :class:`xarray.Dataset`) and transforms it to a stratigraphic plot. The
+    columns in the DataFrame may be grouped together using the `group_func`
+    and the widths per group should then be specified.
     This function uses matplotlib axes for each subdiagram that all share a
     common vertical axes, the index of `df`. The variables are managed in the
     order of occurence in the input `df` but, however, are grouped together
@@ -55,15 +730,22 @@ def stratplot(df, group_func=None, formatoptions=None, ax=None,
 
     Parameters
     ----------
-    df: pandas.DataFrame
-        The dataframe containing the data to plot.
-    group_func: function
+    df: pandas.DataFrame or xarray.Dataset
+        The dataframe containing the data to plot. If this is a dataset, each
+        one-dimensional variable is considered as a column and the dimension
+        of these variables as the index. The dataset may contain dask arrays
+        or be opened from a file (see :func:`xarray.open_dataset`) and only
+        the variables that are really displayed are loaded into memory.
+    group_func: function, dict, pandas.Series, pandas.DataFrame or GroupIndex
         A function that groups the columns in the input `df` together. It must
         accept the name of a column and return the corresponding group name::
 
             def group_func(col_name: str):
                 return "name of it's group"
 
+        Instead of a function, this parameter may also be a table (a mapping
+        from column name to group, see :class:`GroupIndex`) or a precompiled
+        :class:`GroupIndex` that can be reused for several calls.
         If this parameter is not specified, each column will be assigned to the
         `'nogroup'` group that can then be used in the other parameters, such
         as `formatoptions` and `percentages`. Each group may also be divided
@@ -111,13 +793,14 @@ def stratplot(df, group_func=None, formatoptions=None, ax=None,
     fig: matplotlib.Figure
         The matplotlib figure to draw the plot on. If neither `ax` nor `fig` is
         specified, a new figure will be created.
-    all_in_one: list of str
-        The groups mentioned in this parameter will all be plotted in one
-        single axes whereas the default is to plot each variable in a separate
-        plot
-    stacked: list of str
-        The groups mentioned in this parameter will all be plotted in one
-        single axes, stacked onto each other
+    all_in_one: list of str or bool
+        The groups mentioned in this parameter (or all groups if `all_in_one`
+        is ``True``) will all be plotted in one single axes whereas the
+        default is to plot each variable in a separate plot
+    stacked: list of str or bool
+        The groups mentioned in this parameter (or all groups if `stacked` is
+        ``True``) will all be plotted in one single axes, stacked onto each
+        other
     summed: list of str
         The groups (or subgroups) mentioned in this parameter will be summed
         and an extra plot will be appended to the right of the stratigraphic
@@ -132,6 +815,28 @@ def stratplot(df, group_func=None, formatoptions=None, ax=None,
             subgroups = {'Pollen': ['Trees', 'Shrubs']}
 
         to divide an overarching group into subgroups.
+    min_occurences: int
+        The minimum number of samples where a variable must not be zero in
+        order to be included in the plot
+    compact: list of str or bool
+        The groups mentioned in this parameter (or all groups if `compact` is
+        ``True``) are drawn in a compact mode, i.e. all variables (of one
+        subgroup) are drawn into one single axes where each variable has its
+        own slot (see :class:`StratCompact`). This is much faster for groups
+        with many variables. It does not affect the groups in `all_in_one`
+        and `stacked` and cannot be combined with `use_bars`
+    heatmap: list of str or bool
+        The groups mentioned in this parameter (or all groups if `heatmap` is
+        ``True``) are drawn as one image where each variable is one column
+        (see :class:`StratHeatmap`). This is the fastest option for groups
+        with hundreds of variables. It takes precedence over `compact`
+    hidden: list of str
+        The variables that are not shown initially. Groups with one axes per
+        variable do not create the plots for these variables but track them
+        in the :attr:`StratGroup.lazy` attribute, and the plot is created
+        when the variable is shown via :meth:`StratGroup.show_array` (e.g. in
+        the :class:`~psy_strat.strat_widget.StratPlotsWidget`). The first
+        variable of each group is always plotted (and hidden if necessary)
 
     Returns
     -------
@@ -139,185 +844,1110 @@ def stratplot(df, group_func=None, formatoptions=None, ax=None,
         The newly created psyplot subproject that contains the displayed data
     list of :class:`StratGroup`
         The groupers that manage the different variables. There is one
-        grouper per group"""
-    import psyplot.project as psy
-    import matplotlib.pyplot as plt
-    if group_func is None:
-        group_func = _no_grouper
-    groups = DefaultOrderedDict(list)
-    # we invert subgroups here
-    subgroup2group = dict(chain.from_iterable(
-        ((sub, group) for sub in subs)
-        for group, subs in subgroups.items()))
-    cols = {}
-    for col in df.columns:
-        group = group_func(col)
-        group = subgroup2group.get(group, group)
-        groups[group].append(col)
-        cols[col] = group
-
-    # Setup percentages
-    if isinstance(percentages, six.string_types):
-        percentages = [percentages]
+        grouper per group
+
+    Notes
+    -----
+    The statistics from :func:`block_statistics` (i.e. ``'max'``, ``'min'``,
+    ``'mean'``, ``'count'``, ``'occurences'``, ``'first_occurence'`` and
+    ``'last_occurence'``) are stored in the attributes of every variable that
+    has not been excluded"""
+    template = StratTemplate(
+        group_func, formatoptions, thresh=thresh, percentages=percentages,
+        exclude=exclude, widths=widths,
+        calculate_percentages=calculate_percentages,
+        min_percentage=min_percentage, trunc_height=trunc_height,
+        all_in_one=all_in_one, stacked=stacked, summed=summed,
+        use_bars=use_bars, subgroups=subgroups,
+        min_occurences=min_occurences, compact=compact, heatmap=heatmap,
+        hidden=hidden)
+    return template.plot(df, ax=ax, fig=fig)
+
+
+docstrings.delete_params('stratplot.parameters', 'df', 'ax', 'fig')
+
+
+def _group_list(value):
+    """Convert a group option of :func:`stratplot` to a list or True
+
+    A string is considered as one single group and anything that is not
+    iterable as a flag for all groups"""
+    if isinstance(value, six.string_types):
+        return [value]
     try:
-        percentages = list(percentages)
+        return list(value)
     except TypeError:
-        percentages = list(groups) if percentages else []
+        return True if value else []
 
-    formatoptions = formatoptions or {}
-    if calculate_percentages and set(percentages).intersection(groups):
-        df = df.copy(True)
-        for group in set(percentages).intersection(groups):
-            members = groups[group]
-            try:
-                calculate_percentages = list(calculate_percentages)
-            except TypeError:
-                norm_members = members
-            else:
-                norm_members = list(set(chain.from_iterable(
-                    [var] if var in df.columns else groups[var]
-                    for var in calculate_percentages)))
-
-            df[members] *= 100. / np.tile(
-                df[norm_members].fillna(0).sum(axis=1)[:, np.newaxis],
-                (1, len(members)))
-    if summed:
+
+def _unwrap(value):
+    """Get the value of a formatoption that might be wrapped by the
+    :class:`psy_strat.plotters.Validated` class"""
+    return value.value if isinstance(value, Validated) else value
+
+
+def _validate_formatoptions(plotter_cls, fmt, wrap=False):
+    """Validate formatoptions with the rcParams validators of a plotter
+
+    Parameters
+    ----------
+    plotter_cls: type
+        The :class:`psyplot.plotter.Plotter` subclass
+    fmt: dict
+        The formatoptions for `plotter_cls`
+    wrap: bool
+        If True, the validated values are wrapped by the
+        :class:`psy_strat.plotters.Validated` class such that the plotters
+        of a group do not validate them again
+
+    Returns
+    -------
+    dict
+        The validated formatoptions. Keys that are unknown to the rcParams of
+        `plotter_cls` and values that are already wrapped by the
+        :class:`psy_strat.plotters.Validated` class are not validated"""
+    rc = SubDict(psyplot.rcParams.defaultParams,
+                 plotter_cls._get_rc_strings())
+    ret = {}
+    for key, val in six.iteritems(fmt):
+        if isinstance(val, Validated):
+            # the value has already been validated (e.g. by a StratTemplate)
+            ret[key] = val if wrap else val.get()
+            continue
         try:
-            summed = list(summed)
-        except TypeError:
-            summed = list(groups)
-        stacked.append('Summed')
-        groups['Summed'] = [g + '_summed' for g in summed]
-        if widths:
-            widths.setdefault('Summed', 0.2)
-        formatoptions.setdefault('Summed', {}).setdefault(
-            'legendlabels', '%(long_name)s')
-        formatoptions['Summed'].setdefault('title', '')
+            validate = rc[key][1]
+        except KeyError:
+            ret[key] = val
+        else:
+            val = validate(val)
+            # the post formatoption is checked by psyplot before the plotter
+            # is created
+            ret[key] = Validated(val) if wrap and key != 'post' else val
+    return ret
+
+
+class StratTemplate(object):
+    """A compiled template for stratigraphic diagrams
+
+    This class takes the options of :func:`stratplot` and compiles everything
+    that does not depend on the data once: the group index, the diagram type
+    (the identifier in :attr:`strat_groupers`) and the validated
+    formatoptions of each group and the widths. A template can then be
+    applied to many dataframes with the same layout, e.g.::
+
+        >>> template = StratTemplate(
+        ...     group_index, percentages=['Pollen'],
+        ...     widths={'Temperature': 0.1, 'Pollen': 0.9})
+        >>> for df in frames:
+        ...     sp, groupers = template.plot(df)
+
+    :func:`stratplot` is equivalent to creating a template and calling its
+    :meth:`plot` method."""
+
+    @docstrings.dedent
+    def __init__(self, group_func=None, formatoptions=None, thresh=0.01,
+                 percentages=[], exclude=[], widths=None,
+                 calculate_percentages=True, min_percentage=20.0,
+                 trunc_height=0.3, all_in_one=[], stacked=[], summed=[],
+                 use_bars=False, subgroups={}, min_occurences=0, compact=[],
+                 heatmap=[], hidden=[]):
+        """
+        Parameters
+        ----------
+        %(stratplot.parameters.no_df|ax|fig)s"""
+        if not isinstance(group_func, GroupIndex):
+            group_func = GroupIndex(group_func)
+        self.group_func = group_func
+        self.subgroups = dict(subgroups)
+        self.thresh = thresh
+        self.exclude = list(exclude)
+        self.calculate_percentages = calculate_percentages
+        self.min_percentage = min_percentage
+        self.trunc_height = trunc_height
+        self.min_occurences = min_occurences
+        self.percentages = _group_list(percentages)
+        self.summed = _group_list(summed)
+        self.compact = _group_list(compact)
+        self.heatmap = _group_list(heatmap)
+        self.use_bars = _group_list(use_bars)
+        self.all_in_one = _group_list(all_in_one)
+        self.stacked = _group_list(stacked)
+        self.hidden = list(hidden)
+        self.formatoptions = {group: dict(fmt) for group, fmt in six.iteritems(
+            formatoptions or {})}
+        self.widths = widths.copy() if widths else None
+        if self.summed and self.stacked is not True:
+            self.stacked.append('Summed')
+            if self.widths:
+                self.widths.setdefault('Summed', 0.2)
+            fmt = self.formatoptions.setdefault('Summed', {})
+            fmt.setdefault('legendlabels', '%(long_name)s')
+            fmt.setdefault('title', '')
+        self._identifiers = {}
+        self._fmts = {}
+
+    def _in(self, group, option):
+        """Check whether the `group` is selected by a group `option`"""
+        return option is True or group in option
+
+    def identifier(self, group):
+        """Get the diagram type of a group
+
+        Parameters
+        ----------
+        group: str
+            The group name
+
+        Returns
+        -------
+        str
+            The key of the :class:`StratGroup` subclass in
+            :attr:`strat_groupers`"""
+        try:
+            return self._identifiers[group]
+        except KeyError:
+            pass
+        percentages = self._in(group, self.percentages)
+        if self._in(group, self.all_in_one):
+            identifier = 'all_in_one'
+        elif self._in(group, self.stacked):
+            identifier = 'stacked'
+        elif self._in(group, self.heatmap):
+            identifier = 'heatmap_percentages' if percentages else 'heatmap'
+        elif self._in(group, self.compact):
+            identifier = 'compact_percentages' if percentages else 'compact'
+        elif percentages:
+            identifier = 'percentages'
+        else:
+            identifier = 'default'
+        self._identifiers[group] = identifier
+        return identifier
+
+    def group_formatoptions(self, group):
+        """Get the validated formatoptions of a group
+
+        Parameters
+        ----------
+        group: str
+            The group name
+
+        Returns
+        -------
+        dict
+            The formatoptions for the plots of `group`. The values are
+            wrapped by the :class:`psy_strat.plotters.Validated` class such
+            that they are not validated again for every plot. This
+            dictionary is shared by all calls of :meth:`plot` and must not be
+            modified"""
+        try:
+            return self._fmts[group]
+        except KeyError:
+            pass
+        identifier = self.identifier(group)
+        fmt = dict(self.formatoptions.get(group, {}))
+        if identifier in ['compact_percentages', 'heatmap_percentages']:
+            fmt.setdefault('slot_min', self.min_percentage)
+        grouper_cls = strat_groupers[identifier]
+        if (self._in(group, self.use_bars) and
+                grouper_cls.plotter_cls is StratPlotter):
+            plotter_cls = BarStratPlotter
+        else:
+            plotter_cls = grouper_cls.plotter_cls
+        fmt = self._fmts[group] = _validate_formatoptions(
+            plotter_cls, fmt, True)
+        return fmt
+
+    @docstrings.dedent
+    def plot(self, df, ax=None, fig=None):
+        """Visualize a dataframe with this template
+
+        Parameters
+        ----------
+        df: pandas.DataFrame or xarray.Dataset
+            The dataframe containing the data to plot (see :func:`stratplot`)
+        ax: matplotlib.axes.Axes
+            The matplotlib axes to plot on (see :func:`stratplot`)
+        fig: matplotlib.Figure
+            The matplotlib figure to draw the plot on (see :func:`stratplot`)
+
+        Returns
+        -------
+        %(stratplot.returns)s"""
+        import psyplot.project as psy
+        import matplotlib.pyplot as plt
+        logger = logging.getLogger(__name__)
+        exclude = self.exclude
+        calculate_percentages = self.calculate_percentages
+        trunc_height = self.trunc_height
+        min_percentage = self.min_percentage
+        groups = DefaultOrderedDict(list)
+        if isinstance(df, xr.Dataset):
+            columns = [var for var, varo in df.data_vars.items()
+                       if varo.ndim == 1]
+            if not columns:
+                raise ValueError(
+                    "The dataset does not contain any one-dimensional data "
+                    "variables to plot")
+        else:
+            columns = list(df.columns)
+        col_subgroups, col_groups = self.group_func.resolve(
+            columns, self.subgroups)
+        col_subgroups = dict(zip(columns, col_subgroups))
+        cols = dict(zip(columns, col_groups))
+        for col, group in cols.items():
+            groups[group].append(col)
+
+        percentages = [group for group in groups
+                       if self._in(group, self.percentages)]
+        summed = list(groups) if self.summed is True else self.summed
+        use_bars = list(groups) if self.use_bars is True else self.use_bars
+
+        if isinstance(df, xr.Dataset):
+            # only select what we need to not load unnecessary data
+            ds = _select_variables(
+                df, columns, groups, col_subgroups, exclude, percentages,
+                calculate_percentages, summed)
+            if calculate_percentages and percentages:
+                ds = _normalize_dataset(
+                    ds, groups, percentages, calculate_percentages)
+            idx = df[columns[0]].dims[0]
+            if idx not in ds.coords:
+                ds[idx] = xr.Variable((idx, ), np.arange(ds.dims[idx]))
+        elif calculate_percentages and percentages:
+            df, nbytes = normalize_percentages(
+                df, groups, percentages, calculate_percentages)
+            logger.debug('Allocated %i bytes for the normalization of %s',
+                         nbytes, percentages)
+
+        if summed:
+            groups['Summed'] = [g + '_summed' for g in summed]
+
+        widths = self.widths or defaultdict(
+            lambda: 1. / (len(set(groups).difference(percentages)) or 1))
+
+        blocks = []
+        if not isinstance(df, xr.Dataset):
+            # NOTE: we create the Dataset manually instead of using
+            # xarray.Dataset.from_dataframe becuase that is much faster
+            idx = df.index.name or 'y'
+            ds, blocks = _dataframe_to_dataset(df, idx)
+            ds = ds[list(cols)]
+        for var, varo in ds.variables.items():
+            if var not in ds.coords:
+                varo.attrs['group'] = col_subgroups[var]
+                varo.attrs['maingroup'] = cols[var]
+        for group in summed:
+            variables = [var for var, varo in ds.variables.items()
+                         if varo.attrs.get('group') == group]
+            if variables:
+                data = ds[variables].to_array().sum('variable').data
+            else:
+                data = np.zeros(ds.dims[idx])
+            ds[group + '_summed'] = xr.Variable(
+                (idx, ), data, attrs={'long_name': group, 'group': 'Summed',
+                                      'maingroup': 'Summed'})
+
+            cols[group + '_summed'] = 'Summed'
+
+        candidates = [
+            var for var, varo in ds.variables.items()
+            if ((var not in ds.coords) and
+                (var not in exclude and varo.attrs['group'] not in exclude))]
+        # compute the statistics without loading the data such that only the
+        # variables that we really display are loaded
+        stats = _variable_statistics(ds, candidates, blocks)
+        for var, var_stats in stats.iterrows():
+            ds[var].attrs.update(var_stats.to_dict())
+        plot_vars = [
+            var for var in candidates
+            if (cols[var] not in percentages or
+                stats.loc[var, 'max'] > self.thresh)
+            and not stats.loc[var, 'occurences'] < self.min_occurences]
+        if isinstance(df, xr.Dataset):
+            ds = ds[plot_vars].load()
+        arr_names = []
+
+        if ax is None:
+            fig = fig or plt.figure()
+            bbox = mt.Bbox.from_extents(
+                mpl.rcParams['figure.subplot.left'],
+                mpl.rcParams['figure.subplot.bottom'],
+                mpl.rcParams['figure.subplot.right'],
+                mpl.rcParams['figure.subplot.top'])
+        elif isinstance(ax, (mpl.axes.SubplotBase, mpl.axes.Axes)):
+            bbox = ax.get_position()
+            fig = ax.figure
+        else:  # the bbox is given
+            bbox = ax
+            fig = fig or plt.gcf()
+        x0 = bbox.x0
+        y0 = bbox.y0
+        orig_height = bbox.height
+        height = orig_height * (1 - trunc_height)
+        total_width = bbox.width
+        x1 = x0 + total_width
+
+        # compute the layout of the entire diagram before creating any axes
+        layout = []
+        lazy = {}
+        hidden = set(self.hidden)
+        for group, variables in groups.items():
+            variables = [v for v in variables if v in plot_vars]
+            if not variables:
+                continue
+            identifier = self.identifier(group)
+            if hidden and strat_groupers[identifier].supports_lazy:
+                lazy[group] = variables
+                variables = variables[:1] + [
+                    v for v in variables[1:] if v not in hidden]
+            layout.append((group, identifier, variables,
+                           self.group_formatoptions(group)))
+        group_widths = np.array([widths[t[0]] for t in layout]) * total_width
+        group_bboxes = [
+            mt.Bbox.from_bounds(x, y0, w, height) for x, w in zip(
+                np.cumsum(np.r_[x0, group_widths[:-1]]), group_widths)]
+        weights = [
+            strat_groupers[identifier].axes_weights(
+                ds, variables, fmt,
+                min_percentage if identifier == 'percentages' else None)
+            for group, identifier, variables, fmt in layout]
+        positions = list(map(layout_axes, group_bboxes, weights))
+
+        ax0 = None
+        mp = psy.gcp(True)
+        groupers = []
+        with psy.Project.block_signals:
+            for (group, identifier, variables, fmt), group_bbox, pos, w in zip(
+                    layout, group_bboxes, positions, weights):
+                grouper_cls = strat_groupers[identifier]
+                grouper = grouper_cls.from_dataset(
+                    fig, group_bbox, ds, variables, fmt=fmt,
+                    project=mp, ax0=ax0, use_bars=use_bars, group=group,
+                    positions=pos)
+                if identifier == 'percentages':
+                    grouper.min_xlim = min_percentage
+                    # the axes have already been scaled to the minimum
+                    for plotter, upper in zip(grouper.plotters, w):
+                        if upper <= min_percentage:
+                            plotter.update(xlim=(0, min_percentage),
+                                           draw=False)
+                if group in lazy:
+                    grouper.lazy = [v for v in lazy[group]
+                                    if v not in variables]
+                    grouper.lazy_fmt = fmt
+                    grouper._order = lazy[group]
+                if group != NOGROUP:
+                    grouper.group_plots(trunc_height / height)
+                hide = [name for name in variables if name in hidden]
+                if hide:
+                    grouper.hide_arrays(hide)
+                ds[group] = xr.Variable(tuple(), '',
+                                        attrs={'identifier': identifier})
+                ax0 = ax0 or grouper.axes[0]
+
+                arr_names.extend(
+                    arr.psy.arr_name for arr in grouper.plotter_arrays)
+                groupers.append(grouper)
+            if psyplot.with_gui:
+                from psyplot_gui.main import mainwindow
+                mainwindow.plugins[gui_plugin].add_tree(groupers)
+        # invert the vertical axis
+        ax0.invert_yaxis()
+
+        sp = psy.gcp(True)(arr_name=arr_names)
+        sp[0].psy.update(
+            ylabel='%(name)s', ytickprops={'left': True, 'labelleft': True},
+            draw=False)
+        for ax, p in sp.axes.items():
+            ax_bbox = ax.get_position()
+            d = {}
+            if not np.isclose(ax_bbox.x0, x0):
+                d['left'] = ':'
+            if not np.isclose(ax_bbox.x1, x1):
+                d['right'] = ':'
+            p.update(axislinestyle=d, draw=False)
+        psy.scp(sp.main)
+        psy.scp(sp)
+        return sp, groupers
+
+
+def update_stratplot(groupers, df, group_func=None, formatoptions=None,
+                     thresh=0.01, exclude=[], calculate_percentages=True,
+                     subgroups={}, min_occurences=0):
+    """Update an existing stratigraphic plot with new data
+
+    This function pushes the new values of `df` into the plots created by
+    :func:`stratplot` instead of creating the entire diagram again. The
+    layout of a group is only recomputed if its x-limits change and columns
+    that are not yet visualized are added to the plot of their group (if they
+    fulfill the `thresh` and `min_occurences` criteria).
+
+    Parameters
+    ----------
+    groupers: list of StratGroup
+        The groupers as returned by :func:`stratplot`
+    df: pandas.DataFrame or xarray.Dataset
+        The new data. It must have the same number of samples as the data of
+        the existing plot. Columns that are not in `df` are left unchanged
+    group_func: function, dict, pandas.Series, pandas.DataFrame or GroupIndex
+        The grouping for new columns (see :func:`stratplot`)
+    formatoptions: dict
+        The formatoptions for the plots of new columns (see
+        :func:`stratplot`)
+    thresh: float
+        The threshold for new columns of percentages groups (see
+        :func:`stratplot`)
+    exclude: list of str
+        Either group names of column names in `df` that should be ignored
+    calculate_percentages: bool or list of str
+        If True, rescale the columns of the percentages groups to sum up to
+        100% (see :func:`stratplot`)
+    subgroups: dict
+        A mapping from group name to a list of subgroups for new columns
+    min_occurences: int
+        The minimum number of samples where a new column must not be zero in
+        order to be included in the plot
+
+    Returns
+    -------
+    list of str
+        The names of the variables that have been added to the plot
+
+    Notes
+    -----
+    Columns that belong to a group that is not yet part of the diagram are
+    ignored and a warning is raised"""
+    arr = groupers[0].arrays[0]
+    base = arr.psy.base
+    idx = arr.dims[0]
+    if isinstance(df, xr.Dataset):
+        columns = [var for var, varo in df.data_vars.items()
+                   if varo.ndim == 1 and var not in base.coords]
+        nsamples = df[columns[0]].shape[0] if columns else base.dims[idx]
     else:
-        summed = []
+        columns = list(df.columns)
+        nsamples = len(df)
+    if nsamples != base.dims[idx]:
+        raise ValueError(
+            "Expected %i samples for the variables, got %i. Use a new "
+            "stratplot for data with a different index" % (
+                base.dims[idx], nsamples))
+    new = [col for col in columns if col not in base.variables]
+    col_subgroups = {col: base.variables[col].attrs.get('group')
+                     for col in columns if col not in new}
+    cols = {col: base.variables[col].attrs.get('maingroup')
+            for col in col_subgroups}
+    if new:
+        if not isinstance(group_func, GroupIndex):
+            group_func = GroupIndex(group_func)
+        new_subgroups, new_groups = group_func.resolve(new, subgroups)
+        col_subgroups.update(zip(new, new_subgroups))
+        cols.update(zip(new, new_groups))
+    groups = DefaultOrderedDict(list)
+    for col in columns:
+        groups[cols[col]].append(col)
+
+    percentages = [
+        group for group in groups if group in base.variables and
+        base.variables[group].attrs.get('identifier', '').endswith(
+            'percentages')]
+    if calculate_percentages and percentages:
+        if isinstance(df, xr.Dataset):
+            df = _normalize_dataset(
+                df[columns], groups, percentages, calculate_percentages)
+        else:
+            df = normalize_percentages(
+                df, groups, percentages, calculate_percentages)[0]
+    columns = [col for col in columns
+               if col not in exclude and col_subgroups[col] not in exclude]
+    data = {col: np.asarray(df[col].values) for col in columns}
+
+    # recompute the sums of the summed subgroups
+    for var, varo in base.variables.items():
+        if var.endswith('_summed') and varo.attrs.get('group') == 'Summed':
+            subgroup = varo.attrs.get('long_name')
+            members = [col for col in columns
+                       if col_subgroups[col] == subgroup]
+            if members:
+                members.extend(
+                    name for name, v in base.variables.items()
+                    if v.attrs.get('group') == subgroup and name not in data)
+                data[var] = np.sum(
+                    [data[name] if name in data else
+                     base.variables[name].values for name in members], axis=0)
+
+    # update the visualized variables
+    plotted = set()
+    lazy = set()
+    for grouper in groupers:
+        plotted.update(arr.name for arr in grouper.arrays)
+        lazy.update(grouper.lazy)
+        grouper.update_data(data)
+
+    # store the remaining columns in the dataset and add the ones that fulfill
+    # the criteria
+    rest = [col for col in columns if col not in plotted]
+    if not rest:
+        return []
+    values = np.column_stack([data[col] for col in rest])
+    for col in rest:
+        if col in new:
+            base[col] = xr.Variable(
+                (idx, ), data[col], attrs={'group': col_subgroups[col],
+                                           'maingroup': cols[col]})
+    _set_variables(base, rest, values)
+    stats = {col: base.variables[col].attrs for col in rest}
+    # the lazy variables are plotted when they are shown
+    rest = [col for col in rest if col not in lazy and
+            (cols[col] not in percentages or stats[col]['max'] > thresh)
+            and not stats[col]['occurences'] < min_occurences]
+    groupers = {grouper.group: grouper for grouper in groupers}
+    formatoptions = formatoptions or {}
+    added = []
+    for group, variables in groups.items():
+        variables = [var for var in variables if var in rest]
+        if not variables:
+            continue
+        elif group not in groupers:
+            warnings.warn(
+                "Cannot add the variables %s because the group %s is not "
+                "part of the diagram" % (', '.join(variables), group))
+            continue
+        groupers[group].add_variables(base, variables,
+                                      formatoptions.get(group))
+        added.extend(variables)
+    return added
+
+
+#: The options for :func:`_render_site` in the worker processes of
+#: :func:`stratplot_many`
+_worker_options = {}
+
+
+def _init_worker(options):
+    """Initialize a worker process of :func:`stratplot_many`"""
+    global _worker_options
+    mpl.use('agg')
+    _worker_options = options
+
+
+def _read_frame(path, read_kws={}):
+    """Read the data of one site for :func:`stratplot_many`
+
+    Netcdf files are opened with :func:`xarray.open_dataset`, everything else
+    is read with :func:`pandas.read_csv`, where ``.tsv`` and ``.tab`` files
+    are considered as tab-separated"""
+    ext = os.path.splitext(path)[1].lower()
+    if ext in ['.nc', '.nc4']:
+        return xr.open_dataset(path, **read_kws)
+    kws = {'index_col': 0}
+    if ext in ['.tsv', '.tab']:
+        kws['sep'] = '\t'
+    kws.update(read_kws)
+    return pd.read_csv(path, **kws)
+
+
+def _render_site(job):
+    """Render the diagram of one site in a worker of :func:`stratplot_many`
 
-    widths = widths or defaultdict(
-        lambda: 1. / (len(set(groups).difference(percentages)) or 1))
+    Parameters
+    ----------
+    job: tuple
+        The position, name, data (or path) and output file of the site
 
-    # Setup use_bars
-    if isinstance(use_bars, six.string_types):
-        use_bars = [use_bars]
+    Returns
+    -------
+    tuple
+        The position and a dictionary with the timings and the error"""
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    i, name, data, output = job
+    options = _worker_options
+    read_kws = options['read_kws'] or {}
+    savefig_kws = options['savefig_kws'] or {}
+    fig = Figure(figsize=options['figsize'])
+    FigureCanvasAgg(fig)
+    ret = {'output': output, 'load': np.nan, 'plot': np.nan, 'save': np.nan,
+           'error': None}
+    sp = None
+    t0 = time.perf_counter()
     try:
-        use_bars = list(use_bars)
-    except TypeError:
-        use_bars = list(groups) if use_bars else []
+        if isinstance(data, six.string_types):
+            data = _read_frame(data, read_kws)
+        t1 = time.perf_counter()
+        ret['load'] = t1 - t0
+        sp = options['template'].plot(data, fig=fig)[0]
+        t2 = time.perf_counter()
+        ret['plot'] = t2 - t1
+        fig.savefig(output, **savefig_kws)
+        ret['save'] = time.perf_counter() - t2
+    except Exception:
+        ret['error'] = traceback.format_exc()
+    finally:
+        if sp is not None:
+            sp.close(figs=True, data=True, ds=True, remove_only=True)
+    ret['total'] = time.perf_counter() - t0
+    return i, ret
+
+
+def stratplot_many(frames, output='%(name)s.png', processes=None,
+                   figsize=None, savefig_kws=None, read_kws=None,
+                   chunksize=1, template=None, **kwargs):
+    """Render the stratigraphic diagrams of many sites into files
+
+    This function plots each site with the same :class:`StratTemplate` (i.e.
+    the options of :func:`stratplot`) and saves the figure into a file. The
+    sites are distributed on a pool of processes that use headless figures
+    (i.e. the Agg backend of matplotlib) and are independent of the current
+    psyplot project and pyplot.
 
-    # NOTE: we create the Dataset manually instead of using
-    # xarray.Dataset.from_dataframe becuase that is much faster
-    idx = df.index.name or 'y'
-    ds = xr.Dataset(
-        {col: xr.Variable((idx, ), df[col]) for col in df.columns},
-        {idx: xr.Variable((idx, ), df.index)})
-    for var, varo in ds.variables.items():
-        if var not in ds.coords:
-            varo.attrs['group'] = group_func(var)
-            varo.attrs['maingroup'] = cols[var]
-    for group in summed:
-        variables = [var for var, varo in ds.variables.items()
-                     if varo.attrs.get('group') == group]
-        ds[group + '_summed'] = xr.Variable(
-            (idx, ), df[variables].sum(axis=1).values,
-            attrs={'long_name': group, 'group': 'Summed',
-                   'maingroup': 'Summed'})
-
-        cols[group + '_summed'] = 'Summed'
-
-    plot_vars = [
-        var for var, varo in ds.variables.items()
-        if ((var not in ds.coords) and
-            (var not in exclude and varo.attrs['group'] not in exclude) and
-            (cols[var] not in percentages or ds[var].max().values > thresh))]
-    arr_names = []
-
-    if ax is None:
-        fig = fig or plt.figure()
-        bbox = mt.Bbox.from_extents(
-            mpl.rcParams['figure.subplot.left'],
-            mpl.rcParams['figure.subplot.bottom'],
-            mpl.rcParams['figure.subplot.right'],
-            mpl.rcParams['figure.subplot.top'])
-    elif isinstance(ax, (mpl.axes.SubplotBase, mpl.axes.Axes)):
-        bbox = ax.get_position()
-        fig = ax.figure
-    else:  # the bbox is given
-        bbox = ax
-        fig = fig or plt.gcf()
-    x0 = bbox.x0
-    y0 = bbox.y0
-    orig_height = bbox.height
-    height = orig_height * (1 - trunc_height)
-    total_width = bbox.width
-    x1 = x0 + total_width
-
-    i = 0
-    ax0 = None
-    x = x0
-    mp = psy.gcp(True)
+    Parameters
+    ----------
+    frames: iterable or dict
+        The data of the sites. Each item may be a :class:`pandas.DataFrame`,
+        a :class:`xarray.Dataset` or the path to a file (see below). If this
+        is a dictionary, the keys are used as the names of the sites.
+        Otherwise the name is the file name (without extension) for paths and
+        the position in `frames` for everything else
+    output: str
+        The path of the output files. It is formatted with the ``name`` and
+        the position ``i`` of the site, e.g. ``'plots/%(name)s.pdf'``. The
+        format of the file is determined by its extension
+    processes: int
+        The number of processes to use. If None, the number of CPUs is used.
+        If 0, the diagrams are rendered in the current process
+    figsize: tuple of floats
+        The ``(width, height)`` of the figures in inches
+    savefig_kws: dict
+        Keyword arguments for the :meth:`matplotlib.figure.Figure.savefig`
+        method
+    read_kws: dict
+        Keyword arguments for :func:`pandas.read_csv` (or
+        :func:`xarray.open_dataset` for netCDF files) to read the files in
+        `frames`. ``.tsv`` and ``.tab`` files are read as tab-separated files
+    chunksize: int
+        The number of sites that are sent at once to a worker process
+    template: StratTemplate
+        The template for the diagrams. If None, it is created from the
+        `kwargs`
+    ``**kwargs``
+        Any other keyword argument for :class:`StratTemplate` (i.e. the
+        options of :func:`stratplot`). Note that the template must be
+        picklable if `processes` is not 0, i.e. the `group_func` should be
+        a table, a :class:`GroupIndex` or a module-level function
+
+    Returns
+    -------
+    pandas.DataFrame
+        A dataframe with one row per site and the columns
+
+        output
+            The path of the output file
+        load, plot, save, total
+            The time in seconds to read the data, create the diagram, save
+            the figure and the total time
+        error
+            The traceback of the error during the rendering or None, if the
+            site has been rendered successfully
+
+    Notes
+    -----
+    The rendering of one site does not stop the others if it fails. Check the
+    ``error`` column of the returned dataframe"""
+    if isinstance(frames, dict):
+        items = list(frames.items())
+    else:
+        items = [
+            (os.path.splitext(os.path.basename(data))[0]
+             if isinstance(data, six.string_types) else str(i), data)
+            for i, data in enumerate(frames)]
+    jobs = [(i, name, data, output % {'name': name, 'i': i})
+            for i, (name, data) in enumerate(items)]
+    if template is None:
+        template = StratTemplate(**kwargs)
+    options = dict(template=template, figsize=figsize,
+                   savefig_kws=savefig_kws, read_kws=read_kws)
+    results = [None] * len(jobs)
+    if processes == 0:
+        global _worker_options
+        old = _worker_options
+        _worker_options = options
+        try:
+            for job in jobs:
+                i, ret = _render_site(job)
+                results[i] = ret
+        finally:
+            _worker_options = old
+    else:
+        pool = mp.Pool(processes, initializer=_init_worker,
+                       initargs=(options, ))
+        try:
+            for i, ret in pool.imap_unordered(_render_site, jobs, chunksize):
+                results[i] = ret
+        finally:
+            pool.close()
+            pool.join()
+    return pd.DataFrame(
+        results, index=pd.Index([name for name, data in items], name='name'),
+        columns=['output', 'load', 'plot', 'save', 'total', 'error'])
+
+
+def _extend_collection(coll, paths):
+    """Append `paths` to the paths of a matplotlib collection in place"""
+    coll.get_paths().extend(paths)
+    coll.stale = True
+
+
+#: The buffers with the data of the lines that are extended by
+#: :func:`_extend_line`
+_line_buffers = weakref.WeakKeyDictionary()
+
+
+def _extend_line(line, x, y):
+    """Append points to a matplotlib line in place
+
+    The data of the `line` is kept in a buffer that grows geometrically, such
+    that only the new points `x` and `y` are copied into it"""
+    n = len(line.get_xdata(orig=True))
+    buf = _line_buffers.get(line)
+    if buf is None or len(buf) < n + len(x):
+        old = buf[:n] if buf is not None else np.column_stack(
+            [line.get_xdata(orig=True), line.get_ydata(orig=True)])
+        buf = _line_buffers[line] = np.empty((max(n + len(x), 2 * n), 2))
+        buf[:n] = old
+    buf[n:n + len(x), 0] = x
+    buf[n:n + len(x), 1] = y
+    line.set_data(buf[:n + len(x), 0], buf[:n + len(x), 1])
+
+
+def _extend_plot(plotter, start):
+    """Extend the artists of a plotter by the samples from `start` on
+
+    This function extends the lines and areas of a :class:`StratPlotter`
+    and the lines of the `hlines` formatoption in place after new samples
+    have been appended to the data of the `plotter`
+
+    Parameters
+    ----------
+    plotter: psy_strat.plotters.StratPlotter
+        The plotter whose data has been extended
+    start: int
+        The number of samples that have already been plotted
+
+    Returns
+    -------
+    tuple of floats or None
+        The minimum and maximum of the new x-values or None, if the artists of
+        the `plotter` cannot be extended and the plotter has to be replotted
+        """
+    if (not isinstance(plotter, StratPlotter) or
+            isinstance(plotter, CompactStratPlotter) or
+            not plotter['transpose'] or plotter['occurences'] is not None or
+            plotter['exag'] is not None or plotter['decimate'] is not None):
+        return None
+    plot = plotter.plot
+    value = plot.value
+    if value is None:
+        return np.nan, np.nan
+    data = plotter.plot_data
+    arrays = list(data) if isinstance(data, InteractiveList) else [data]
+    visible = [(arr, ls) for arr, ls in zip(arrays, cycle(safe_list(value)))
+               if ls is not None]
+    if not visible:
+        return np.nan, np.nan
+    ax = plotter.ax
+    arr = visible[0][0]
+    # include the last plotted sample to close the gap to the new ones
+    i0 = max(start - 1, 0)
+    # only the new samples are converted, not the entire index
+    y = np.asarray(arr[arr.dims[0]].values[i0:], dtype=float)
+    new = slice(start - i0, None)
+    xs = []
+    if 'stacked' in value:
+        base = np.zeros(len(y))
+        for (arr, ls), coll in zip(visible, plot._plot):
+            x = np.asarray(arr.values[i0:], dtype=float)
+            x = base + np.where(np.isnan(x), 0, x)
+            tmp = ax.fill_betweenx(y, base, x)
+            _extend_collection(coll, tmp.get_paths())
+            tmp.remove()
+            base = x
+        xs.append(base[new])
+    else:
+        for (arr, ls), artist in zip(visible, plot._plot):
+            x = np.asarray(arr.values[i0:], dtype=float)
+            if ls == 'areax':
+                zeros = np.zeros_like(x)
+                tmp = ax.fill_betweenx(
+                    y, np.vstack([x, zeros]).min(axis=0),
+                    np.vstack([x, zeros]).max(axis=0))
+                _extend_collection(artist, tmp.get_paths())
+                tmp.remove()
+            elif ls in ['area', 'areay']:
+                return None
+            else:
+                _extend_line(artist, x[new], y[new])
+            xs.append(x[new])
+    hlines = plotter.hlines
+    if hlines.artists is not None:
+        x0, x1 = hlines.xlim.range
+        _extend_collection(hlines.artists, [
+            Path([[x0, val], [x1, val]]) for val in np.unique(y[new])])
+    elif hlines.shared_artist is not None:
+        hlines.shared_artist.extend(hlines, np.unique(y[new]))
+    xs = np.concatenate(xs)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        return np.nanmin(xs), np.nanmax(xs)
+
+
+class StratStream(object):
+    """Append new samples to an existing stratigraphic diagram
+
+    This class appends new rows (e.g. new depths of a core) to the data of a
+    diagram that has been created by :func:`stratplot`. The lines, areas and
+    measurement lines are extended in place, the plots are neither recreated
+    nor is the dataset, e.g.::
+
+        >>> sp, groupers = stratplot(df, percentages=['Pollen'])
+        >>> stream = StratStream(groupers)
+        >>> stream.append(new_rows)
+
+    The data of every variable is kept in a buffer that grows geometrically,
+    such that the costs of an append are proportional to the number of
+    appended rows. The plots of the compact, heatmap and bar groups and plots
+    with occurences, exaggerations or decimated data are replotted."""
+
+    #: The groupers of the diagram
     groupers = []
-    with psy.Project.block_signals:
-        for group, variables in groups.items():
 
-            variables = [v for v in variables if v in plot_vars]
-            if not variables:
+    def __init__(self, groupers, group_func=None, calculate_percentages=True):
+        """
+        Parameters
+        ----------
+        groupers: list of StratGroup
+            The groupers as returned by :func:`stratplot`
+        group_func: function, dict, pandas.Series/DataFrame or GroupIndex
+            The grouping for columns that are not part of the dataset of the
+            diagram. They are not visualized but used for the normalization
+            of the percentages (see :func:`stratplot`)
+        calculate_percentages: bool or list of str
+            If True, rescale the new rows of the percentages groups to sum up
+            to 100% (see :func:`stratplot`)"""
+        self.groupers = groupers
+        arr = groupers[0].arrays[0]
+        self.base = arr.psy.base
+        self.dim = arr.dims[0]
+        if not isinstance(group_func, GroupIndex):
+            group_func = GroupIndex(group_func)
+        self.group_func = group_func
+        self.calculate_percentages = calculate_percentages
+        self._buffers = {}
+
+    def _extend_buffer(self, name, var, values):
+        """Append `values` to the buffer of the variable `name`"""
+        n = len(var)
+        buf = self._buffers.get(name)
+        if (buf is None or len(buf) < n + len(values) or
+                not np.can_cast(values.dtype, buf.dtype, 'same_kind')):
+            old = buf[:n] if buf is not None else var.values
+            buf = np.empty(max(n + len(values), 2 * n),
+                           np.result_type(old.dtype, values.dtype))
+            buf[:n] = old
+            self._buffers[name] = buf
+        buf[n:n + len(values)] = values
+        return buf[:n + len(values)]
+
+    def _extend_dataset(self, new):
+        """Append the `new` values to the variables of the dataset"""
+        base, dim = self.base, self.dim
+        variables = {}
+        for name, values in new.items():
+            var = base.variables[name]
+            cls = xr.IndexVariable if name == dim else xr.Variable
+            variables[name] = cls(
+                var.dims, self._extend_buffer(name, var, values), var.attrs,
+                var.encoding)
+        # the variables cannot be resized, so we replace them in the dataset
+        for name in new:
+            del base[name]
+        base.update(variables)
+
+    def _update_arrays(self, plotter, stats):
+        """Point the arrays of a `plotter` to the extended variables"""
+        base = self.base
+        arrays = []
+        for data in [plotter.data, plotter.plot_data]:
+            arrays.extend(data if isinstance(data, InteractiveList) else
+                          [data])
+        for arr in unique_everseen(arrays, key=id):
+            # select the extended variable from the base dataset again. This
+            # keeps the object that is referenced by the plotter and the
+            # project
+            arr.psy.base = base
+            arr.psy._update_array({self.dim: slice(None)}, 'isel')
+            arr.attrs.update(stats.get(arr.name, {}))
+
+    def append(self, df):
+        """Append new samples to the diagram
+
+        Parameters
+        ----------
+        df: pandas.DataFrame or xarray.Dataset
+            The new samples. The index of `df` is appended to the index of the
+            diagram. Columns that are not part of the dataset of the diagram
+            are only used for the normalization of the percentages and
+            variables that are not in `df` are filled with NaN
+
+        Returns
+        -------
+        int
+            The number of samples in the diagram"""
+        base, dim = self.base, self.dim
+        if isinstance(df, xr.Dataset):
+            df = df.to_dataframe()
+        nsamples = len(df)
+        start = base.dims[dim]
+        if not nsamples:
+            return start
+        columns = list(df.columns)
+        known = [col for col in columns if col in base.variables]
+        cols = {col: base.variables[col].attrs.get('maingroup')
+                for col in known}
+        col_subgroups = {col: base.variables[col].attrs.get('group')
+                         for col in known}
+        unknown = [col for col in columns if col not in cols]
+        if unknown:
+            subgroups, groups = self.group_func.resolve(unknown)
+            col_subgroups.update(zip(unknown, subgroups))
+            cols.update(zip(unknown, groups))
+        groups = DefaultOrderedDict(list)
+        for col in columns:
+            groups[cols[col]].append(col)
+        percentages = [
+            group for group in groups if group in base.variables and
+            base.variables[group].attrs.get('identifier', '').endswith(
+                'percentages')]
+        norm_vars = self.calculate_percentages
+        if norm_vars and percentages:
+            df = normalize_percentages(df, groups, percentages, norm_vars)[0]
+
+        # the new values for every variable along the index dimension
+        new = {}
+        for name, var in base.variables.items():
+            if name == dim or var.dims != (dim, ):
                 continue
-            w = widths[group] * total_width
-            if group in all_in_one:
-                identifier = 'all_in_one'
-            elif group in stacked:
-                identifier = 'stacked'
-            elif group in percentages:
-                identifier = 'percentages'
+            elif name in df.columns:
+                new[name] = np.asarray(df[name].values)
+            elif (name.endswith('_summed') and
+                  var.attrs.get('group') == 'Summed'):
+                members = [col for col in columns if col_subgroups[col] ==
+                           var.attrs.get('long_name')]
+                new[name] = np.nansum(
+                    [df[col].values for col in members], axis=0) \
+                    if members else np.zeros(nsamples)
             else:
-                identifier = 'default'
-            grouper_cls = strat_groupers[identifier]
-            grouper = grouper_cls.from_dataset(
-                fig, mt.Bbox.from_bounds(x, y0, w, height),
-                ds, variables, fmt=dict(formatoptions.get(group, {})),
-                project=mp, ax0=ax0, use_bars=use_bars, group=group)
-            if identifier == 'percentages':
-                resize = False
-                for plotter in grouper.plotters:
-                    if plotter.ax.get_xlim()[1] < min_percentage:
-                        plotter.update(xlim=(0, min_percentage))
-                        resize = True
-                if resize:
-                    grouper.resize_axes(grouper.axes)
-            if group != NOGROUP:
-                grouper.group_plots(trunc_height / height)
-            ds[group] = xr.Variable(tuple(), '',
-                                    attrs={'identifier': identifier})
-            ax0 = ax0 or grouper.axes[0]
-            x += w
-
-            arr_names.extend(
-                arr.psy.arr_name for arr in grouper.plotter_arrays)
-            groupers.append(grouper)
-        if psyplot.with_gui:
-            from psyplot_gui.main import mainwindow
-            mainwindow.plugins[gui_plugin].add_tree(groupers)
-    # invert the vertical axis
-    ax0.invert_yaxis()
-
-    sp = psy.gcp(True)(arr_name=arr_names)
-    sp[0].psy.update(
-        ylabel='%(name)s', ytickprops={'left': True, 'labelleft': True},
-        draw=False)
-    for ax, p in sp.axes.items():
-        ax_bbox = ax.get_position()
-        d = {}
-        if ax_bbox.x0 != x0:
-            d['left'] = ':'
-        if ax_bbox.x1 != x1:
-            d['right'] = ':'
-        p.update(axislinestyle=d, draw=False)
-    psy.scp(sp.main)
-    psy.scp(sp)
-    return sp, groupers
+                new[name] = np.full(nsamples, np.nan)
+        new[dim] = np.asarray(df.index.values)
+
+        # update the statistics in the attributes
+        names = [name for name, values in new.items()
+                 if name != dim and values.dtype.kind in 'biuf']
+        stats = {}
+        if names:
+            new_stats = block_statistics(
+                np.column_stack([new[name] for name in names]), new[dim],
+                names)
+            for name, row in new_stats.iterrows():
+                attrs = base.variables[name].attrs
+                if 'max' not in attrs:
+                    continue
+                d = stats[name] = {}
+                d['max'] = np.fmax(attrs['max'], row['max'])
+                d['min'] = np.fmin(attrs['min'], row['min'])
+                # variables that are missing in `df` are NaN, so we weight the
+                # means by the number of valid samples
+                count = attrs.get('count', start)
+                d['count'] = count + row['count']
+                d['mean'] = np.nansum([attrs['mean'] * count,
+                                       row['mean'] * row['count']]) / (
+                    d['count'] or np.nan)
+                d['occurences'] = attrs['occurences'] + row['occurences']
+                d['first_occurence'] = attrs['first_occurence'] if \
+                    attrs['occurences'] else row['first_occurence']
+                d['last_occurence'] = row['last_occurence'] if \
+                    row['occurences'] else attrs['last_occurence']
+        self._extend_dataset(new)
+        for name, d in stats.items():
+            base.variables[name].attrs.update(d)
+        for grouper in self.groupers:
+            for plotter in grouper.plotters:
+                self._update_arrays(plotter, stats)
+            grouper.extend_plots(start)
+        # extend the vertical axis
+        plotter = self.groupers[0].plotters[0]
+        ylim = sorted(plotter.ax.get_ylim())
+        index = np.asarray(new[dim], dtype=float)
+        if index.min() < ylim[0] or index.max() > ylim[1]:
+            plotter.update(force=['ylim'], draw=False)
+        return start + nsamples
+
+
+def _plot_list(plotter):
+    """Get the value of the `plot` formatoption for each array of `plotter`
+    """
+    v = plotter['plot']
+    if v is None or isinstance(v, six.string_types):
+        return [v] * len(plotter.data)
+    return list(v)
+
+
+def _array_list(arrays):
+    """Create a :class:`psyplot.data.ArrayList` of arrays with unique names
+
+    In contrast to the constructor of :class:`psyplot.data.ArrayList`, the
+    names of the arrays are not checked for duplicates (which takes quadratic
+    time)"""
+    ret = ArrayList()
+    list.extend(ret, arrays)
+    return ret
+
+
+def _share_grouper(plotters):
+    """Share the `grouper` of the first visible plotter with the visible rest
+
+    In contrast to :meth:`psyplot.plotter.Plotter.share` and
+    :meth:`psyplot.plotter.Plotter.unshare`, this only changes the sharing
+    connections and does not update the plots (psyplot updates the master
+    once for every released plotter). The bar of the group is drawn
+    afterwards by :meth:`StratGroup.group_plots`
+
+    Parameters
+    ----------
+    plotters: list of psyplot.plotter.Plotter
+        The plotters of one subgroup"""
+    for plotter in plotters:
+        fmto = plotter.grouper
+        master = plotter._shared.pop('grouper', None)
+        if master is not None:
+            master.shared.discard(fmto)
+    visible = [plotter for plotter in plotters if plotter.ax.get_visible()]
+    if not visible:
+        return
+    master = visible[0].grouper
+    for plotter in visible[1:]:
+        fmto = plotter.grouper
+        # remove the bar of a previous master
+        fmto.remove()
+        plotter._shared['grouper'] = master
+        master.shared.add(fmto)
+
+
+def _set_value(plotter, key, value):
+    """Set the value of a formatoption without updating the plot"""
+    value = getattr(plotter, key).validate(value)
+    with plotter.no_validation:
+        plotter[key] = value
 
 
 class StratGroup(object):
@@ -330,8 +1960,37 @@ class StratGroup(object):
 
     _plotter_arrays = None
 
+    #: dict. The position of each variable in the :attr:`plotter_arrays` (see
+    #: :meth:`_locate`). It is rebuilt after :meth:`_invalidate`
+    _index = None
+
     grouper_height = None
 
+    #: The plotter class that is used for the variables
+    plotter_cls = StratPlotter
+
+    #: True if this class can postpone the plots of hidden variables (see
+    #: :attr:`lazy`)
+    supports_lazy = True
+
+    #: list of str. The names of the variables of this group that have not
+    #: yet been plotted (see the `hidden` parameter of :func:`stratplot`).
+    #: Their plots are created when they are shown via :meth:`show_array`
+    lazy = []
+
+    #: The formatoptions for the plots of the :attr:`lazy` variables
+    lazy_fmt = None
+
+    #: The order of the plotted and the :attr:`lazy` variables
+    _order = []
+
+    #: The number of open :meth:`transaction` contexts
+    _transactions = 0
+
+    #: True if the plots have to be updated when the :meth:`transaction` is
+    #: left
+    _modified = False
+
     #: The default formatoptions for the plots
     default_fmt = {
         'ytickprops': {'left': False, 'labelleft': False},
@@ -343,11 +2002,13 @@ class StratGroup(object):
     @property
     def plotter_arrays(self):
         """The data objects that contain the plotters"""
-        return self._plotter_arrays or ArrayList([ref() for ref in self._refs])
+        return self._plotter_arrays or _array_list(
+            [ref() for ref in self._refs])
 
     @plotter_arrays.setter
     def plotter_arrays(self, value):
         self._plotter_arrays = value
+        self._invalidate()
 
     @property
     def arrays(self):
@@ -355,6 +2016,18 @@ class StratGroup(object):
         variable"""
         return self.plotter_arrays
 
+    @property
+    def variables(self):
+        """The names of all variables of this group, including the
+        :attr:`lazy` ones"""
+        names = [arr.name for arr in self.arrays]
+        if not self.lazy:
+            return names
+        current = set(names).union(self.lazy)
+        ret = [name for name in self._order if name in current]
+        ordered = set(ret)
+        return ret + [name for name in names if name not in ordered]
+
     @property
     def all_arrays(self):
         """All variables of this group in the dataset"""
@@ -364,6 +2037,17 @@ class StratGroup(object):
         return [ds.psy[arr] for arr, v in ds.variables.items()
                 if v.attrs.get('group') == group]
 
+    @property
+    def variable_arrays(self):
+        """The arrays of the :attr:`variables` of this group, including the
+        :attr:`lazy` ones that do not yet have a plot"""
+        if not self.lazy:
+            return list(self.arrays)
+        arrays = {arr.name: arr for arr in self.arrays}
+        ds = self.plotter_arrays[0].psy.base
+        return [arrays[name] if name in arrays else ds[name]
+                for name in self.variables]
+
     @property
     def plotters(self):
         """The plotters of the :attr:`arrays`"""
@@ -439,20 +2123,117 @@ class StratGroup(object):
                 with fmto.plotter.no_validation:
                     fmto.plotter['grouper'] = (height, '%(group)s')
 
-    @property
-    def figure(self):
-        """The figure that contains the plots"""
-        return self.axes[0].figure
+    @property
+    def figure(self):
+        """The figure that contains the plots"""
+        return self.axes[0].figure
+
+    def is_visible(self, arr):
+        """Check if the given `arr` is shown"""
+        plotter = arr.psy.plotter
+        return plotter is not None and plotter.ax.get_visible()
+
+    def _invalidate(self):
+        """Reset the index of :meth:`_locate`
+
+        This method has to be called whenever the :attr:`plotter_arrays` or
+        the variables in them are added, removed or reordered"""
+        self._index = None
+
+    def _build_index(self):
+        """Map the variable names to their position in the
+        :attr:`plotter_arrays`"""
+        index = {}
+        for j, arr in enumerate(self.plotter_arrays):
+            if isinstance(arr, InteractiveList):
+                for i, sub in enumerate(arr):
+                    index.setdefault(str(sub.name), (j, i))
+            else:
+                index.setdefault(str(arr.name), (j, None))
+        self._index = index
+        return index
+
+    def _locate(self, name):
+        """Get the data object that contains the variable `name`
+
+        Parameters
+        ----------
+        name: str
+            The variable name
+
+        Returns
+        -------
+        psyplot.data.InteractiveBase
+            The item of the :attr:`plotter_arrays` that contains `name`, or
+            None if `name` is not plotted by this group
+        int
+            The position of `name` in the item, if it is a
+            :class:`psyplot.data.InteractiveList`, otherwise None"""
+        index = self._index
+        if index is None:
+            index = self._build_index()
+        try:
+            j, i = index[str(name)]
+        except KeyError:
+            return None, None
+        if self._plotter_arrays is not None:
+            return self._plotter_arrays[j], i
+        return self._refs[j](), i
+
+    @staticmethod
+    def group_variables(ds, variables):
+        """Group the variables by their subgroup
+
+        Parameters
+        ----------
+        ds: xarray.Dataset
+            The dataset
+        variables: list
+            The variables in `ds`
+
+        Returns
+        -------
+        psyplot.utils.DefaultOrderedDict
+            A mapping from subgroup to the variables in this subgroup"""
+        grouped = DefaultOrderedDict(list)
+        for name in variables:
+            grouped[ds[name].attrs.get('group', 'group')].append(name)
+        return grouped
 
-    def is_visible(self, arr):
-        """Check if the given `arr` is shown"""
-        return arr.psy.plotter.ax.get_visible()
+    @classmethod
+    @docstrings.get_sectionsf('StratGroup.axes_weights',
+                              sections=['Parameters', 'Returns'])
+    def axes_weights(cls, ds, variables, fmt=None, min_xlim=None):
+        """
+        Compute the relative widths of the axes for a new group
+
+        This method computes the widths of the axes that are created by
+        :meth:`from_dataset` without creating any plot
+
+        Parameters
+        ----------
+        ds: xarray.Dataset
+            The dataset
+        variables: list
+            The variables that shall be plot in the given `ds`
+        fmt: dict
+            The formatoptions for the plots
+        min_xlim: float
+            The minimal upper x-limit of the plots (only used for groups
+            whose widths depend on the x-limits)
+
+        Returns
+        -------
+        np.ndarray
+            The relative width of each axes in the order they are created by
+            :meth:`from_dataset`"""
+        return np.ones(len(variables))
 
     @classmethod
     @docstrings.get_sectionsf('StratGroup.from_dataset',
                               sections=['Parameters', 'Returns'])
     def from_dataset(cls, fig, bbox, ds, variables, fmt=None, project=None,
-                     ax0=None, use_bars=False, group=None):
+                     ax0=None, use_bars=False, group=None, positions=None):
         """
         Create :class:`StratGroup` while creating a stratigraphic plot
 
@@ -476,24 +2257,24 @@ class StratGroup(object):
             The first subplot to share the y-axis with
         use_bars: bool
             Whether to use a bar plot or a line/area plot
+        positions: np.ndarray
+            The ``x0, y0, width, height`` bounds of the axes (see
+            :func:`layout_axes`). If None, they are computed from the
+            :meth:`axes_weights`
 
         Returns
         -------
         StratGroup
             The newly created instance with the arrays
         """
-        if ax0 is None:
-            ax0 = fig.add_axes(bbox.from_bounds(*bbox.bounds), label='ax0')
-            axes = [ax0] + [fig.add_axes(bbox.from_bounds(*bbox.bounds),
-                                         sharey=ax0, label='ax%i' % i)
-                            for i in range(1, len(variables))]
-        else:
-            axes = [fig.add_axes(bbox.from_bounds(*bbox.bounds),
-                                 sharey=ax0, label='ax%i' % i)
-                    for i in range(len(variables))]
-        grouped = DefaultOrderedDict(list)
-        for name in variables:
-            grouped[ds[name].attrs.get('group', 'group')].append(name)
+        if positions is None:
+            positions = layout_axes(
+                bbox, cls.axes_weights(ds, variables, fmt))
+        axes = []
+        for i, bounds in enumerate(positions):
+            axes.append(fig.add_axes(bounds, sharey=ax0, label='ax%i' % i))
+            ax0 = ax0 or axes[0]
+        grouped = cls.group_variables(ds, variables)
         # Use group specific bars
         if use_bars:
             try:
@@ -504,16 +2285,22 @@ class StratGroup(object):
             use_bars = []
         sp = None
         axes_it = iter(axes)
+        # the formatoptions are validated only once for all plotters
+        validated = {}
         for subgroup, names in grouped.items():
-            formatoptions = dict(fmt or {})
             if subgroup in use_bars or group in use_bars:
                 plotter_cls = BarStratPlotter
                 defaults = cls.bar_default_fmt
             else:
-                plotter_cls = StratPlotter
+                plotter_cls = cls.plotter_cls
                 defaults = cls.default_fmt
-            for key, val in six.iteritems(defaults):
-                formatoptions.setdefault(key, val)
+            formatoptions = validated.get(plotter_cls)
+            if formatoptions is None:
+                formatoptions = dict(fmt or {})
+                for key, val in six.iteritems(defaults):
+                    formatoptions.setdefault(key, val)
+                formatoptions = validated[plotter_cls] = \
+                    _validate_formatoptions(plotter_cls, formatoptions, True)
             sp2 = psy.Project()._add_data(
                 plotter_cls, ds, name=names, draw=False, fmt=formatoptions,
                 prefer_list=False, ax=islice(axes_it, len(names)),
@@ -521,10 +2308,61 @@ class StratGroup(object):
             if project is not None:
                 project.extend(sp2, new_name=True)
             sp = sp2 if sp is None else sp + sp2
-        ret = cls(list(sp), bbox, use_weakref=project is not None,
-                  group=group)
-        ret.resize_axes(axes)
-        return ret
+        return cls(list(sp), bbox, use_weakref=project is not None,
+                   group=group)
+
+    @contextmanager
+    def transaction(self):
+        """Apply several visibility and order changes at once
+
+        Inside this context, :meth:`hide_array`, :meth:`show_array`,
+        :meth:`reorder` (and their bulk versions) only change the state of
+        the plots. The plots are updated, the axes are resized and the
+        variables are grouped only once when the outermost context is left,
+        e.g.::
+
+            >>> with grouper.transaction():
+            ...     grouper.hide_arrays(rare_taxa)
+            ...     grouper.reorder(names)"""
+        if not self._transactions:
+            self._changed = OrderedDict()
+            self._modified = False
+        self._transactions += 1
+        try:
+            yield self
+        finally:
+            self._transactions -= 1
+            if not self._transactions and self._modified:
+                self._modified = False
+                changed = list(self._changed.values())
+                self._changed.clear()
+                self._commit(changed)
+
+    def _mark_changed(self, plotter, replot=False):
+        """Register a `plotter` whose plot changed during the transaction"""
+        replot = replot or self._changed.get(id(plotter), (None, False))[1]
+        self._changed[id(plotter)] = (plotter, replot)
+        self._modified = True
+
+    def _relayout(self):
+        """Resize the axes and group the plots at the end of the transaction
+        """
+        if self._transactions:
+            self._modified = True
+        else:
+            self._commit([])
+
+    def _commit(self, changed):
+        """Apply the changes of a :meth:`transaction`
+
+        Parameters
+        ----------
+        changed: list of tuple (psyplot.plotter.Plotter, bool)
+            The plotters whose visibility changed and whether they have to
+            be replotted"""
+        self._share_groupers([plotter for plotter, replot in changed])
+        self.resize_axes([ax for ax in self.axes if ax.get_visible()])
+        self.group_plots()
 
     def hide_array(self, name):
         """Hide the variable of the given `name`
@@ -533,54 +2371,79 @@ class StratGroup(object):
         ----------
         name: str
             The variable name"""
-        arr = next(iter(self.plotter_arrays(name=name)), None)
-        if arr is None:
-            return
-        group = arr.group
-        i, first_visible = next(filter(
-            lambda t: t[1].psy.ax.get_visible() and t[1].group == group,
-            enumerate(self.plotter_arrays)))
-        if arr is None or not arr.psy.ax.get_visible():  # array isn't plotted
-            return
-        elif arr is first_visible:
-            p = psy.Project(self.plotter_arrays)(group=group)
-            p.unshare(keys='grouper', draw=False)
-            p(name=set(p.names) - {name}).share(keys='grouper', draw=False)
-        arr.psy.ax.set_visible(False)
-        if arr is self.arrays[0]:
-            pass
-        self.resize_axes([ax for ax in self.axes if ax.get_visible()])
-        self.group_plots()
+        with self.transaction():
+            arr = self._locate(name)[0]
+            if arr is None or not arr.psy.ax.get_visible():
+                return
+            arr.psy.ax.set_visible(False)
+            self._mark_changed(arr.psy.plotter)
 
     def show_array(self, name):
         """Show the variable of the given `name`
 
+        The plot of a :attr:`lazy` variable is created here
+
         Parameters
         ----------
         name: str
             The variable name"""
-        arrays = self.plotter_arrays
-        arr = next(iter(arrays(name=name)), None)
-        if arr is None:
+        if name in self.lazy:
+            self._plot_lazy([name])
             return
-        group = arr.group
-        key, first_invisibles = next(
-            groupby(filter(lambda a: a.group == group, arrays),
-                    lambda arr: arr.psy.ax.get_visible()))
-        if key:  # first plot is visible
-            first_invisibles = []
+        with self.transaction():
+            arr = self._locate(name)[0]
+            if arr is None or arr.psy.ax.get_visible():
+                return
+            arr.psy.ax.set_visible(True)
+            self._mark_changed(arr.psy.plotter)
 
-        if arr.psy.ax.get_visible():  # array isn't plotted
-            return
-        elif any(arr is invisible_arr for invisible_arr in first_invisibles):
-            p = psy.Project(arrays)(group=group)
-            p.unshare(keys='grouper', draw=False)
-#            i = next(i for i, a in enumerate(p) if a.name == name)
-            p(name=set(p.names) - {name}).share(arr, keys='grouper',
-                                                draw=False)
-        arr.psy.ax.set_visible(True)
-        self.resize_axes([ax for ax in self.axes if ax.get_visible()])
-        self.group_plots()
+    def hide_arrays(self, names):
+        """Hide multiple variables at once
+
+        Parameters
+        ----------
+        names: list of str
+            The variable names"""
+        with self.transaction():
+            for name in names:
+                self.hide_array(name)
+
+    def show_arrays(self, names):
+        """Show multiple variables at once
+
+        Parameters
+        ----------
+        names: list of str
+            The variable names"""
+        lazy = [name for name in names if name in self.lazy]
+        with self.transaction():
+            if lazy:
+                self._plot_lazy(lazy)
+            for name in names:
+                if name not in lazy:
+                    self.show_array(name)
+
+    def _plot_lazy(self, names):
+        """Create the plots of the :attr:`lazy` variables `names`"""
+        order = self.variables
+        self.lazy = [name for name in self.lazy if name not in names]
+        plotters = self.plotters
+        right = plotters[-1]['axislinestyle'].get('right')
+        with self.transaction():
+            self.add_variables(plotters[0].data.psy.base, names,
+                               self.lazy_fmt)
+            # move the new plots to the position of their variable
+            self.reorder(order)
+            plotters = self.plotters
+            for i, plotter in enumerate(plotters):
+                style = plotter['axislinestyle']
+                new = dict(style, right=':')
+                if i:
+                    new['left'] = ':'
+                if i == len(plotters) - 1:
+                    new['right'] = right
+                if new != style:
+                    plotter.update(axislinestyle=new, draw=False)
 
     def reorder(self, names):
         """Reorder the plot objects
@@ -589,31 +2452,184 @@ class StratGroup(object):
         ----------
         names: list of str
             The variable names that should be the first"""
+        if self.lazy:
+            self._order = list(names) + [
+                name for name in self.variables if name not in names]
         arrays = self._plotter_arrays or self._refs
         old = list(arrays)
-        old_da = list(self.plotter_arrays)
         project = self.plotters[0].project
         if project is not None:
             project = project.main
-            i = project.arr_names.index(old_da[0].psy.arr_name)
+            i = project.arr_names.index(self.plotter_arrays[0].psy.arr_name)
             arr_names = project.arr_names[i:i+len(arrays)]
             reorder_project = arr_names == self.arr_names
-        arrays.clear()
-        for name in names:
-            arr = next((old[i] for i, arr in enumerate(old_da)
-                        if str(arr.name) == name), None)
-            if arr is not None:
-                arrays.append(arr)
+        index = self._index or self._build_index()
+        order = list(unique_everseen(
+            index[name][0] for name in names if name in index))
         # now add the ones that are not mentioned in `names`
-        for i, arr in enumerate(old_da):
-            if str(arr.name) not in names:
-                arrays.append(old[i])
+        mentioned = set(order)
+        order.extend(j for j in range(len(old)) if j not in mentioned)
+        arrays.clear()
+        # the names have already been checked, so we bypass the (quadratic)
+        # check of the ArrayList
+        list.extend(arrays, [old[j] for j in order])
+        self._invalidate()
         if project is not None and reorder_project:
             project[i:i+len(arrays)] = self.plotter_arrays
             if project.is_csp or project.is_cmp:
                 project.oncpchange.emit(project)
-        self.resize_axes([ax for ax in self.axes if ax.get_visible()])
-        self.plotter_arrays.update(force=['grouper'], draw=False)
+        self._relayout()
+
+    def update_data(self, data):
+        """Update the data of the visualized variables
+
+        The new values are pushed into the existing plotters. The axes are
+        only resized if their x-limits changed.
+
+        Parameters
+        ----------
+        data: pandas.DataFrame, xarray.Dataset or dict
+            The new data. Variables of this group that are not in `data` are
+            left unchanged. The number of samples must not change.
+
+        Returns
+        -------
+        bool
+            True, if the x-limits (and therefore the layout of this group)
+            changed"""
+        arrays = [arr for arr in self.arrays if arr.name in data]
+        if not arrays:
+            return False
+        base = arrays[0].psy.base
+        names = [arr.name for arr in arrays]
+        _set_variables(base, names, np.column_stack(
+            [np.asarray(data[name]) for name in names]), arrays)
+        names = set(names)
+        plotters = [plotter for plotter in self.plotters
+                    if names.intersection(_plotter_names(plotter))]
+        axes = self.axes
+        old = [ax.get_xlim() for ax in axes]
+        self._replot(plotters)
+        if old == [ax.get_xlim() for ax in axes]:
+            return False
+        self.resize_axes([ax for ax in axes if ax.get_visible()])
+        self.group_plots()
+        return True
+
+    def _replot(self, plotters):
+        """Replot the given `plotters` after their data changed"""
+        for plotter in plotters:
+            plotter.update(replot=True, draw=False)
+
+    def _update_xlims(self, plotters):
+        """Update the x-limits of `plotters` after their data changed"""
+        for plotter in plotters:
+            plotter.update(force=['xlim'], draw=False)
+
+    def extend_plots(self, start):
+        """Extend the plots after new samples have been appended
+
+        The artists are extended in place where possible (see
+        :class:`StratStream`), all other plots are replotted. The axes are
+        only resized if their x-limits changed.
+
+        Parameters
+        ----------
+        start: int
+            The number of samples before the new ones have been appended
+
+        Returns
+        -------
+        bool
+            True, if the x-limits (and therefore the layout of this group)
+            changed"""
+        axes = self.axes
+        old = [ax.get_xlim() for ax in axes]
+        replot = []
+        exceeded = []
+        for plotter in self.plotters:
+            limits = _extend_plot(plotter, start)
+            if limits is None:
+                replot.append(plotter)
+                continue
+            xmin, xmax = sorted(plotter.ax.get_xlim())
+            if limits[0] < xmin or limits[1] > xmax:
+                exceeded.append(plotter)
+        if replot:
+            self._replot(replot)
+        if exceeded:
+            self._update_xlims(exceeded)
+        if old == [ax.get_xlim() for ax in axes]:
+            return False
+        self.resize_axes([ax for ax in axes if ax.get_visible()])
+        self.group_plots()
+        return True
+
+    def add_variables(self, ds, names, fmt=None):
+        """Add new variables to this group
+
+        The new variables are plotted into new axes at the right side of this
+        group, the existing plots are not recreated.
+
+        Parameters
+        ----------
+        ds: xarray.Dataset
+            The base dataset of the existing arrays that contains the new
+            variables
+        names: list of str
+            The names of the new variables in `ds`
+        fmt: dict
+            The formatoptions for the new plots"""
+        plotters = self.plotters
+        project = plotters[0].project
+        if project is not None:
+            project = project.main
+        right = plotters[-1]['axislinestyle'].get('right')
+        new = self.from_dataset(
+            self.figure, self.bbox, ds, names, fmt=fmt, project=project,
+            ax0=self.axes[0],
+            use_bars=isinstance(plotters[0], BarStratPlotter),
+            group=self.group)
+        if self._plotter_arrays is not None:
+            self._plotter_arrays.extend(new.plotter_arrays)
+        else:
+            self._refs.extend(new._refs)
+        self._invalidate()
+        self._finish_added(plotters, new.plotters, right)
+
+    def _finish_added(self, old, new, right=None):
+        """Share the groupers and resize the axes after adding variables
+
+        Parameters
+        ----------
+        old: list of psyplot.plotter.Plotter
+            The plotters of this group before the new variables were added
+        new: list of psyplot.plotter.Plotter
+            The new plotters that have been appended to this group
+        right: str
+            The style of the right axis line of the last axes in `old`"""
+        self._share_groupers(new)
+        if old:
+            style = dict(old[-1]['axislinestyle'])
+            style['right'] = ':'
+            old[-1].update(axislinestyle=style, draw=False)
+        for i, plotter in enumerate(new, 1):
+            style = {'left': ':'}
+            if i < len(new):
+                style['right'] = ':'
+            elif right:
+                style['right'] = right
+            plotter.update(axislinestyle=style, draw=False)
+        self._relayout()
+
+    def _share_groupers(self, plotters):
+        """Share the groupers of new `plotters` with the ones of their
+        subgroup"""
+        arrays = self.plotter_arrays
+        for subgroup in unique_everseen(p.data.attrs.get('group')
+                                        for p in plotters):
+            _share_grouper([arr.psy.plotter for arr in arrays
+                            if arr.attrs.get('group') == subgroup])
 
 
 class StratPercentages(StratGroup):
@@ -628,6 +2644,33 @@ class StratPercentages(StratGroup):
 
     default_fmt['plot'] = 'areax'
 
+    #: The minimal upper x-limit of the plots (see the `min_percentage`
+    #: parameter of :func:`stratplot`)
+    min_xlim = None
+
+    @classmethod
+    @docstrings.dedent
+    def axes_weights(cls, ds, variables, fmt=None, min_xlim=None):
+        """
+        Compute the relative widths of the axes for a new group
+
+        The widths are proportional to the upper x-limit of each plot
+
+        Parameters
+        ----------
+        %(StratGroup.axes_weights.parameters)s
+
+        Returns
+        -------
+        %(StratGroup.axes_weights.returns)s"""
+        names = list(chain.from_iterable(
+            cls.group_variables(ds, variables).values()))
+        xlim = _unwrap((fmt or {}).get('xlim', cls.default_fmt['xlim']))
+        upper = _predict_xlim(xlim, *_data_limits(ds, names))[1]
+        if min_xlim is not None:
+            upper = np.maximum(upper, min_xlim)
+        return upper
+
     def resize_axes(self, axes):
         """Resize the axes in this group"""
         width = self.bbox.width
@@ -639,10 +2682,49 @@ class StratPercentages(StratGroup):
             ax.set_position([x0, ax_bbox.y0, w, ax_bbox.height])
             x0 += w
 
+    def _xlims(self, plotters):
+        """Get the x-limits for the `plotters` with respect to the
+        :attr:`min_xlim`"""
+        default = tuple(self.default_fmt['xlim'])
+        minimum = (0, self.min_xlim)
+        names = [plotter.data.name for plotter in plotters]
+        upper = _predict_xlim(default, *_data_limits(
+            plotters[0].data.psy.base, names))[1]
+        for plotter, val in zip(plotters, upper):
+            if tuple(plotter['xlim']) not in [default, minimum]:
+                yield plotter['xlim']  # set by the user
+            else:
+                yield minimum if val <= self.min_xlim else default
+
+    def _replot(self, plotters):
+        """Replot the given `plotters` after their data changed"""
+        if self.min_xlim is None or not plotters:
+            return super(StratPercentages, self)._replot(plotters)
+        for plotter, xlim in zip(plotters, list(self._xlims(plotters))):
+            plotter.update(xlim=xlim, replot=True, draw=False)
+
+    def _update_xlims(self, plotters):
+        """Update the x-limits of `plotters` with respect to the
+        :attr:`min_xlim`"""
+        if self.min_xlim is None:
+            return super(StratPercentages, self)._update_xlims(plotters)
+        for plotter, xlim in zip(plotters, list(self._xlims(plotters))):
+            plotter.update(xlim=xlim, force=['xlim'], draw=False)
+
+    def _finish_added(self, old, new, right=None):
+        if self.min_xlim is not None:
+            for plotter, xlim in zip(new, list(self._xlims(new))):
+                if tuple(xlim) != tuple(plotter['xlim']):
+                    plotter.update(xlim=xlim, draw=False)
+        super(StratPercentages, self)._finish_added(old, new, right)
+
 
 class StratAllInOne(StratGroup):
     """A :class:`StratGroup` for single plots"""
 
+    # hidden variables are part of the one plot of this group
+    supports_lazy = False
+
     default_fmt = StratGroup.default_fmt.copy()
     default_fmt['title'] = '%(group)s'
     default_fmt['titleprops'] = {}
@@ -655,19 +2737,53 @@ class StratAllInOne(StratGroup):
     def arrays(self):
         return self.plotter_arrays[0]
 
-    def group_plots(self, height):
+    def group_plots(self, height=None):
         """Reimplemented to do nothing because all variables are in one axes
         """
         pass
 
+    def add_variables(self, ds, names, fmt=None):
+        """Add new variables to this group
+
+        The new variables are appended to the existing plot
+
+        Parameters
+        ----------
+        ds: xarray.Dataset
+            The base dataset of the existing arrays that contains the new
+            variables
+        names: list of str
+            The names of the new variables in `ds`
+        fmt: dict
+            Not used because the variables are added to an existing plot"""
+        _append_to_plotter(self.plotters[0], ds, names,
+                           self.default_fmt.get('plot', '-'))
+        self._invalidate()
+
     def is_visible(self, arr):
         """Check if the given `arr` is shown"""
-        return arr.name in self.plotter_arrays[0].names
+        data, i = self._locate(arr.name)
+        return i is not None and _plot_list(data.psy.plotter)[i] is not None
+
+    @classmethod
+    @docstrings.dedent
+    def axes_weights(cls, ds, variables, fmt=None, min_xlim=None):
+        """
+        Compute the relative widths of the axes for a new group
+
+        Parameters
+        ----------
+        %(StratGroup.axes_weights.parameters)s
+
+        Returns
+        -------
+        %(StratGroup.axes_weights.returns)s"""
+        return np.ones(1)
 
     @classmethod
     @docstrings.dedent
     def from_dataset(cls, fig, bbox, ds, variables, fmt=None, project=None,
-                     ax0=None, use_bars=False, group=None):
+                     ax0=None, use_bars=False, group=None, positions=None):
         """
         Create :class:`StratGroup` while creating a stratigraphic plot
 
@@ -681,7 +2797,7 @@ class StratAllInOne(StratGroup):
         -------
         %(StratGroup.from_dataset.returns)s
         """
-        fmt = fmt or {}
+        fmt = dict(fmt or {})
         if use_bars:
             try:
                 use_bars = list(iter(use_bars))
@@ -692,12 +2808,9 @@ class StratAllInOne(StratGroup):
         defaults = cls.bar_default_fmt if use_bars else cls.default_fmt
         for key, val in six.iteritems(defaults):
             fmt.setdefault(key, val)
-        if ax0 is None:
-            ax = fig.add_axes(bbox.from_bounds(*bbox.bounds), label='ax0')
-        else:
-            ax = fig.add_axes(bbox.from_bounds(*bbox.bounds),
-                              sharey=ax0, label='ax0')
-        plotter_cls = BarStratPlotter if use_bars else StratPlotter
+        bounds = bbox.bounds if positions is None else positions[0]
+        ax = fig.add_axes(bounds, sharey=ax0, label='ax0')
+        plotter_cls = BarStratPlotter if use_bars else cls.plotter_cls
         sp = psy.Project()._add_data(
             plotter_cls, ds, name=variables, draw=False, fmt=fmt,
             prefer_list=True, ax=ax, share='grouper',
@@ -707,6 +2820,31 @@ class StratAllInOne(StratGroup):
         return cls(list(sp), bbox, use_weakref=project is not None,
                    group=group)
 
+    def _commit(self, changed):
+        """Apply the changes of a :meth:`transaction`
+
+        Parameters
+        ----------
+        changed: list of tuple (psyplot.plotter.Plotter, bool)
+            The plotters whose `plot` formatoption changed and whether they
+            have to be replotted"""
+        for plotter, replot in changed:
+            plotter.update(replot=replot, force=['plot'], draw=False)
+
+    def _set_plot(self, name, visible):
+        """Show or hide the variable `name` in the plot"""
+        with self.transaction():
+            data, i = self._locate(name)
+            if i is None:
+                return
+            plotter = data.psy.plotter
+            v = _plot_list(plotter)
+            if (v[i] is not None) == visible:
+                return
+            v[i] = self.default_fmt.get('plot', '-') if visible else None
+            _set_value(plotter, 'plot', v)
+            self._mark_changed(plotter)
+
     def hide_array(self, name):
         """Hide the variable of the given `name`
 
@@ -714,16 +2852,7 @@ class StratAllInOne(StratGroup):
         ----------
         name: str
             The variable name"""
-        i, arr = next(((i, arr) for i, arr in enumerate(self.arrays)
-                       if arr.name == name), (None, None))
-        plotter = self.plotters[0]
-        v = plotter['plot']
-        if v is None or isinstance(v, six.string_types):
-            v = [v] * len(self.arrays)
-        if arr is None or v[i] is None:  # array isn't plotted
-            return
-        v[i] = None
-        plotter.update(plot=v, force=True)
+        self._set_plot(name, False)
 
     def show_array(self, name):
         """Show the variable of the given `name`
@@ -732,37 +2861,29 @@ class StratAllInOne(StratGroup):
         ----------
         name: str
             The variable name"""
-        i, arr = next(((i, arr) for i, arr in enumerate(self.arrays)
-                       if arr.name == name), (None, None))
-        plotter = self.plotters[0]
-        v = plotter['plot']
-        if v is None or isinstance(v, six.string_types):
-            v = [v] * len(self.arrays)
-        if arr is None or v[i] is not None:  # array is plotted
-            return
-        v[i] = self.default_fmt.get('plot', '-')
-        plotter.update(plot=v, force=True)
+        self._set_plot(name, True)
 
     def reorder(self, names):
         """Reorder the plot objects
 
         Parameters
         ----------
-        mapping: dict
-            A mapping from the new index to the old one"""
-        plotter = self.plotters[0]
-        data = plotter.data
-        current = list(data)
-        visibilities = list(map(self.is_visible, data))
-        plot = []
-        data.clear()
-        ls = self.default_fmt.get('plot', '-')
-        for name in names:
-            i = next(i for i, arr in enumerate(current)
-                     if str(arr.name) == name)
-            data.append(current[i])
-            plot.append((visibilities[i] and ls) or None)
-        plotter.update(plot=plot, replot=True, draw=False)
+        names: list of str
+            The variable names in the new order"""
+        with self.transaction():
+            plotter = self.plotters[0]
+            data = plotter.data
+            current = list(data)
+            visible = [v is not None for v in _plot_list(plotter)]
+            order = [i for i in map(lambda name: self._locate(name)[1], names)
+                     if i is not None]
+            ls = self.default_fmt.get('plot', '-')
+            data.clear()
+            data.extend([current[i] for i in order])
+            _set_value(plotter, 'plot',
+                       [(visible[i] and ls) or None for i in order])
+            self._invalidate()
+            self._mark_changed(plotter, replot=True)
 
 
 class StackedGroup(StratAllInOne):
@@ -775,8 +2896,274 @@ class StackedGroup(StratAllInOne):
     bar_default_fmt['plot'] = 'stacked'
 
 
+class StratCompact(StratGroup):
+    """A :class:`StratGroup` that draws all variables into one axes
+
+    Each variable is drawn into its own slot of the axes using the
+    :class:`psy_strat.plotters.CompactStratPlotter`. There is one axes (and
+    one plotter) for each subgroup"""
+
+    #: The plotter class that is used for each subgroup
+    plotter_cls = CompactStratPlotter
+
+    # hidden variables are part of the plot of their subgroup
+    supports_lazy = False
+
+    default_fmt = StratGroup.default_fmt.copy()
+
+    @property
+    def arrays(self):
+        return [arr for arrays in self.plotter_arrays for arr in arrays]
+
+    def is_visible(self, arr):
+        """Check if the given `arr` is shown"""
+        data, i = self._locate(arr.name)
+        return _plot_list(data.psy.plotter)[i] is not None
+
+    # the width of each axes is proportional to the width of its slots
+    resize_axes = StratPercentages.resize_axes
+
+    @classmethod
+    def _get_fmt(cls, fmt, key):
+        """Get the value of the formatoption `key` for a new plotter"""
+        if fmt and key in fmt:
+            return _unwrap(fmt[key])
+        elif key in cls.default_fmt:
+            return cls.default_fmt[key]
+        return psyplot.rcParams.find_and_replace(
+            base_str=cls.plotter_cls._get_rc_strings())[key]
+
+    @classmethod
+    @docstrings.dedent
+    def axes_weights(cls, ds, variables, fmt=None, min_xlim=None):
+        """
+        Compute the relative widths of the axes for a new group
+
+        The widths are proportional to the total width of the slots in each
+        axes
+
+        Parameters
+        ----------
+        %(StratGroup.axes_weights.parameters)s
+
+        Returns
+        -------
+        %(StratGroup.axes_weights.returns)s"""
+        grouped = cls.group_variables(ds, variables)
+        if cls._get_fmt(fmt, 'slot_scale') == 'equal':
+            return np.array([len(names) for names in grouped.values()],
+                            dtype=float)
+        xlim = cls._get_fmt(fmt, 'xlim')
+        slot_min = cls._get_fmt(fmt, 'slot_min')
+        ret = np.empty(len(grouped))
+        for i, names in enumerate(grouped.values()):
+            lower, upper = _predict_xlim(xlim, *_data_limits(ds, names))
+            if slot_min is not None:
+                upper = np.maximum(upper, slot_min)
+            ret[i] = (upper - lower).sum()
+        return ret
+
+    @classmethod
+    @docstrings.dedent
+    def from_dataset(cls, fig, bbox, ds, variables, fmt=None, project=None,
+                     ax0=None, use_bars=False, group=None, positions=None):
+        """
+        Create :class:`StratGroup` while creating a stratigraphic plot
+
+        Create a stratigraphic plot within the given `bbox` of `fig`.
+
+        Parameters
+        ----------
+        %(StratGroup.from_dataset.parameters)s
+
+        Returns
+        -------
+        %(StratGroup.from_dataset.returns)s
+        """
+        if positions is None:
+            positions = layout_axes(
+                bbox, cls.axes_weights(ds, variables, fmt))
+        grouped = cls.group_variables(ds, variables)
+        formatoptions = dict(fmt or {})
+        for key, val in six.iteritems(cls.default_fmt):
+            formatoptions.setdefault(key, val)
+        # the formatoptions are validated only once for all subgroups
+        formatoptions = _validate_formatoptions(
+            cls.plotter_cls, formatoptions, True)
+        sp = None
+        for i, (names, bounds) in enumerate(zip(grouped.values(),
+                                                positions)):
+            ax = fig.add_axes(bounds, sharey=ax0, label='ax%i' % i)
+            ax0 = ax0 or ax
+            sp2 = psy.Project()._add_data(
+                cls.plotter_cls, ds, name=names, draw=False,
+                fmt=formatoptions, prefer_list=True, ax=ax,
+                attrs=dict(maingroup=group))
+            if project is not None:
+                project.extend(sp2, new_name=True)
+            sp = sp2 if sp is None else sp + sp2
+        return cls(list(sp), bbox, use_weakref=project is not None,
+                   group=group)
+
+    def _share_groupers(self, plotters):
+        """Reimplemented to do nothing because each subgroup has its own
+        grouper"""
+        pass
+
+    def _replot(self, plotters):
+        """Replot the given `plotters` after their data changed"""
+        for plotter in plotters:
+            plotter.update(replot=True, draw=False)
+            # the x-limits depend on the total width of the slots
+            plotter.update(force=['xlim'], draw=False)
+
+    def add_variables(self, ds, names, fmt=None):
+        """Add new variables to this group
+
+        The new variables are appended to the plot of their subgroup. Only
+        subgroups that are not yet part of this group get a new axes.
+
+        Parameters
+        ----------
+        ds: xarray.Dataset
+            The base dataset of the existing arrays that contains the new
+            variables
+        names: list of str
+            The names of the new variables in `ds`
+        fmt: dict
+            The formatoptions for the plots of new subgroups"""
+        plotters = {plotter.data[0].attrs.get('group'): plotter
+                    for plotter in self.plotters}
+        missing = []
+        for subgroup, sub_names in self.group_variables(ds, names).items():
+            plotter = plotters.get(subgroup)
+            if plotter is None:
+                missing.extend(sub_names)
+            else:
+                _append_to_plotter(plotter, ds, sub_names,
+                                   self.default_fmt.get('plot', '-'))
+                plotter.update(force=['xlim'], draw=False)
+        self._invalidate()
+        if missing:
+            # new subgroups use the same minimum slot width
+            fmt = dict(fmt or {})
+            fmt.setdefault('slot_min', self.plotters[0]['slot_min'])
+            super(StratCompact, self).add_variables(ds, missing, fmt)
+        else:
+            self._relayout()
+
+    def _commit(self, changed):
+        """Apply the changes of a :meth:`transaction`
+
+        Parameters
+        ----------
+        changed: list of tuple (psyplot.plotter.Plotter, bool)
+            The plotters whose `plot` formatoption changed and whether they
+            have to be replotted"""
+        for plotter, replot in changed:
+            plotter.update(replot=replot, force=['plot'], draw=False)
+            # the x-limits depend on the total width of the visible slots
+            plotter.update(force=['xlim'], draw=False)
+        self.resize_axes(self.axes)
+        self.group_plots()
+
+    def _set_plot(self, name, visible):
+        """Show or hide the slot of the variable `name`"""
+        with self.transaction():
+            data, i = self._locate(name)
+            if data is None:
+                return
+            plotter = data.psy.plotter
+            v = _plot_list(plotter)
+            if (v[i] is not None) == visible:
+                return
+            v[i] = self.default_fmt.get('plot', '-') if visible else None
+            _set_value(plotter, 'plot', v)
+            self._mark_changed(plotter)
+
+    def hide_array(self, name):
+        """Hide the variable of the given `name`
+
+        Parameters
+        ----------
+        name: str
+            The variable name"""
+        self._set_plot(name, False)
+
+    def show_array(self, name):
+        """Show the variable of the given `name`
+
+        Parameters
+        ----------
+        name: str
+            The variable name"""
+        self._set_plot(name, True)
+
+    def reorder(self, names):
+        """Reorder the plot objects
+
+        Parameters
+        ----------
+        names: list of str
+            The variable names that should be the first"""
+        with self.transaction():
+            index = self._index or self._build_index()
+            ls = self.default_fmt.get('plot', '-')
+            for j, data in enumerate(self.plotter_arrays):
+                plotter = data.psy.plotter
+                current = list(data)
+                visible = [v is not None for v in _plot_list(plotter)]
+                order = list(unique_everseen(
+                    index[name][1] for name in names
+                    if index.get(name, (None, ))[0] == j))
+                mentioned = set(order)
+                order.extend(i for i in range(len(current))
+                             if i not in mentioned)
+                data.clear()
+                data.extend([current[i] for i in order])
+                _set_value(plotter, 'plot',
+                           [(visible[i] and ls) or None for i in order])
+                self._mark_changed(plotter, replot=True)
+            self._invalidate()
+
+
+class StratCompactPercentages(StratCompact):
+    """A :class:`StratCompact` for percentages plots"""
+
+    default_fmt = StratCompact.default_fmt.copy()
+    default_fmt['xlim'] = (0, 'rounded')
+    default_fmt['xticks'] = np.arange(10, 100, 20)
+    default_fmt['slot_scale'] = 'data'
+    default_fmt['plot'] = 'areax'
+
+
+class StratHeatmap(StratCompact):
+    """A :class:`StratCompact` that draws all variables as one heatmap
+
+    Each variable is drawn as one column of an image using the
+    :class:`psy_strat.plotters.HeatmapStratPlotter`. There is one axes (and
+    one plotter) for each subgroup"""
+
+    plotter_cls = HeatmapStratPlotter
+
+    default_fmt = StratCompact.default_fmt.copy()
+    default_fmt['plot'] = 'mesh'
+
+
+class StratHeatmapPercentages(StratHeatmap):
+    """A :class:`StratHeatmap` for percentages plots"""
+
+    default_fmt = StratHeatmap.default_fmt.copy()
+    default_fmt['xlim'] = (0, 'rounded')
+    default_fmt['color_scale'] = 'group'
+
+
 strat_groupers = {
     'all_in_one': StratAllInOne,
     'percentages': StratPercentages,
     'default': StratGroup,
-    'stacked': StackedGroup}
+    'stacked': StackedGroup,
+    'compact': StratCompact,
+    'compact_percentages': StratCompactPercentages,
+    'heatmap': StratHeatmap,
+    'heatmap_percentages': StratHeatmapPercentages}
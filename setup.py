@@ -59,6 +59,7 @@ setup(name='psy-strat',
       tests_require=['pytest'],
       cmdclass={'test': PyTest},
       entry_points={
+          'console_scripts': ['psy-strat=psy_strat.__main__:main'],
           'psyplot': ['plugin=psy_strat.plugin'],
           'psyplot_gui': [
               'stratplots=psy_strat.strat_widget:StratPlotsWidget'],
@@ -0,0 +1,42 @@
+"""Test module for the command line interface in :mod:`psy_strat.__main__`"""
+import os
+import shutil
+import tempfile
+import unittest
+from psy_strat.__main__ import main
+from test_stratplot import test_df
+
+
+class MainTest(unittest.TestCase):
+    """Test the ``psy-strat`` command"""
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        for name in ['site1', 'site2']:
+            test_df.to_csv(os.path.join(self.test_dir, name + '.csv'))
+        with open(os.path.join(self.test_dir, 'groups.tsv'), 'w') as f:
+            f.write('varname\tgroupname\n')
+            f.write(''.join('%s\t2\n' % col for col in 'def'))
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_main(self):
+        output = os.path.join(self.test_dir, '%(name)s.pdf')
+        ret = main([os.path.join(self.test_dir, '*.csv'),
+                    '-g', os.path.join(self.test_dir, 'groups.tsv'),
+                    '--default-group', '1', '-p', '2', '-w', '1=0.3', '2=0.7',
+                    '--summed', '2', '-o', output])
+        self.assertEqual(ret, 0)
+        for name in ['site1', 'site2']:
+            self.assertTrue(os.path.exists(output % {'name': name}),
+                            msg=name)
+
+    def test_failure(self):
+        ret = main([os.path.join(self.test_dir, 'missing.csv'), '-o',
+                    os.path.join(self.test_dir, '%(name)s.png')])
+        self.assertEqual(ret, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
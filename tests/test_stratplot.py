@@ -1,9 +1,26 @@
 """Test module for :mod:`psy_strat.stratplot`"""
 
+import os
+import shutil
+import tempfile
 import unittest
+from unittest import mock
 import numpy as np
 import pandas as pd
-from psy_strat.stratplot import stratplot
+import xarray as xr
+import matplotlib.pyplot as plt
+import matplotlib.transforms as mt
+try:
+    import dask  # noqa: F401
+except ImportError:
+    with_dask = False
+else:
+    with_dask = True
+from psy_strat.stratplot import (
+    stratplot, normalize_percentages, dataframe_to_dataset, block_statistics,
+    GroupIndex, layout_axes, update_stratplot, StratStream, stratplot_many,
+    StratTemplate)
+from psy_strat.plotters import MinMaxPyramid
 
 
 #: Test dataframe with six columns. c, d and f are percentages that sum up to
@@ -44,6 +61,318 @@ class StratGroupTest(unittest.TestCase):
 
         return sp, groupers
 
+    def test_validate_once(self):
+        """Test whether the formatoptions are validated once per group"""
+        import psyplot
+        from psy_strat.stratplot import StratGroup
+        entry = psyplot.rcParams.defaultParams['plotter.strat.title_wrap']
+        validate = entry[1]
+        calls = []
+
+        def count(value):
+            calls.append(value)
+            return validate(value)
+
+        entry[1] = count
+        try:
+            ds = dataframe_to_dataset(test_df)
+            grouper = StratGroup.from_dataset(
+                plt.figure(), mt.Bbox.from_extents(0.1, 0.1, 0.9, 0.9), ds,
+                list(test_df.columns), fmt={'title_wrap': 10})
+        finally:
+            entry[1] = validate
+        self.assertEqual(calls, [10])
+        self.assertEqual([p['title_wrap'] for p in grouper.plotters],
+                         [10] * len(test_df.columns))
+
+    def test_validated_copies(self):
+        """Test whether mutable validated values are not shared"""
+        sp, groupers = stratplot(
+            test_df, lambda g: '1',
+            formatoptions={'1': {'grouperprops': {'color': 'r'}}})
+        p1, p2 = groupers[0].plotters[:2]
+        self.assertEqual(p1['grouperprops'], {'color': 'r'})
+        self.assertEqual(p2['grouperprops'], {'color': 'r'})
+        self.assertIsNot(p1['grouperprops'], p2['grouperprops'])
+
+    def test_transaction(self):
+        """Test hiding and reordering multiple variables at once"""
+        sp, groupers = stratplot(
+            test_df, group_func=lambda g: '1' if g <= 'c' else '2',
+            widths={'1': 0.5, '2': 0.5})
+        grouper = groupers[1]
+        with mock.patch.object(grouper, 'group_plots',
+                               wraps=grouper.group_plots) as group_plots:
+            with grouper.transaction():
+                grouper.hide_arrays(['d', 'e'])
+                grouper.reorder(['f', 'e', 'd'])
+                self.assertEqual(group_plots.call_count, 0)
+            self.assertEqual(group_plots.call_count, 1)
+        self.assertEqual([arr.name for arr in grouper.arrays], list('fed'))
+        self.assertEqual([grouper.is_visible(arr) for arr in grouper.arrays],
+                         [True, False, False])
+        # the only visible axes covers the entire group
+        plotter = grouper.plotters[0]
+        self.assertEqual(plotter.ax.get_position().width,
+                         grouper.bbox.width)
+        self.assertIsNone(plotter.grouper.shared_by)
+        self.assertEqual(len(plotter.grouper.texts), 1)
+        grouper.show_arrays(['d', 'e'])
+        self.assertTrue(all(map(grouper.is_visible, grouper.arrays)))
+        self.assertEqual(
+            [p.grouper.shared_by is None for p in grouper.plotters],
+            [True, False, False])
+
+    def test_hidden(self):
+        """Test the lazy plots of hidden variables"""
+        sp, groupers = stratplot(test_df, hidden=['a', 'c', 'd'])
+        grouper = groupers[0]
+        # the first variable is always plotted
+        self.assertEqual([arr.name for arr in grouper.arrays],
+                         list('abef'))
+        self.assertEqual(grouper.lazy, ['c', 'd'])
+        self.assertEqual(grouper.variables, list(test_df.columns))
+        self.assertEqual([grouper.is_visible(arr)
+                          for arr in grouper.variable_arrays],
+                         [False, True, False, False, True, True])
+        # all_arrays still lists every variable of the group
+        self.assertEqual([arr.name for arr in grouper.all_arrays],
+                         list(test_df.columns))
+        grouper.show_array('d')
+        self.assertEqual(grouper.lazy, ['c'])
+        self.assertEqual([arr.name for arr in grouper.arrays],
+                         list('abdef'))
+        ax = grouper.arrays[2].psy.ax
+        self.assertEqual(list(ax.lines[0].get_xdata()), list(test_df['d']))
+        positions = [ax.get_position().x0 for ax in grouper.axes[1:]]
+        self.assertEqual(positions, sorted(positions))
+
+    def test_grouper_resize(self):
+        """Test whether the group title follows the resizing of the figure"""
+        sp, groupers = stratplot(
+            test_df, group_func=lambda g: '1' if g <= 'c' else '2',
+            widths={'1': 0.5, '2': 0.5})
+        fmto = groupers[0].plotters[0].grouper
+        text = fmto.texts[0]
+        annotations = fmto.annotations[:]
+        fig = text.figure
+        self.assertFalse(fig.canvas.callbacks.callbacks.get('resize_event'))
+
+        def expected():
+            w, h = fig.bbox.width, fig.bbox.height
+            dx = fmto.y * h * np.tan(fmto.angle * np.pi / 180.)
+            return [(fmto.x0 + fmto.x1) / 2. * w + dx,
+                    (fmto.top + fmto.y) * h]
+
+        pos = text.get_transform().transform(text.get_position())
+        self.assertEqual(list(np.round(pos, 6)), list(np.round(expected(), 6)))
+        fig.set_size_inches(fig.get_figwidth() * 2, fig.get_figheight())
+        pos = text.get_transform().transform(text.get_position())
+        self.assertEqual(list(np.round(pos, 6)), list(np.round(expected(), 6)))
+        # the artists are updated in place
+        groupers[0].group_plots()
+        self.assertIs(fmto.texts[0], text)
+        self.assertEqual(fmto.annotations, annotations)
+
+    def test_hlines_shared(self):
+        """Test the measurement lines that are shared by all axes"""
+        from psy_strat.plotters import SharedMeasurementLines
+        sp, groupers = stratplot(
+            test_df, group_func=lambda g: '1' if g <= 'c' else '2',
+            widths={'1': 0.5, '2': 0.5},
+            formatoptions={g: {'hlines': 'r', 'hlines_shared': True}
+                           for g in '12'})
+        fig = groupers[0].figure
+        fig.canvas.draw()
+        artists = [a for a in fig.artists
+                   if isinstance(a, SharedMeasurementLines)]
+        self.assertEqual(len(artists), 1)
+        lines = artists[0]
+        plotters = sp.plotters
+        self.assertEqual(len(lines.members), len(plotters))
+        for plotter in plotters:
+            self.assertIsNone(plotter.hlines.artists)
+            self.assertFalse(plotter.ax.patch.get_visible())
+        self.assertEqual(len(lines.get_segments()), len(test_df))
+        boxes = [ax.get_position() for ax in sp.axes]
+        self.assertAlmostEqual(lines.xbox.x0, min(bbox.x0 for bbox in boxes))
+        self.assertAlmostEqual(lines.xbox.x1, max(bbox.x1 for bbox in boxes))
+        # disable the lines
+        for plotter in plotters:
+            plotter.update(hlines=None)
+        self.assertNotIn(lines, fig.artists)
+        self.assertTrue(all(ax.patch.get_visible() for ax in sp.axes))
+
+    def test_occurences(self):
+        """Test the masking and the markers of the occurences"""
+        sp, groupers = stratplot(
+            test_df, formatoptions={'nogroup': {'occurences': 2}})
+        plotter = groupers[0].plotters[2]
+        np.testing.assert_array_equal(plotter.occurences.occurences,
+                                      [[True, True, False]])
+        # the original data is not modified
+        self.assertEqual(list(plotter.data.values), [2, 2, 3])
+        self.assertEqual(list(plotter.plot_data.values), [0, 0, 3])
+        self.assertEqual(list(plotter.ax.lines[0].get_xdata()), [0, 0, 3])
+        artists = plotter.occurence_value._artists
+        self.assertEqual(len(artists), 1)
+        x = np.mean(plotter.xlim.range)
+        self.assertEqual(artists[0].get_offsets().tolist(), [[x, 0], [x, 1]])
+
+        # all arrays of a group are masked at once
+        sp, groupers = stratplot(
+            test_df, all_in_one=['nogroup'],
+            formatoptions={'nogroup': {'occurences': 2}})
+        plotter = groupers[0].plotters[0]
+        np.testing.assert_array_equal(
+            plotter.occurences.occurences,
+            test_df.values.T <= 2)
+        artists = plotter.occurence_value._artists
+        self.assertEqual(len(artists), 1)
+        self.assertEqual(len(artists[0].get_offsets()),
+                         (test_df.values <= 2).sum())
+
+    def test_exag(self):
+        """Test the exaggerations through the transform"""
+        sp, groupers = stratplot(
+            test_df, formatoptions={'nogroup': {'exag': '-',
+                                                'exag_factor': 5}})
+        plotters = groupers[0].plotters
+        plotter = plotters[3]
+        line = plotter.exag._plot[0]
+        # the data is not copied but scaled by the transform
+        self.assertEqual(list(line.get_xdata()), list(test_df['d']))
+
+        def displayed():
+            return list(np.round(line.get_transform().transform(
+                line.get_xydata())[:, 0], 6))
+
+        def expected(factor):
+            xy = np.c_[test_df['d'].values * factor, test_df.index]
+            return list(np.round(
+                plotter.ax.transData.transform(xy)[:, 0], 6))
+
+        self.assertEqual(displayed(), expected(5))
+        plotter.update(exag_factor=2)
+        # the exaggerations are not replotted
+        self.assertIs(plotter.exag._plot[0], line)
+        self.assertEqual(displayed(), expected(2))
+        # change the exaggerations of the entire group
+        plotter.share(plotters[:3], keys='exag_factor')
+        plotter.update(exag_factor=3)
+        self.assertEqual([p.exag_factor.transform.get_matrix()[0, 0]
+                          for p in plotters[:4]], [3] * 4)
+
+    def test_bars(self):
+        """Test the bars drawn as one collection per array"""
+        sp, groupers = stratplot(
+            test_df, use_bars=True,
+            formatoptions={'nogroup': {'occurences': 1, 'exag': '-'}})
+        for (col, vals), plotter in zip(test_df.items(),
+                                        groupers[0].plotters):
+            ax = plotter.ax
+            self.assertEqual(len(ax.patches), 0)
+            coll = plotter.plot._plot[0]
+            self.assertIn(coll, ax.collections)
+            # the values below 1 are occurences and set to 0
+            widths = [path.vertices[:, 0].max() for path in coll.get_paths()]
+            self.assertEqual(widths, [v for v in vals if v > 1],
+                             msg='Wrong data for column %s' % col)
+
+    def test_stacked_bars(self):
+        """Test the stacked bars that are centered on the data points"""
+        df = pd.DataFrame({'a': [1, 2, 3], 'b': [2, 1, 1]}, index=[0, 10, 20])
+        sp, groupers = stratplot(df, stacked=True, use_bars=True)
+        plotter = groupers[0].plotters[0]
+        self.assertEqual(len(plotter.ax.patches), 0)
+        base = np.zeros(len(df))
+        for (col, vals), coll in zip(df.items(), plotter.plot._plot):
+            for i, (path, idx) in enumerate(zip(coll.get_paths(), df.index)):
+                verts = path.vertices
+                self.assertEqual(
+                    [verts[:, 1].min(), verts[:, 1].max()],
+                    [idx - 2.5, idx + 2.5],
+                    msg='Wrong bar position for column %s' % col)
+                self.assertEqual(
+                    [verts[:, 0].min(), verts[:, 0].max()],
+                    [base[i], base[i] + vals.iloc[i]],
+                    msg='Wrong bar extent for column %s' % col)
+            base += vals.values
+
+    def test_decimate(self):
+        """Test the peak preserving decimation of long records"""
+        index = np.arange(10000.)
+        df = pd.DataFrame({'a': np.sin(index / 100.), 'b': index % 1000},
+                          index=index)
+        sp, groupers = stratplot(
+            df, formatoptions={'nogroup': {'decimate': 100, 'hlines': True}})
+        for plotter in groupers[0].plotters:
+            arr = plotter.plot_data
+            self.assertLessEqual(len(arr), 2 * 100 + 2)
+            self.assertEqual(len(plotter.data), len(df))
+            # the peaks are preserved
+            self.assertAlmostEqual(float(arr.max()), float(plotter.data.max()),
+                                   places=6)
+            self.assertAlmostEqual(float(arr.min()), float(plotter.data.min()),
+                                   places=6)
+            self.assertEqual(len(plotter.hlines.artists.get_segments()),
+                             len(arr))
+        plotters = groupers[0].plotters
+        plotters[0].ax.figure.canvas.draw()
+        # zooming into one plot decimates the visible part of all plots
+        # that share the index
+        plotters[1].ax.set_ylim(2000, 1000)
+        for plotter in plotters:
+            arr = plotter.plot_data
+            y = arr[arr.dims[0]].values
+            self.assertEqual(plotter.decimate.limits, (1000, 2000))
+            # the data is taken from the pyramid level with blocks of 16
+            # samples
+            self.assertEqual((y.min(), y.max()), (992, 2015))
+            self.assertGreater(len(y), 100)
+            self.assertEqual(list(plotter.ax.lines[0].get_ydata()), list(y))
+
+    def test_pyramid(self):
+        """Test the min/max pyramid of the decimation"""
+        values = np.random.RandomState(0).rand(2, 1000)
+        pyramid = MinMaxPyramid(np.arange(1000.), values)
+        self.assertEqual(len(pyramid.levels), 10)
+        mins, maxs = pyramid.levels[2]
+        self.assertEqual(mins.dtype, np.float32)
+        np.testing.assert_allclose(
+            maxs, values.reshape((2, -1, 8)).max(axis=-1), rtol=1e-6)
+        np.testing.assert_allclose(
+            mins, values.reshape((2, -1, 8)).min(axis=-1), rtol=1e-6)
+        # the view of a descending index
+        pyramid = MinMaxPyramid(np.arange(1000.)[::-1], values)
+        positions, selected = pyramid.select(100, 299, 50)
+        self.assertEqual(list(positions[:2]), [696, 699])
+        self.assertEqual(list(positions[-2:]), [900, 903])
+        self.assertEqual(selected.shape, (2, len(positions)))
+        # zoomed in far enough, the samples are used directly
+        positions, selected = pyramid.select(100, 120, 50)
+        self.assertEqual(list(positions), list(range(878, 901)))
+        self.assertIsNone(selected)
+
+    def test_locate(self):
+        """Test the lookup of the variables after structural changes"""
+        sp, groupers = stratplot(test_df, hidden=['c'])
+        grouper = groupers[0]
+        self.assertEqual(grouper._locate('b')[0].name, 'b')
+        self.assertEqual(grouper._locate('c'), (None, None))
+        grouper.reorder(list('fedcba'))
+        self.assertEqual([arr.name for arr in grouper.arrays], list('fedba'))
+        for name in 'abdef':
+            self.assertEqual(grouper._locate(name)[0].name, name)
+        # the lazy variable is added to the index when it is plotted
+        grouper.show_array('c')
+        self.assertEqual([arr.name for arr in grouper.arrays],
+                         list('fedcba'))
+        arr = grouper._locate('c')[0]
+        self.assertEqual(arr.name, 'c')
+        grouper.hide_array('c')
+        self.assertFalse(grouper.is_visible(arr))
+
 
 class StratPercentagesTest(unittest.TestCase):
 
@@ -63,6 +392,142 @@ class StratPercentagesTest(unittest.TestCase):
                              msg='Wrong data for column %s' % col)
         return sp, groupers
 
+    def test_layout(self):
+        """Test whether the axes widths correspond to the x-limits"""
+        df = test_df.copy()
+        df['g'] = [0.5, 0.2, 0.1]
+        sp, groupers = stratplot(
+            df, widths={'1': 0.5, '2': 0.5},
+            group_func=lambda g: '1' if g <= 'c' else '2', percentages=['2'],
+            calculate_percentages=False, min_percentage=20)
+        axes = groupers[1].axes
+        self.assertEqual([ax.get_xlim()[1] for ax in axes], [33, 70, 45, 20])
+        ratios = [ax.get_position().width / ax.get_xlim()[1] for ax in axes]
+        self.assertTrue(np.allclose(ratios, ratios[0]), msg=ratios)
+        self.assertAlmostEqual(sum(ax.get_position().width for ax in axes),
+                               groupers[1].bbox.width)
+
+
+class LayoutAxesTest(unittest.TestCase):
+    """Test the :func:`psy_strat.stratplot.layout_axes` function"""
+
+    def test_layout(self):
+        import matplotlib.transforms as mt
+        bbox = mt.Bbox.from_bounds(0.1, 0.2, 0.8, 0.5)
+        positions = layout_axes(bbox, [1, 2, 1])
+        self.assertTrue(np.allclose(positions, [[0.1, 0.2, 0.2, 0.5],
+                                                [0.3, 0.2, 0.4, 0.5],
+                                                [0.7, 0.2, 0.2, 0.5]]))
+        # the right edge of one axes is the left edge of the next one
+        for (x0, y0, w, h), (x1, y1, w1, h1) in zip(positions,
+                                                     positions[1:]):
+            self.assertEqual(x0 + w, x1)
+
+
+class NormalizePercentagesTest(unittest.TestCase):
+    """Test the :func:`psy_strat.stratplot.normalize_percentages` function"""
+
+    def test_normalize(self):
+        df = test_df.astype(float)
+        df.iloc[0, 3] = np.nan
+        groups = {'1': list('abc'), '2': list('def')}
+        ret, nbytes = normalize_percentages(df, groups, ['2'])
+        self.assertEqual(list(ret.columns), list(df.columns))
+        # the columns that are not rescaled are not copied
+        self.assertTrue(np.shares_memory(ret['a'].values, df['a'].values))
+        self.assertGreater(nbytes, 0)
+        # the input should not be changed
+        self.assertTrue(np.isnan(df.iloc[0, 3]))
+        self.assertEqual(list(ret['a']), list(df['a']))
+        np.testing.assert_allclose(ret[list('def')].sum(axis=1), 100.)
+        self.assertTrue(np.isnan(ret['d'].iloc[0]))
+
+    def test_normalize_by_other(self):
+        groups = {'1': list('abc'), '2': list('def')}
+        ret = normalize_percentages(test_df, groups, ['1', '2'],
+                                    ['1', 'd'])[0]
+        total = test_df[list('abcd')].sum(axis=1)
+        np.testing.assert_allclose(ret['e'], test_df['e'] * 100. / total)
+        np.testing.assert_allclose(ret['a'], test_df['a'] * 100. / total)
+
+
+class DataFrameToDatasetTest(unittest.TestCase):
+    """Test the :func:`psy_strat.stratplot.dataframe_to_dataset` function"""
+
+    def test_views(self):
+        df = test_df.astype(float)
+        df['g'] = list('xyz')
+        ds = dataframe_to_dataset(df)
+        self.assertEqual(list(ds.data_vars), list(df.columns))
+        self.assertEqual(list(ds.dims), ['y'])
+        for col in df.columns:
+            self.assertEqual(list(ds[col].values), list(df[col]))
+        # all float variables should be views on the same block
+        bases = [ds[col].variable._data.base for col in 'abcdef']
+        self.assertIsNotNone(bases[0])
+        for base in bases[1:]:
+            self.assertIs(base, bases[0])
+
+
+class BlockStatisticsTest(unittest.TestCase):
+    """Test the :func:`psy_strat.stratplot.block_statistics` function"""
+
+    def tearDown(self):
+        import psyplot.project as psy
+        psy.close('all')
+
+    def test_statistics(self):
+        block = np.array([[0, 1, np.nan],
+                          [2, 0, np.nan],
+                          [4, 0, np.nan]])
+        stats = block_statistics(block, [10, 20, 30], list('abc'))
+        self.assertEqual(list(stats.index), list('abc'))
+        self.assertEqual(list(stats['max'][:2]), [4, 1])
+        self.assertEqual(list(stats['min'][:2]), [0, 0])
+        self.assertEqual(list(stats['mean'][:2]), [2, 1 / 3.])
+        self.assertEqual(list(stats['count']), [3, 3, 0])
+        self.assertEqual(list(stats['occurences']), [2, 1, 0])
+        self.assertEqual(list(stats['first_occurence'][:2]), [20, 10])
+        self.assertEqual(list(stats['last_occurence'][:2]), [30, 10])
+        self.assertTrue(np.isnan(stats.loc['c', 'first_occurence']))
+
+    def test_min_occurences(self):
+        df = test_df.copy()
+        df.iloc[:2, 0] = 0
+        sp, groupers = stratplot(df, min_occurences=2)
+        self.assertEqual([arr.name for arr in sp], list('bcdef'))
+        self.assertEqual(sp[0].attrs['max'], 2)
+        self.assertEqual(sp[0].attrs['occurences'], 3)
+
+
+class GroupIndexTest(unittest.TestCase):
+    """Test the :class:`psy_strat.stratplot.GroupIndex` class"""
+
+    def tearDown(self):
+        import psyplot.project as psy
+        psy.close('all')
+
+    def test_table(self):
+        table = pd.DataFrame({'varname': list('abde'),
+                              'groupname': ['1', '1', '2', '2']})
+        index = GroupIndex(table, default=lambda col: col.upper())
+        self.assertEqual(index('a'), '1')
+        self.assertEqual(index('c'), 'C')
+        groups, maingroups = index.resolve(list('abcdef'), {'2': ['1']})
+        self.assertEqual(groups, ['1', '1', 'C', '2', '2', 'F'])
+        self.assertEqual(maingroups, ['2', '2', 'C', '2', '2', 'F'])
+
+    def test_stratplot(self):
+        index = GroupIndex(pd.Series(['1', '1', '1', '2', '2', '2'],
+                                     index=list('abcdef')))
+        for i in range(2):
+            sp, groupers = stratplot(test_df, index, percentages=['2'],
+                                     widths={'1': 0.5, '2': 0.5})
+            self.assertEqual([grouper.group for grouper in groupers],
+                             ['1', '2'])
+            self.assertEqual(groupers[1].arr_names, sp.arr_names[3:])
+            self.assertEqual(sp[3].attrs['maingroup'], '2')
+
 
 class StratAllInOneTest(unittest.TestCase):
 
@@ -82,6 +547,12 @@ class StratAllInOneTest(unittest.TestCase):
                              msg='Wrong data for column %s' % col)
         return sp, groupers
 
+    def test_all_groups(self):
+        sp, groupers = stratplot(
+            test_df, group_func=lambda g: '1' if g <= 'c' else '2',
+            all_in_one=True)
+        self.assertEqual([len(grouper.axes) for grouper in groupers], [1, 1])
+
 
 class StackedGroupTest(unittest.TestCase):
 
@@ -101,6 +572,40 @@ class StackedGroupTest(unittest.TestCase):
                              msg='Wrong data for column %s' % col)
         return sp, groupers
 
+    def test_hide_array(self):
+        """Test hiding and showing an area of the stacked plot"""
+        sp, groupers = self.test_stratplot()
+        grouper = groupers[1]
+        plot = grouper.plotters[0].plot
+        first, second, last = plot._plot
+
+        def upper(coll):
+            return coll.get_paths()[0].vertices[:, 0].max()
+
+        grouper.hide_array('e')
+        # the areas below the hidden one are not replotted
+        self.assertIs(plot._plot[0], first)
+        self.assertEqual(plot._plot[1:], [last])
+        self.assertNotIn(second, plot.ax.collections)
+        self.assertEqual(upper(last), (test_df['d'] + test_df['f']).max())
+        grouper.show_array('e')
+        self.assertEqual(len(plot._plot), 3)
+        self.assertIs(plot._plot[2], last)
+        self.assertEqual(upper(last), test_df[list('def')].sum(axis=1).max())
+
+    def test_hide_all(self):
+        """Test hiding all members of a stacked plot with measurement lines"""
+        sp, groupers = stratplot(
+            test_df, widths={'1': 0.5, '2': 0.5},
+            group_func=lambda g: '1' if g <= 'c' else '2', stacked=['2'],
+            formatoptions={'2': {'hlines': True}})
+        grouper = groupers[1]
+        grouper.hide_arrays(list('def'))
+        plotter = grouper.plotters[0]
+        self.assertFalse(plotter.plot._plot)
+        self.assertEqual(len(plotter.hlines.artists.get_segments()),
+                         len(test_df))
+
     def test_summed(self):
         """Test the summed version"""
         sp, groupers = stratplot(
@@ -117,5 +622,438 @@ class StackedGroupTest(unittest.TestCase):
         return sp, groupers
 
 
+class StratCompactTest(unittest.TestCase):
+    """Test the handling of :class:`psy_strat.stratplot.StratCompact`"""
+
+    def tearDown(self):
+        import psyplot.project as psy
+        psy.close('all')
+
+    def test_stratplot(self):
+        sp, groupers = stratplot(
+            test_df, widths={'1': 0.5, '2': 0.5},
+            group_func=lambda g: '1' if g <= 'c' else '2', percentages=['2'],
+            compact=['1', '2'])
+        for grouper, cols in zip(groupers, ['abc', 'def']):
+            self.assertEqual(len(grouper.axes), 1)
+            self.assertEqual(len(grouper.plotter_arrays), 1)
+            self.assertEqual([da.name for da in grouper.arrays], list(cols))
+            plotter = grouper.plotters[0]
+            self.assertEqual([t.get_text() for t in plotter.title.texts],
+                             list(cols))
+            self.assertEqual(plotter.grouper.texts[0].get_text(),
+                             grouper.group)
+        # the percentages slots are scaled by the data
+        plot = groupers[1].plotters[0].plot
+        widths = [(vmax - vmin) * scale
+                  for offset, scale, vmin, vmax in plot.slots]
+        self.assertGreater(widths[1], widths[2])
+        return sp, groupers
+
+    def test_hide_array(self):
+        sp, groupers = self.test_stratplot()
+        grouper = groupers[0]
+        arr = grouper.arrays[1]
+        grouper.hide_array('b')
+        self.assertFalse(grouper.is_visible(arr))
+        self.assertEqual(
+            [t.get_text() for t in grouper.plotters[0].title.texts],
+            ['a', 'c'])
+        grouper.show_array('b')
+        self.assertTrue(grouper.is_visible(arr))
+        self.assertEqual(
+            [t.get_text() for t in grouper.plotters[0].title.texts],
+            list('abc'))
+
+    def test_reorder(self):
+        sp, groupers = self.test_stratplot()
+        grouper = groupers[0]
+        grouper.hide_array('b')
+        grouper.reorder(['c', 'b'])
+        self.assertEqual([da.name for da in grouper.arrays], list('cba'))
+        self.assertEqual([grouper.is_visible(arr) for arr in grouper.arrays],
+                         [True, False, True])
+        self.assertEqual(grouper._locate('a')[1], 2)
+        self.assertEqual(
+            [t.get_text() for t in grouper.plotters[0].title.texts],
+            ['c', 'a'])
+
+    def test_hidden(self):
+        sp, groupers = stratplot(test_df, compact=True, hidden=['b'])
+        grouper = groupers[0]
+        self.assertEqual(grouper.lazy, [])
+        self.assertEqual([grouper.is_visible(arr) for arr in grouper.arrays],
+                         [True, False, True, True, True, True])
+
+
+class StratHeatmapTest(unittest.TestCase):
+    """Test the handling of :class:`psy_strat.stratplot.StratHeatmap`"""
+
+    def tearDown(self):
+        import psyplot.project as psy
+        psy.close('all')
+
+    def test_stratplot(self):
+        sp, groupers = stratplot(
+            test_df, widths={'1': 0.5, '2': 0.5},
+            group_func=lambda g: '1' if g <= 'c' else '2', percentages=['2'],
+            heatmap=True)
+        for grouper, cols in zip(groupers, ['abc', 'def']):
+            self.assertEqual(len(grouper.axes), 1)
+            self.assertEqual([da.name for da in grouper.arrays], list(cols))
+            plotter = grouper.plotters[0]
+            self.assertEqual(len(plotter.ax.collections), 1)
+            self.assertEqual(plotter.ax.get_xlim(), (0, 3))
+        # percentages share one color scale
+        mesh = groupers[1].plotters[0].plot.mappable
+        self.assertEqual(
+            list(mesh.get_array().reshape((3, 3))[:, 1]), list(test_df['e']))
+        self.assertEqual(mesh.norm.vmin, 0)
+        self.assertEqual(mesh.norm.vmax, 70)
+        return sp, groupers
+
+    def test_hide_array(self):
+        sp, groupers = self.test_stratplot()
+        grouper = groupers[1]
+        grouper.hide_array('e')
+        plotter = grouper.plotters[0]
+        self.assertEqual(plotter.ax.get_xlim(), (0, 2))
+        self.assertEqual(
+            list(plotter.plot.mappable.get_array().reshape((3, 2))[:, 1]),
+            list(test_df['f']))
+
+
+class StratplotDatasetTest(unittest.TestCase):
+    """Test :func:`psy_strat.stratplot.stratplot` with a dataset as input"""
+
+    def tearDown(self):
+        import psyplot.project as psy
+        psy.close('all')
+
+    def get_dataset(self):
+        ds = xr.Dataset.from_dataframe(test_df.astype(float))
+        ds['e'].attrs['long_name'] = 'Variable e'
+        return ds
+
+    def test_stratplot(self, ds=None):
+        ds = self.get_dataset() if ds is None else ds
+        sp, groupers = stratplot(
+            ds, widths={'1': 0.5, '2': 0.5}, exclude=['b'],
+            group_func=lambda g: '1' if g <= 'c' else '2', percentages=['2'])
+        self.assertEqual([arr.name for arr in sp], list('acdef'))
+        base = sp[0].psy.base
+        self.assertNotIn('b', base)
+        self.assertEqual(base['e'].attrs['long_name'], 'Variable e')
+        self.assertEqual(base['e'].attrs['maingroup'], '2')
+        # the input should not have been modified
+        self.assertNotIn('maingroup', ds['e'].attrs)
+        for col in 'def':
+            self.assertEqual(list(base[col].values), list(test_df[col]))
+        return sp, groupers
+
+    @unittest.skipIf(not with_dask, 'dask is required')
+    def test_stratplot_dask(self):
+        sp = self.test_stratplot(self.get_dataset().chunk())[0]
+        self.assertIsInstance(sp[0].psy.base['d'].variable._data, np.ndarray)
+
+    @unittest.skipIf(not with_dask, 'dask is required')
+    def test_thresh_lazy(self):
+        """Test whether variables below the threshold are never loaded"""
+        ds = self.get_dataset()
+        ds['g'] = xr.zeros_like(ds['f'])
+        ds = ds.chunk()
+        with mock.patch.object(xr.Dataset, 'load', autospec=True,
+                               side_effect=xr.Dataset.load) as load:
+            sp, groupers = stratplot(
+                ds, widths={'1': 0.5, '2': 0.5},
+                group_func=lambda g: '1' if g <= 'c' else '2',
+                percentages=['2'])
+        self.assertNotIn('g', sp[0].psy.base)
+        self.assertTrue(load.call_count)
+        for call in load.call_args_list:
+            self.assertNotIn('g', call[0][0])
+
+    def test_chunked_statistics(self):
+        """Test the statistics that are computed chunk by chunk"""
+        from psy_strat.stratplot import _variable_statistics
+        ds = self.get_dataset()
+        ds['a'][1] = np.nan
+        names = list(test_df.columns)
+        ref = _variable_statistics(ds, names)
+        stats = _variable_statistics(ds, names, chunksize=2)
+        self.assertEqual(list(stats.index), names)
+        for key in ref.columns:
+            np.testing.assert_allclose(
+                stats[key].values.astype(float),
+                ref[key].values.astype(float), err_msg=key)
+
+    def test_no_variables(self):
+        ds = xr.Dataset({'a': (('x', 'y'), np.zeros((2, 3)))})
+        with self.assertRaisesRegex(ValueError, 'one-dimensional'):
+            stratplot(ds)
+
+
+class UpdateStratplotTest(unittest.TestCase):
+    """Test :func:`psy_strat.stratplot.update_stratplot`"""
+
+    def tearDown(self):
+        import psyplot.project as psy
+        psy.close('all')
+
+    def test_update_values(self):
+        sp, groupers = stratplot(test_df)
+        df = test_df * 2
+        self.assertEqual(update_stratplot(groupers, df), [])
+        for (col, vals), ax in zip(df.items(), groupers[0].axes):
+            self.assertEqual(list(ax.lines[0].get_xdata()), list(vals),
+                             msg='Wrong data for column %s' % col)
+        self.assertEqual(sp[0].psy.base['a'].attrs['max'], 2)
+
+    def test_add_percentages(self):
+        sp, groupers = stratplot(
+            test_df, widths={'1': 0.5, '2': 0.5},
+            group_func=lambda g: '1' if g <= 'c' else '2', percentages=['2'],
+            calculate_percentages=False, min_percentage=20)
+        df = test_df.copy()
+        df['g'] = [0.5, 0.2, 0.1]
+        df['h'] = [0.001, 0, 0]  # below the threshold
+        added = update_stratplot(
+            groupers, df, group_func=lambda g: '1' if g <= 'c' else '2',
+            calculate_percentages=False)
+        self.assertEqual(added, ['g'])
+        axes = groupers[1].axes
+        self.assertEqual([ax.get_xlim()[1] for ax in axes], [33, 70, 45, 20])
+        ratios = [ax.get_position().width / ax.get_xlim()[1] for ax in axes]
+        self.assertTrue(np.allclose(ratios, ratios[0]), msg=ratios)
+        self.assertAlmostEqual(axes[-1].get_position().x1,
+                               groupers[1].bbox.x1)
+        self.assertIn('h', sp[0].psy.base)
+
+    def test_add_compact(self):
+        sp, groupers = stratplot(
+            test_df, widths={'1': 0.5, '2': 0.5},
+            group_func=lambda g: '1' if g <= 'c' else '2', percentages=['2'],
+            compact=True)
+        df = test_df.copy()
+        df['bb'] = [4, 5, 6]
+        update_stratplot(groupers, df,
+                         group_func=lambda g: '1' if g <= 'c' else '2')
+        grouper = groupers[0]
+        self.assertEqual(len(grouper.axes), 1)
+        self.assertEqual([arr.name for arr in grouper.arrays],
+                         ['a', 'b', 'c', 'bb'])
+        plotter = grouper.plotters[0]
+        self.assertEqual(len(plotter.plot.slots), 4)
+
+    def test_wrong_length(self):
+        sp, groupers = stratplot(test_df)
+        with self.assertRaises(ValueError):
+            update_stratplot(groupers, test_df.iloc[:2])
+
+
+class StratStreamTest(unittest.TestCase):
+    """Test :class:`psy_strat.stratplot.StratStream`"""
+
+    new_df = pd.DataFrame([[1., 2., 3., 10., 20., 70.],
+                           [2., 2., 2., 50., 50., 0.]],
+                          columns=list('abcdef'), index=[3, 4])
+
+    def tearDown(self):
+        import psyplot.project as psy
+        psy.close('all')
+
+    def test_append(self):
+        sp, groupers = stratplot(
+            test_df, widths={'1': 0.5, '2': 0.5},
+            group_func=lambda g: '1' if g <= 'c' else '2', percentages=['2'],
+            formatoptions={'1': {'hlines': 'k'}})
+        polys = [len(p.plot._plot[0].get_paths())
+                 for p in groupers[1].plotters]
+        stream = StratStream(groupers)
+        self.assertEqual(stream.append(self.new_df), 5)
+        base = sp[0].psy.base
+        self.assertEqual(list(base['y'].values), list(range(5)))
+        self.assertEqual(list(base['f'].values), [17, 42, 3, 70, 0])
+        self.assertEqual(base['d'].attrs['max'], 50)
+        self.assertEqual(base['d'].attrs['occurences'], 5)
+        for (col, vals), ax in zip(test_df.iloc[:, :3].items(),
+                                   groupers[0].axes):
+            self.assertEqual(list(ax.lines[0].get_xdata()),
+                             list(vals) + list(self.new_df[col]))
+        # the areas are extended by the new samples
+        self.assertEqual([len(p.plot._plot[0].get_paths())
+                          for p in groupers[1].plotters],
+                         [n + 1 for n in polys])
+        self.assertEqual(
+            len(groupers[0].plotters[0].hlines.artists.get_paths()), 5)
+        self.assertEqual(sorted(groupers[0].axes[0].get_ylim()), [0, 4])
+        # the x-limits have been updated
+        axes = groupers[1].axes
+        self.assertEqual(axes[0].get_xlim()[1], 50)
+        ratios = [ax.get_position().width / ax.get_xlim()[1] for ax in axes]
+        self.assertTrue(np.allclose(ratios, ratios[0]), msg=ratios)
+
+    def test_missing_column(self):
+        """Test appending samples without one of the variables"""
+        sp, groupers = stratplot(test_df)
+        stream = StratStream(groupers)
+        stream.append(self.new_df.drop(columns=['a']))
+        base = sp[0].psy.base
+        self.assertTrue(np.isnan(base['a'].values[-2:]).all())
+        # the mean only considers the valid samples
+        self.assertEqual(base['a'].attrs['mean'], 1)
+        self.assertEqual(base['a'].attrs['count'], 3)
+        self.assertEqual(base['b'].attrs['mean'], 8 / 5.)
+        self.assertEqual(base['b'].attrs['count'], 5)
+
+    def test_buffer(self):
+        """Test whether the data is kept in a growing buffer"""
+        sp, groupers = stratplot(test_df)
+        stream = StratStream(groupers)
+        stream.append(self.new_df.iloc[:1])
+        buf = stream._buffers['a']
+        stream.append(self.new_df.iloc[1:])
+        self.assertIs(stream._buffers['a'], buf)
+        arr = groupers[0].arrays[0]
+        self.assertEqual(arr.shape, (5, ))
+        self.assertTrue(np.shares_memory(arr.values, buf))
+        self.assertTrue(np.shares_memory(sp[0].psy.base['a'].values, buf))
+
+    def test_append_twice(self):
+        """Test extending the lines and shared measurement lines twice"""
+        from psy_strat.plotters import SharedMeasurementLines
+        sp, groupers = stratplot(
+            test_df, formatoptions={
+                'nogroup': {'hlines': 'k', 'hlines_shared': True}})
+        arrays = list(groupers[0].arrays)
+        stream = StratStream(groupers)
+        for i in range(len(self.new_df)):
+            stream.append(self.new_df.iloc[i:i + 1])
+        self.assertEqual([id(arr) for arr in groupers[0].arrays],
+                         list(map(id, arrays)))
+        for (col, vals), ax in zip(test_df.items(), groupers[0].axes):
+            self.assertEqual(list(ax.lines[0].get_xdata()),
+                             list(vals) + list(self.new_df[col]))
+            self.assertEqual(list(ax.lines[0].get_ydata()), list(range(5)))
+        fig = groupers[0].figure
+        fig.canvas.draw()
+        artist, = [a for a in fig.artists
+                   if isinstance(a, SharedMeasurementLines)]
+        self.assertEqual([seg[0, 1] for seg in artist.get_segments()],
+                         list(range(5)))
+
+    def test_compact(self):
+        sp, groupers = stratplot(
+            test_df, widths={'1': 0.5, '2': 0.5},
+            group_func=lambda g: '1' if g <= 'c' else '2', percentages=['2'],
+            compact=True)
+        StratStream(groupers).append(self.new_df)
+        for grouper in groupers:
+            self.assertEqual([arr.shape for arr in grouper.arrays],
+                             [(5, )] * 3)
+        # the compact plots are replotted
+        lines = groupers[0].plotters[0].plot._plot[0]
+        self.assertEqual([len(path.vertices) for path in lines.get_paths()],
+                         [5] * 3)
+
+
+class StratTemplateTest(unittest.TestCase):
+    """Test :class:`psy_strat.stratplot.StratTemplate`"""
+
+    def tearDown(self):
+        import psyplot.project as psy
+        psy.close('all')
+
+    @staticmethod
+    def names(sp):
+        return [getattr(arr, 'name', None) for arr in sp]
+
+    def test_plot(self):
+        group_func = lambda g: '1' if g <= 'c' else '2'
+        summed = ['2']
+        widths = {'1': 0.5, '2': 0.5}
+        template = StratTemplate(
+            group_func, {'2': {'xlabel': 'test'}}, widths=widths,
+            percentages=['2'], summed=summed)
+        # the input should not have been modified
+        self.assertEqual(summed, ['2'])
+        self.assertEqual(widths, {'1': 0.5, '2': 0.5})
+        self.assertEqual(template.identifier('2'), 'percentages')
+        self.assertEqual(template.identifier('Summed'), 'stacked')
+        fmt = template.group_formatoptions('2')
+        sp1, groupers1 = template.plot(test_df)
+        sp2, groupers2 = template.plot(test_df * 2)
+        self.assertIs(template.group_formatoptions('2'), fmt)
+        self.assertEqual(self.names(sp1), self.names(sp2))
+        self.assertEqual([g.group for g in groupers1],
+                         [g.group for g in groupers2])
+        self.assertEqual(groupers2[1].plotters[0].xlabel.value, 'test')
+        # compare to stratplot
+        sp3, groupers3 = stratplot(
+            test_df, group_func, {'2': {'xlabel': 'test'}}, widths=widths,
+            percentages=['2'], summed=summed)
+        self.assertEqual(self.names(sp1), self.names(sp3))
+        self.assertEqual([g.group for g in groupers1],
+                         [g.group for g in groupers3])
+
+    def test_validate_once(self):
+        """Test whether the template formatoptions are validated only once"""
+        import psyplot
+        entry = psyplot.rcParams.defaultParams['plotter.strat.title_wrap']
+        validate = entry[1]
+        calls = []
+
+        def count(value):
+            calls.append(value)
+            return validate(value)
+
+        entry[1] = count
+        try:
+            template = StratTemplate(lambda g: '1',
+                                     {'1': {'title_wrap': 10}})
+            sp1, groupers1 = template.plot(test_df)
+            sp2, groupers2 = template.plot(test_df * 2)
+        finally:
+            entry[1] = validate
+        self.assertEqual(calls, [10])
+        self.assertEqual([p['title_wrap'] for p in groupers2[0].plotters],
+                         [10] * len(groupers2[0].plotters))
+
+    def test_invalid(self):
+        template = StratTemplate(formatoptions={'1': {'grid': 'invalid'}})
+        with self.assertRaises(ValueError):
+            template.group_formatoptions('1')
+
+
+class StratplotManyTest(unittest.TestCase):
+    """Test :func:`psy_strat.stratplot.stratplot_many`"""
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_serial(self, processes=0):
+        fname = os.path.join(self.test_dir, 'site3.csv')
+        test_df.to_csv(fname)
+        frames = [test_df, test_df * 2, os.path.join(self.test_dir, 'no.csv'),
+                  fname]
+        output = os.path.join(self.test_dir, '%(name)s.png')
+        ret = stratplot_many(frames, output, processes=processes,
+                             percentages=True)
+        self.assertEqual(list(ret.index), ['0', '1', 'no', 'site3'])
+        self.assertEqual(list(ret['error'].isnull()),
+                         [True, True, False, True])
+        for name, row in ret.iterrows():
+            self.assertEqual(os.path.exists(row['output']), name != 'no',
+                             msg=name)
+        self.assertTrue(ret.loc['0', 'total'] >= ret.loc['0', 'plot'])
+        return ret
+
+    def test_pool(self):
+        self.test_serial(2)
+
+
 if __name__ == '__main__':
     unittest.main()